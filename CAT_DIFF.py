@@ -0,0 +1,384 @@
+# MARCDRED'S CAT_DIFF.py V4.2 #
+# marcdred@outlook.com #
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+	from typing_extensions import Self
+from dataclasses import dataclass
+import contextlib
+import hashlib
+import io
+import multiprocessing
+import os
+import sys
+import CAT_TO_MACT
+import MACT_TO_CAT
+import CAT_PATCH
+
+
+## SETTINGS ##
+bool_print_debug = 0
+bool_verify = 0
+# rebuild with track param optimization when verifying
+bool_verify_param_optimization = False
+
+
+## CLASSES ##
+# Canonical trees only keep what a CAT means, not where it's stored:
+# titles are resolved, strings are read, condition groups are expanded
+# and tracks are unoptimized. Every node and logic gets a fingerprint of
+# its whole subtree so identical subtrees can be skipped at once.
+@dataclass
+class DiffParam:
+	id: int
+	name: str
+	value: str
+	# conditions of a 'cg' param, None otherwise
+	group: list[DiffLogic]
+
+
+@dataclass
+class DiffLogic:
+	title: str
+	params: list[DiffParam]
+	fingerprint: bytes
+
+
+@dataclass
+class DiffNode:
+	key: str
+	type: str
+	include_file: bool
+	conditions: list[DiffLogic]
+	tracks: list[DiffLogic]
+	children: list[Self]
+	fingerprint: bytes
+
+
+@dataclass
+class DiffChange:
+	kind: str
+	path: str
+	detail: str
+
+
+def fingerprint(*items):
+	return hashlib.blake2b(repr(items).encode('utf-8'), digest_size=16).digest()
+
+
+## CANONICAL TREE ##
+def read_canonical_tree(cat):
+	# logic is decoded once per offset, nodes often share it
+	condition_cache = {}
+	track_cache = {}
+	return _read_canonical_node(cat, cat.read_cat_tree(), condition_cache, track_cache)
+
+
+def _read_canonical_node(cat, node, condition_cache, track_cache):
+	title = node.hash
+	if isinstance(title, int):
+		title = CAT_TO_MACT.pretty_bytes(title)
+	include_file = False
+	if node.type in ('b',):
+		key = "Bank {0}".format(title)
+	elif node.type in ('l', 'n'):
+		key = "Node {0}".format(title)
+	else:
+		key = "FileReference {0} {1}".format(cat.get_string_from_offset(node.file_offset),
+					cat.get_string_from_offset(node.path_offset))
+		include_file = node.type in ('i',)
+	conditions = []
+	for offset in node.condition_offsets:
+		conditions.append(_read_canonical_condition(cat, offset, condition_cache))
+	tracks = []
+	for offset in node.track_offsets:
+		if offset not in track_cache:
+			helper = cat.read_unoptimized_track(offset)
+			track_cache[offset] = _read_canonical_logic(cat, helper, CAT_TO_MACT.db_tracks, condition_cache)
+		tracks.append(track_cache[offset])
+	children = []
+	for c in node.children:
+		children.append(_read_canonical_node(cat, c, condition_cache, track_cache))
+	my_fingerprint = fingerprint(key, include_file,
+		[c.fingerprint for c in conditions], [t.fingerprint for t in tracks],
+		[c.fingerprint for c in children])
+	return DiffNode(key, node.type, include_file, conditions, tracks, children, my_fingerprint)
+
+
+def _read_canonical_condition(cat, offset, condition_cache):
+	if offset not in condition_cache:
+		helper = cat.read_condition(offset)
+		condition_cache[offset] = _read_canonical_logic(cat, helper, CAT_TO_MACT.db_conditions, condition_cache)
+	return condition_cache[offset]
+
+
+def _read_canonical_logic(cat, helper, db, condition_cache):
+	title = CAT_TO_MACT.check_hash_logic(helper.hash)
+	if title is None:
+		title = CAT_TO_MACT.pretty_bytes(helper.hash)
+	params = []
+	for p in helper.params:
+		if p.id == 0:
+			continue
+		param_name, param_type, param_value = CAT_TO_MACT.get_mact_param(cat, db, title, helper, p)
+		group = None
+		if p.type == "cg":
+			group = []
+			vcg = cat.get_vcg_from_offset(cat.get_group_reference_from_param_offset(p))
+			if vcg is not None:
+				for offset in vcg.condition_offsets:
+					group.append(_read_canonical_condition(cat, offset, condition_cache))
+			param_value = "ConditionGroup"
+		params.append(DiffParam(p.id, param_name, param_value, group))
+	my_fingerprint = fingerprint(title,
+		[(p.id, p.value, None if p.group is None else [c.fingerprint for c in p.group]) for p in params])
+	return DiffLogic(title, params, my_fingerprint)
+
+
+## DIFF ##
+def _keyed(items, get_key):
+	# Match siblings by key, repeated keys are numbered in order
+	keyed = {}
+	for item in items:
+		key = get_key(item)
+		n = 1
+		my_key = key
+		while my_key in keyed:
+			n += 1
+			my_key = "{0}#{1}".format(key, n)
+		keyed[my_key] = item
+	return keyed
+
+
+def diff_trees(tree_a, tree_b):
+	changes = []
+	if tree_a.key != tree_b.key:
+		changes.append(DiffChange("~", "", "root {0} -> {1}".format(tree_a.key, tree_b.key)))
+	_diff_nodes(tree_a, tree_b, tree_b.key, changes)
+	return changes
+
+
+def _diff_nodes(a, b, path, changes):
+	# identical subtree, nothing to see here
+	if a.fingerprint == b.fingerprint:
+		return
+	if a.include_file != b.include_file:
+		changes.append(DiffChange("~", path, "includeFile {0} -> {1}".format(
+			str(a.include_file).lower(), str(b.include_file).lower())))
+	_diff_logic_lists(a.conditions, b.conditions, path + " ConditionGroup", "condition", changes)
+	_diff_logic_lists(a.tracks, b.tracks, path + " Tracks", "track", changes)
+	def node_key(n):
+		return n.key
+	children_a = _keyed(a.children, node_key)
+	children_b = _keyed(b.children, node_key)
+	for key, child in children_a.items():
+		if key not in children_b:
+			changes.append(DiffChange("-", path + "/" + key, "node"))
+		else:
+			_diff_nodes(child, children_b[key], path + "/" + key, changes)
+	for key, child in children_b.items():
+		if key not in children_a:
+			changes.append(DiffChange("+", path + "/" + key, "node"))
+	if list(children_a) != list(children_b) and set(children_a) == set(children_b):
+		changes.append(DiffChange("~", path, "children order"))
+
+
+def _diff_logic_lists(la, lb, path, kind, changes):
+	if [l.fingerprint for l in la] == [l.fingerprint for l in lb]:
+		return
+	def logic_key(l):
+		return l.title
+	logics_a = _keyed(la, logic_key)
+	logics_b = _keyed(lb, logic_key)
+	number_of_changes = len(changes)
+	for key, logic in logics_a.items():
+		if key not in logics_b:
+			changes.append(DiffChange("-", path, "{0} {1}".format(kind, key)))
+		elif logic.fingerprint != logics_b[key].fingerprint:
+			_diff_params(logic, logics_b[key], path + " " + key, changes)
+	for key, logic in logics_b.items():
+		if key not in logics_a:
+			changes.append(DiffChange("+", path, "{0} {1}".format(kind, key)))
+	if number_of_changes == len(changes):
+		changes.append(DiffChange("~", path, "{0} order".format(kind)))
+
+
+def _diff_params(a, b, path, changes):
+	params_a = dict([(p.id, p) for p in a.params])
+	params_b = dict([(p.id, p) for p in b.params])
+	for id, p in params_a.items():
+		if id not in params_b:
+			changes.append(DiffChange("-", path, "param {0}\t{1}".format(p.name, p.value)))
+			continue
+		p2 = params_b[id]
+		if p.group is not None or p2.group is not None:
+			_diff_logic_lists(p.group or [], p2.group or [], path + " " + p.name, "condition", changes)
+		elif p.value != p2.value:
+			changes.append(DiffChange("~", path, "param {0}\t{1} -> {2}".format(p.name, p.value, p2.value)))
+	for id, p in params_b.items():
+		if id not in params_a:
+			changes.append(DiffChange("+", path, "param {0}\t{1}".format(p.name, p.value)))
+
+
+def print_changes(changes):
+	for c in changes:
+		if c.path:
+			print("{0} {1}: {2}".format(c.kind, c.path, c.detail))
+		else:
+			print("{0} {1}".format(c.kind, c.detail))
+
+
+def diff_cat_files(path_a, path_b):
+	cat_a = CAT_TO_MACT.open_cat_file(path_a, path_a)
+	cat_b = CAT_TO_MACT.open_cat_file(path_b, path_b)
+	changes = diff_trees(read_canonical_tree(cat_a), read_canonical_tree(cat_b))
+	cat_a.close()
+	cat_b.close()
+	return changes
+
+
+## VERIFY ##
+# Round trip: CAT -> MACT -> CAT, all in memory.
+# Byte equality can't be expected (--po, string and group dedup order),
+# both CATs are compared as canonical trees instead.
+# A Node without children is also saved like --extract does and patched
+# back in with CAT_PATCH, which must not change the canonical tree either.
+def init_verify_worker(enable_param_optimization):
+	CAT_TO_MACT.bool_print_debug = bool_print_debug
+	MACT_TO_CAT.bool_enable_param_optimization = enable_param_optimization
+	CAT_PATCH.bool_patch_param_optimization = enable_param_optimization
+	# tools are chatty, only differences are reported
+	with contextlib.redirect_stdout(io.StringIO()):
+		# forked workers already have the hash tables of the parent
+		if not CAT_TO_MACT.bool_has_db_hashes:
+			CAT_TO_MACT.load_db_hashes()
+		CAT_TO_MACT.load_db_logics()
+		MACT_TO_CAT.load_db_logics()
+
+
+def verify_cat_file(cat_path):
+	changes = []
+	try:
+		with contextlib.redirect_stdout(io.StringIO()):
+			cat_a = CAT_TO_MACT.open_cat_file(cat_path, cat_path)
+			mact = io.StringIO()
+			CAT_TO_MACT.write_mact(mact, cat_a)
+			cat_data = io.BytesIO()
+			MACT_TO_CAT.bool_little_endian = cat_a.buffer.byte_order == "<"
+			MACT_TO_CAT.compile_mact(mact.getvalue().splitlines(keepends=True), cat_data)
+			cat_b = CAT_TO_MACT.open_cat_bytes(cat_data.getvalue(), cat_path)
+			changes = diff_trees(read_canonical_tree(cat_a), read_canonical_tree(cat_b))
+			cat_b.close()
+			changes.extend(verify_node_patch(cat_a, cat_path))
+			cat_a.close()
+	except Exception as e:
+		changes.append(DiffChange("!", "", "Error: {0}: {1}".format(type(e).__name__, e)))
+	return cat_path, changes
+
+
+def get_leaf_node_position(index):
+	# tree offset of the first Node without children, None if there is none
+	parents = set([parent for key, parent, position in index["nodes"]])
+	for i, (key, parent, position) in enumerate(index["nodes"]):
+		if key.startswith("Node") and i not in parents:
+			return position
+	return None
+
+
+def verify_node_patch(cat, cat_path):
+	position = get_leaf_node_position(CAT_TO_MACT.build_node_index(cat))
+	if position is None:
+		return []
+	mact = io.StringIO()
+	CAT_TO_MACT.write_mact(mact, cat, position)
+	logic_tree = MACT_TO_CAT.parse_mact(mact.getvalue().splitlines(keepends=True))
+	fragment_cat = CAT_PATCH.compile_fragment_tree(logic_tree, cat_path)
+	patched = io.BytesIO()
+	file_length = CAT_PATCH.patch_cat(cat, position, fragment_cat, patched)
+	fragment_cat.close()
+	if file_length is None:
+		return [DiffChange("!", "", "Error: Unable to patch a Node back in.")]
+	cat_b = CAT_TO_MACT.open_cat_bytes(patched.getvalue(), cat_path)
+	changes = diff_trees(read_canonical_tree(cat), read_canonical_tree(cat_b))
+	cat_b.close()
+	for c in changes:
+		c.detail = "after patching a Node: {0}".format(c.detail)
+	return changes
+
+
+def verify_cat_files(cat_paths, enable_param_optimization):
+	# one CAT per task, results come back in any order
+	results = []
+	with contextlib.redirect_stdout(io.StringIO()):
+		CAT_TO_MACT.load_db_hashes()
+	with multiprocessing.Pool(initializer=init_verify_worker,
+			initargs=(enable_param_optimization,)) as pool:
+		for cat_path, changes in pool.imap_unordered(verify_cat_file, cat_paths):
+			results.append((cat_path, changes))
+	results.sort()
+	return results
+
+
+## MAIN ##
+def main():
+	global bool_verify, bool_verify_param_optimization
+
+	# Get CAT files from sys.argv if MODE is regular CAT_DIFF,
+	# get CAT path from sys.argv if MODE is VERIFY.
+	my_cat_files = []
+	cat_path = None
+	sys_argv = sys.argv[1:]
+	for i, arg in enumerate(sys_argv):
+		if sys_argv[i].upper() == "--VERIFY":
+			bool_verify = 1
+			try:
+				cat_path = sys_argv[i+1]
+			except:
+				print("Error: No path argument for verification.")
+				quit()
+		if sys_argv[i].upper() == "--PO":
+			bool_verify_param_optimization = True
+		if sys_argv[i].endswith(".cat"):
+			my_cat_files.append(sys_argv[i])
+
+	if bool_verify:
+		my_cat_files = []
+		for root, dirs, files in os.walk(cat_path):
+			for name in files:
+				if name.endswith(".cat"):
+					my_cat_files.append(root + os.sep + name)
+		if not len(my_cat_files):
+			print("Error: No CAT files found.")
+			quit()
+		print("-> Verifying {0} CAT files.".format(len(my_cat_files)))
+		results = verify_cat_files(my_cat_files, bool_verify_param_optimization)
+		number_of_bad_files = 0
+		for cat_path, changes in results:
+			if len(changes):
+				number_of_bad_files += 1
+				print("<< {0} >>".format(cat_path))
+				print_changes(changes)
+		print("Info: {0} of {1} CAT files differ after round trip.".format(
+			number_of_bad_files, len(my_cat_files)))
+		print("-> Done.")
+		return
+
+	CAT_TO_MACT.bool_print_debug = bool_print_debug
+	CAT_TO_MACT.load_db_hashes()
+	CAT_TO_MACT.load_db_logics()
+
+	if len(my_cat_files) != 2:
+		print("Error: Two CAT files are required.")
+		quit()
+
+	print("<< {0} -> {1} >>".format(my_cat_files[0], my_cat_files[1]))
+	changes = diff_cat_files(my_cat_files[0], my_cat_files[1])
+	print_changes(changes)
+	print("Info: {0} differences.".format(len(changes)))
+
+	# End #
+	print("-> Done.")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,509 @@
+# MARCDRED'S CAT_PATCH.py V4.2 #
+# marcdred@outlook.com #
+from __future__ import annotations
+from dataclasses import dataclass
+import bisect
+import io
+import sys
+import CAT_TO_MACT
+import MACT_TO_CAT
+
+
+## SETTINGS ##
+bool_print_debug = 0
+# compile the MACT fragment with track param optimization
+bool_patch_param_optimization = False
+
+
+## CLASSES ##
+# A patch replaces the subtree of one node with a MACT fragment compiled on its own.
+# Sections are spliced instead of recompiling the whole file:
+#	tree	-> nodes before the subtree, fragment nodes, nodes after the subtree
+#	groups	-> original groups, fragment groups
+#	data	-> original conditions, fragment conditions, original tracks, fragment tracks
+#	strings	-> original strings, fragment strings
+# Conditions and tracks that were only used by the old subtree are removed,
+# the remaining data offsets are moved by a Relocation.
+@dataclass
+class PatchNode:
+	node: CAT_TO_MACT.CatNode
+	number_of_children: int
+
+
+@dataclass
+class CatSections:
+	cat: CAT_TO_MACT.CatFile
+	# every node in tree order, hashes are kept as they're stored
+	nodes: list[PatchNode]
+	# group offset -> condition offsets, in file order
+	groups: dict[int, list[int]]
+	# conditions are stored before condition_end, tracks after it
+	condition_end: int
+	data_length: int
+
+
+@dataclass
+class RemovedRanges:
+	# sorted [start, end) ranges removed from a section
+	starts: list[int]
+	ends: list[int]
+	# bytes removed before each range
+	removed: list[int]
+
+	def get_new_offset(self, offset):
+		# None if the offset was removed
+		i = bisect.bisect_right(self.starts, offset) - 1
+		if i >= 0:
+			if offset < self.ends[i]:
+				return None
+			offset -= self.removed[i] + self.ends[i] - self.starts[i]
+		return offset
+
+	def get_size(self):
+		if not len(self.starts):
+			return 0
+		return self.removed[-1] + self.ends[-1] - self.starts[-1]
+
+
+@dataclass
+class Relocation:
+	data: RemovedRanges
+	groups: RemovedRanges
+	condition_end: int
+	new_condition_end: int
+	fragment_condition_end: int
+	fragment_track_start: int
+	fragment_group_start: int
+
+	def relocate(self, offset):
+		# New data offset of an original offset, None if it was removed
+		new_offset = self.data.get_new_offset(offset)
+		if new_offset is not None and offset >= self.condition_end:
+			new_offset += self.fragment_condition_end
+		return new_offset
+
+	def relocate_fragment(self, offset):
+		if offset < self.fragment_condition_end:
+			return self.new_condition_end + offset
+		return self.fragment_track_start + offset - self.fragment_condition_end
+
+	def relocate_group(self, offset):
+		return self.groups.get_new_offset(offset)
+
+	def relocate_fragment_group(self, offset):
+		return self.fragment_group_start + offset
+
+
+## READ ##
+def read_cat_sections(cat):
+	nodes = []
+	position = cat.p_tree
+	number_of_pending_nodes = 1
+	while number_of_pending_nodes:
+		node, number_of_children, position = cat._read_cat_node(position)
+		number_of_pending_nodes += number_of_children - 1
+		nodes.append(PatchNode(node, number_of_children))
+	groups = {}
+	file = cat.buffer
+	file.seek(cat.p_groups)
+	for i in range(0, len(cat.param_variable_groups)):
+		group_offset = file.tell() - cat.p_groups
+		number_of_conditions = CAT_TO_MACT.format_read(file, "B")
+		condition_offsets = []
+		for j in range(0, number_of_conditions):
+			condition_offsets.append(CAT_TO_MACT.format_read(file, "I"))
+		groups[group_offset] = condition_offsets
+	return CatSections(cat, nodes, groups, cat.condition_boundaries[-1], cat.p_strings - cat.p_data)
+
+
+def get_subtree_end(nodes, i):
+	number_of_pending_nodes = 1
+	while number_of_pending_nodes:
+		number_of_pending_nodes += nodes[i].number_of_children - 1
+		i += 1
+	return i
+
+
+def get_opti_offset(cat, track_offset):
+	cat.buffer.seek(cat.p_data + track_offset)
+	return CAT_TO_MACT.format_read(cat.buffer, "H")
+
+
+def get_track_chains(cat, track_offsets):
+	# tracks and every track they inherit params from
+	tracks = set()
+	pending = list(track_offsets)
+	while pending:
+		offset = pending.pop()
+		if offset in tracks:
+			continue
+		tracks.add(offset)
+		opti_offset = get_opti_offset(cat, offset)
+		if opti_offset:
+			pending.append(offset + opti_offset)
+	return tracks
+
+
+def get_track_end(cat, track_offset):
+	last_param = cat.read_track(track_offset).params[-1]
+	return last_param.value_offset + last_param.value_size - cat.p_data
+
+
+## PATCH ##
+def get_removed_ranges(ranges):
+	ranges = sorted(ranges)
+	starts = []
+	ends = []
+	removed = []
+	number_of_removed_bytes = 0
+	for start, end in ranges:
+		starts.append(start)
+		ends.append(end)
+		removed.append(number_of_removed_bytes)
+		number_of_removed_bytes += end - start
+	return RemovedRanges(starts, ends, removed)
+
+
+def get_relocation(sections, first, end, fragment):
+	cat = sections.cat
+	node_conditions = set()
+	tracks = []
+	old_conditions = set()
+	old_tracks = []
+	for i, pn in enumerate(sections.nodes):
+		if first <= i < end:
+			old_conditions.update(pn.node.condition_offsets)
+			old_tracks.extend(pn.node.track_offsets)
+		else:
+			node_conditions.update(pn.node.condition_offsets)
+			tracks.extend(pn.node.track_offsets)
+	tracks = get_track_chains(cat, tracks)
+	track_ranges = []
+	for offset in get_track_chains(cat, old_tracks) - tracks:
+		track_ranges.append((offset, get_track_end(cat, offset)))
+	group_users = {}
+	for vg in cat.param_variable_groups:
+		group_users.setdefault(vg.group_offset, []).extend(vg.variable_offsets)
+	# A group is removed once all its users are removed, which may remove
+	# the conditions of the group and then more groups.
+	removed_groups = set()
+	while True:
+		conditions = set(node_conditions)
+		removed_conditions = set(old_conditions)
+		for group_offset, condition_offsets in sections.groups.items():
+			if group_offset in removed_groups:
+				removed_conditions.update(condition_offsets)
+			else:
+				conditions.update(condition_offsets)
+		ranges = list(track_ranges)
+		for offset in removed_conditions - conditions:
+			i = bisect.bisect_left(cat.condition_boundaries, offset)
+			ranges.append((offset, cat.condition_boundaries[i+1]))
+		data = get_removed_ranges(ranges)
+		my_removed_groups = set()
+		for group_offset, users in group_users.items():
+			if len(users) and all(data.get_new_offset(offset) is None for offset in users):
+				my_removed_groups.add(group_offset)
+		if my_removed_groups == removed_groups:
+			break
+		removed_groups = my_removed_groups
+	group_ranges = []
+	for group_offset in removed_groups:
+		group_ranges.append((group_offset, group_offset + 1 + 4*len(sections.groups[group_offset])))
+	groups = get_removed_ranges(group_ranges)
+	removed_condition_bytes = 0
+	for start, end in zip(data.starts, data.ends):
+		if start < sections.condition_end:
+			removed_condition_bytes += end - start
+	new_condition_end = sections.condition_end - removed_condition_bytes
+	fragment_track_start = sections.data_length - data.get_size() + fragment.condition_end
+	fragment_group_start = cat.p_data - cat.p_groups - groups.get_size()
+	relocation = Relocation(data, groups, sections.condition_end, new_condition_end,
+		fragment.condition_end, fragment_track_start, fragment_group_start)
+	return relocation, tracks
+
+
+def write_kept_data(file, data, start, end, removed_ranges):
+	# original data between start and end without the removed ranges
+	for i in range(bisect.bisect_left(removed_ranges.starts, start), len(removed_ranges.starts)):
+		if removed_ranges.starts[i] >= end:
+			break
+		file.write(data[start:removed_ranges.starts[i]])
+		start = removed_ranges.ends[i]
+	file.write(data[start:end])
+
+
+def write_node(file, node, number_of_children, relocate, string_base):
+	MACT_TO_CAT.format_write(file, node.type, "c")
+	if node.type in ('b', 'l', 'n'):
+		MACT_TO_CAT.format_write(file, node.hash, "I")
+		MACT_TO_CAT.format_write(file, len(node.condition_offsets), "B")
+		for offset in node.condition_offsets:
+			MACT_TO_CAT.format_write(file, relocate(offset), "I")
+	if node.type in ('l', 'n'):
+		MACT_TO_CAT.format_write(file, len(node.track_offsets), "B")
+		for offset in node.track_offsets:
+			MACT_TO_CAT.format_write(file, relocate(offset), "I")
+	if node.type in ('r', 'i'):
+		MACT_TO_CAT.format_write(file, node.file_offset + string_base, "I")
+		MACT_TO_CAT.format_write(file, node.path_offset + string_base, "I")
+	if node.type in ('b', 'l', 'n'):
+		MACT_TO_CAT.format_write(file, number_of_children, "H")
+
+
+def write_variables(file, variables):
+	for offset, param_offsets in variables:
+		MACT_TO_CAT.format_write(file, offset, "I")
+		MACT_TO_CAT.format_write(file, len(param_offsets), "H")
+		for param_offset in param_offsets:
+			MACT_TO_CAT.format_write(file, param_offset, "I")
+
+
+def get_variables(variables, relocate, relocate_variable):
+	# (offset, param offsets) of variable strings or groups,
+	# params of removed logic are dropped and so are variables left without params
+	result = []
+	for v in variables:
+		param_offsets = []
+		for offset in v.variable_offsets:
+			offset = relocate(offset)
+			if offset is not None:
+				param_offsets.append(offset)
+		if isinstance(v, CAT_TO_MACT.ParamVariableString):
+			offset = relocate_variable(v.string_offset)
+		else:
+			offset = relocate_variable(v.group_offset)
+		if offset is None or (len(v.variable_offsets) and not len(param_offsets)):
+			continue
+		result.append((offset, param_offsets))
+	return result
+
+
+def count_nodes(nodes):
+	# same counters MACT_TO_CAT writes into the header
+	counters = [0, 0, 0, 0]
+	for pn in nodes:
+		if pn.node.type in ('b',):
+			counters[0] += 1
+		elif pn.node.type in ('l', 'n'):
+			counters[1] += 1
+			if pn.node.type in ('l',):
+				counters[3] += 1
+		else:
+			counters[2] += 1
+	return counters
+
+
+def get_node_kind(node):
+	# leaf Nodes ('l') and Nodes with children ('n') replace each other
+	if node.type in ('b',):
+		return "Bank"
+	elif node.type in ('l', 'n'):
+		return "Node"
+	return "FileReference"
+
+
+def patch_cat(cat, node_position, fragment_cat, f_cat):
+	sections = read_cat_sections(cat)
+	fragment = read_cat_sections(fragment_cat)
+	first = None
+	for i, pn in enumerate(sections.nodes):
+		if pn.node.offset == node_position:
+			first = i
+			break
+	node_kind = get_node_kind(sections.nodes[first].node)
+	fragment_kind = get_node_kind(fragment.nodes[0].node)
+	if node_kind != fragment_kind:
+		print("Error: A {0} can't be replaced by a {1}, unable to patch.".format(node_kind, fragment_kind))
+		return None
+	end = get_subtree_end(sections.nodes, first)
+	relocation, tracks = get_relocation(sections, first, end, fragment)
+	string_base = cat.file_length - cat.p_strings
+
+	## VARIABLES ##
+	def relocate_string(offset):
+		return offset
+
+	def relocate_fragment_string(offset):
+		return string_base + offset
+	string_variables = get_variables(cat.param_variable_strings, relocation.relocate, relocate_string) + \
+		get_variables(fragment_cat.param_variable_strings, relocation.relocate_fragment, relocate_fragment_string)
+	group_variables = get_variables(cat.param_variable_groups, relocation.relocate, relocation.relocate_group) + \
+		get_variables(fragment_cat.param_variable_groups, relocation.relocate_fragment, relocation.relocate_fragment_group)
+	if len(group_variables) != len(sections.groups) - len(relocation.groups.starts) + len(fragment.groups):
+		print("Error: Condition groups and their variables don't match, unable to patch.")
+		return None
+
+	## HEADER ##
+	counters = count_nodes(sections.nodes)
+	old_counters = count_nodes(sections.nodes[first:end])
+	fragment_counters = count_nodes(fragment.nodes)
+	for i in range(0, len(counters)):
+		counters[i] += fragment_counters[i] - old_counters[i]
+	header_position = f_cat.tell()
+	for i in range(0, 8):
+		MACT_TO_CAT.format_write(f_cat, 0, "I")
+	MACT_TO_CAT.format_write(f_cat, len(string_variables), "I")
+	write_variables(f_cat, string_variables)
+	MACT_TO_CAT.format_write(f_cat, len(group_variables), "I")
+	write_variables(f_cat, group_variables)
+
+	## CAT TREE ##
+	for pn in sections.nodes[:first]:
+		write_node(f_cat, pn.node, pn.number_of_children, relocation.relocate, 0)
+	for pn in fragment.nodes:
+		write_node(f_cat, pn.node, pn.number_of_children, relocation.relocate_fragment, string_base)
+	for pn in sections.nodes[end:]:
+		write_node(f_cat, pn.node, pn.number_of_children, relocation.relocate, 0)
+
+	## CONDITION GROUPS ##
+	p_groups = f_cat.tell()
+	for group_offset, condition_offsets in sections.groups.items():
+		if relocation.relocate_group(group_offset) is None:
+			continue
+		MACT_TO_CAT.format_write(f_cat, len(condition_offsets), "B")
+		for offset in condition_offsets:
+			MACT_TO_CAT.format_write(f_cat, relocation.relocate(offset), "I")
+	for condition_offsets in fragment.groups.values():
+		MACT_TO_CAT.format_write(f_cat, len(condition_offsets), "B")
+		for offset in condition_offsets:
+			MACT_TO_CAT.format_write(f_cat, relocation.relocate_fragment(offset), "I")
+
+	## PARAMS DATA ##
+	p_data = f_cat.tell()
+	data = cat.buffer.data[cat.p_data:cat.p_strings]
+	fragment_data = fragment_cat.buffer.data[fragment_cat.p_data:fragment_cat.p_strings]
+	write_kept_data(f_cat, data, 0, sections.condition_end, relocation.data)
+	f_cat.write(fragment_data[:fragment.condition_end])
+	write_kept_data(f_cat, data, sections.condition_end, sections.data_length, relocation.data)
+	f_cat.write(fragment_data[fragment.condition_end:])
+	data.release()
+	fragment_data.release()
+	p_strings = f_cat.tell()
+	# removed tracks may have been between a track and the one it inherits from
+	for offset in tracks:
+		opti_offset = get_opti_offset(cat, offset)
+		if opti_offset:
+			new_offset = relocation.relocate(offset)
+			new_opti_offset = relocation.relocate(offset + opti_offset) - new_offset
+			if new_opti_offset != opti_offset:
+				f_cat.seek(p_data + new_offset)
+				MACT_TO_CAT.format_write(f_cat, new_opti_offset, "H")
+	f_cat.seek(p_strings)
+
+	## STRINGS ##
+	f_cat.write(cat.buffer.data[cat.p_strings:cat.file_length])
+	f_cat.write(fragment_cat.buffer.data[fragment_cat.p_strings:fragment_cat.file_length])
+
+	## FIX HEADER ##
+	file_length = f_cat.tell()
+	f_cat.seek(header_position)
+	MACT_TO_CAT.format_write(f_cat, file_length, "I")  # file_length
+	MACT_TO_CAT.format_write(f_cat, p_data, "I")  # p_data
+	MACT_TO_CAT.format_write(f_cat, p_strings, "I")  # p_strings
+	MACT_TO_CAT.format_write(f_cat, p_groups, "I")  # p_groups
+	MACT_TO_CAT.format_write(f_cat, counters[0] - 1, "I")  # counterA
+	MACT_TO_CAT.format_write(f_cat, counters[1], "I")  # counterB
+	MACT_TO_CAT.format_write(f_cat, counters[2], "I")  # counterC
+	MACT_TO_CAT.format_write(f_cat, counters[3], "I")  # counterD
+	f_cat.seek(file_length)
+	pad = file_length % 1024
+	pad = 1024 - pad
+	f_cat.write(pad*b'\00')
+	print("Info: Replaced {0} nodes with {1} nodes; Removed {2} bytes of unused logic and {3} unused groups.".format(
+		end - first, len(fragment.nodes), relocation.data.get_size(), len(relocation.groups.starts)))
+	return file_length
+
+
+def compile_fragment(fn_fragment):
+	if MACT_TO_CAT.get_mact_extension(fn_fragment) == ".mactb":
+		f_input = MACT_TO_CAT.open_mact_file(fn_fragment, "rb")
+		logic_tree = MACT_TO_CAT.read_mactb(f_input.read())
+		f_input.close()
+	else:
+		f_input = MACT_TO_CAT.open_mact_file(fn_fragment, "r")
+		logic_tree = MACT_TO_CAT.parse_mact(f_input.readlines())
+		f_input.close()
+	return compile_fragment_tree(logic_tree, fn_fragment)
+
+
+def compile_fragment_tree(logic_tree, fn_fragment):
+	# the root of a fragment can be a Bank or a Node
+	if logic_tree is None:
+		return None
+	fragment_data = io.BytesIO()
+	MACT_TO_CAT.bool_enable_param_optimization = bool_patch_param_optimization
+	MACT_TO_CAT.compile_logic_tree(logic_tree, fragment_data)
+	return CAT_TO_MACT.open_cat_bytes(fragment_data.getvalue(), fn_fragment)
+
+
+## MAIN ##
+def main():
+	global bool_patch_param_optimization
+
+	# Get the CAT file, node path, MACT fragment and output CAT file from sys.argv
+	cat_path = None
+	node_path = None
+	fn_fragment = None
+	fn_output = None
+	sys_argv = sys.argv[1:]
+	for i, arg in enumerate(sys_argv):
+		if sys_argv[i].upper() == "--PO":
+			bool_patch_param_optimization = True
+		elif sys_argv[i].upper() == "--OUT":
+			try:
+				fn_output = sys_argv[i+1]
+			except:
+				print("Error: No path argument for output.")
+				quit()
+		elif i and sys_argv[i-1].upper() == "--OUT":
+			continue
+		elif sys_argv[i].endswith(".cat") and cat_path is None:
+			cat_path = sys_argv[i]
+		elif MACT_TO_CAT.get_mact_extension(sys_argv[i]) is not None:
+			fn_fragment = sys_argv[i]
+		else:
+			node_path = sys_argv[i]
+	if cat_path is None or node_path is None or fn_fragment is None:
+		print("Error: A CAT file, a node path and a MACT file are required.")
+		quit()
+	if fn_output is None:
+		fn_output = cat_path
+
+	CAT_TO_MACT.bool_print_debug = bool_print_debug
+	CAT_TO_MACT.load_db_hashes()
+	CAT_TO_MACT.load_db_logics()
+	MACT_TO_CAT.load_db_logics()
+
+	print("<< {0} -> {1} >>".format(cat_path, fn_output))
+	cat = CAT_TO_MACT.open_cat_file(cat_path, cat_path)
+	node_paths = CAT_TO_MACT.get_node_paths(CAT_TO_MACT.build_node_index(cat))
+	my_path = CAT_TO_MACT.find_node_path(node_paths, node_path)
+	if my_path is None:
+		print("Error: No node '{0}' in '{1}'.".format(node_path, cat_path))
+		quit()
+	print("-> Compiling '{0}' for '{1}'.".format(fn_fragment, my_path))
+	# the new data is written in the byte order of the CAT file it goes into
+	MACT_TO_CAT.bool_little_endian = cat.buffer.byte_order == "<"
+	fragment_cat = compile_fragment(fn_fragment)
+	if fragment_cat is None:
+		quit()
+	print("-> Patching CAT file.")
+	patched = io.BytesIO()
+	file_length = patch_cat(cat, node_paths[my_path], fragment_cat, patched)
+	if file_length is None:
+		quit()
+	# the original CAT may be mapped, close it before writing over it
+	cat.close()
+	fragment_cat.close()
+	f_cat = open(fn_output, "wb")
+	f_cat.write(patched.getvalue())
+	f_cat.close()
+	print("Info: File size: {0} bytes.".format(file_length))
+
+	# End #
+	print("-> Done.")
+
+
+if __name__ == "__main__":
+	main()
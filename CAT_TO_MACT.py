@@ -5,23 +5,46 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
 	from typing_extensions import Self
 import struct
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import math
 import numpy
-from itertools import chain
+import bisect
+import io
 import os
 import sys
+import mmap
+import json
+import hashlib
+import sqlite3
+import time
+import MACT_TO_CAT
+import IMG_ARCHIVE
+try:
+	import msgpack
+except ImportError:
+	msgpack = None
 
 
 ## SETTINGS ##
+# byte order of CAT files whose header doesn't tell, see get_byte_order()
 bool_little_endian = 1
+bool_mmap_input = 1
 bool_skip_id_zero = 1
 bool_guess_param_types = 1
 bool_generate_mact = 0
 bool_generate_templates = 0
+bool_generate_mactb = 0
+# "jsonl" or "msgpack" to export records instead of MACT
+export_format = None
+# ".gz" or ".xz" to compress output files while they are written
+compressed_extension = ""
 bool_write_debug = 0
 bool_print_debug = 1
 number_of_param_digits = 5
+# folder of the decompile cache, None to always decompile, see get_cache_entry_path()
+cache_path = None
+# bytes kept in the cache, the least recently used outputs are removed past it
+max_cache_size = 1 << 30
 
 
 @dataclass
@@ -37,10 +60,20 @@ class DbParam:
 	type: str
 
 
+# Hash values sorted for searchsorted, titles are packed into one UTF-8 blob:
+# the title of keys[i] is titles[offsets[i]:offsets[i+1]].
+# Only flat arrays, forked workers share them without copying.
 @dataclass
-class HashHelper:
-	title: str
-	hashes: list[str]
+class HashTable:
+	keys: numpy.ndarray
+	offsets: numpy.ndarray
+	titles: bytes
+
+	def get_title(self, key):
+		i = int(numpy.searchsorted(self.keys, key))
+		if i == len(self.keys) or self.keys[i] != key:
+			return None
+		return self.titles[self.offsets[i]:self.offsets[i+1]].decode('utf-8')
 
 
 @dataclass
@@ -75,7 +108,20 @@ class Param:
 	offset: int
 	id: int
 	type: str
-	value: bytes
+	# value is not copied, it is referenced by its position inside the CAT buffer,
+	# the buffer is left out of repr() or every printed param would print the whole file
+	cat_buffer: CatBuffer = field(repr=False)
+	value_offset: int
+	value_size: int
+
+	@property
+	def value(self):
+		return cat_buffer_view(self.cat_buffer, self.value_offset, self.value_size)
+
+	@property
+	def raw_value(self):
+		# value as it is in the file, in the byte order of the CAT
+		return self.cat_buffer.data[self.value_offset:self.value_offset+self.value_size]
 
 
 @dataclass
@@ -99,15 +145,162 @@ class CatNode:
 	children: list[Self]
 
 
+@dataclass
+class CatBuffer:
+	# source is either a read-only mmap of the CAT file or its bytes,
+	# CATs inside IMG archives share the mmap of the archive and start at base
+	source: object
+	data: memoryview
+	position: int = 0
+	base: int = 0
+	archive: IMG_ARCHIVE.ImgArchive = None
+	# "<" or ">", set from the header by read_cat_header()
+	byte_order: str = "<"
+	# little-endian copy of the param values of big-endian CATs, see swap_param_values()
+	values: object = None
+
+	def tell(self):
+		return self.position
+
+	def seek(self, offset, whence=0):
+		if whence == 1:
+			offset += self.position
+		elif whence == 2:
+			offset += len(self.data)
+		self.position = offset
+		return self.position
+
+	def read(self, size):
+		# zero-copy, returns a slice of the CAT buffer
+		view = self.data[self.position:self.position+size]
+		self.position += len(view)
+		return view
+
+	def close(self):
+		self.data.release()
+		# archives are closed by close_img_archives()
+		if isinstance(self.source, mmap.mmap) and self.archive is None:
+			self.source.close()
+
+
+# IMG archives stay open while their CATs are read
+img_archives = {}
+def get_img_archive(img_path):
+	archive = img_archives.get(img_path)
+	if archive is None:
+		archive = IMG_ARCHIVE.open_img_archive(img_path)
+		img_archives[img_path] = archive
+	return archive
+
+
+def close_img_archives():
+	for archive in img_archives.values():
+		archive.close()
+	img_archives.clear()
+
+
+def get_img_cat_files(img_path):
+	# (path, name) of every CAT file inside an IMG archive
+	cat_files = []
+	for entry in get_img_archive(img_path).entries:
+		if entry.name.lower().endswith(".cat"):
+			cat_files.append((img_path + ":" + entry.name, entry.name))
+	return cat_files
+
+
+def open_cat_buffer(cat_path):
+	img_path, entry_name = IMG_ARCHIVE.split_archive_path(cat_path)
+	if img_path is not None:
+		archive = get_img_archive(img_path)
+		entry = archive.get_entry(entry_name)
+		if entry is None:
+			print("Error: No '{0}' found in '{1}'.".format(entry_name, img_path))
+			quit()
+		if not bool_mmap_input:
+			data = bytes(archive.get_entry_data(entry))
+			return CatBuffer(data, memoryview(data))
+		return CatBuffer(archive.source, archive.get_entry_data(entry), 0, entry.offset, archive)
+	file = open(cat_path, "rb")
+	source = None
+	if bool_mmap_input:
+		try:
+			source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+		except (ValueError, OSError):
+			# empty files and special files can't be mapped
+			source = None
+	if source is None:
+		source = file.read()
+	file.close()
+	return CatBuffer(source, memoryview(source))
+
+
+def cat_buffer_view(cat_buffer, offset, size):
+	# param values always come in little-endian order
+	if cat_buffer.values is not None:
+		return cat_buffer.values[offset:offset+size]
+	return cat_buffer.data[offset:offset+size]
+
+
+def get_byte_order(data):
+	# Only the right byte order gives header offsets that fit in the file:
+	# p_groups <= p_data <= p_strings <= file_length <= file size
+	default_byte_order = "<" if bool_little_endian else ">"
+	if len(data) < 36:
+		return default_byte_order
+	byte_orders = []
+	for byte_order in ("<", ">"):
+		file_length, p_data, p_strings, p_groups = struct_codecs[byte_order]["4I"].unpack_from(data, 0)
+		if 36 <= p_groups <= p_data <= p_strings <= file_length <= len(data):
+			byte_orders.append(byte_order)
+	if len(byte_orders) == 1:
+		return byte_orders[0]
+	if not len(byte_orders):
+		print("Warning: Unable to detect the byte order of the CAT file, reading it as {0}.".format(
+			"little-endian" if bool_little_endian else "big-endian"))
+	return default_byte_order
+
+
+def swap_param_values(cat):
+	# Big-endian CATs get a little-endian copy of their param values so they
+	# read like any other CAT file. Conditions are made of 4 byte values only,
+	# tracks are walked for theirs, then all values are swapped at once.
+	file = cat.buffer
+	p_condition_end = cat.p_data + cat.condition_boundaries[-1]
+	value_offsets = [numpy.arange(cat.p_data, p_condition_end - 3, 4, dtype=numpy.int64)]
+	track_value_offsets = []
+	position = p_condition_end
+	param_data_codec = struct_codecs[file.byte_order]["H"]
+	# optimization offset, then (param data, value) until the last param flag
+	while position + 4 <= cat.p_strings:
+		position += 2
+		param_flag = 1
+		while param_flag and position + 2 <= cat.p_strings:
+			param_data, = param_data_codec.unpack_from(file.data, position)
+			param_flag = param_data & 0x0001
+			position += 2
+			if param_data & 0x0004:
+				track_value_offsets.append(position)
+				position += 4
+			else:
+				position += 1
+	value_offsets.append(numpy.array(track_value_offsets, dtype=numpy.int64))
+	value_offsets = numpy.concatenate(value_offsets)
+	value_offsets = value_offsets[value_offsets + 4 <= cat.p_strings]
+	values = numpy.frombuffer(file.data, dtype=numpy.uint8).copy()
+	positions = value_offsets[:, None] + numpy.arange(4)
+	values[positions] = values[positions[:, ::-1]]
+	file.values = memoryview(values)
+
+
+# Struct objects are compiled once per byte order and format instead of once per read
+struct_codecs = {"<": {"4I": struct.Struct("<4I")}, ">": {"4I": struct.Struct(">4I")}}
 def format_read(file, format):
-	global bool_little_endian
-	if bool_little_endian == 1:
-		format = "<"+format
-	else:
-		format = ">"+format
-	size = struct.calcsize(format)
-	data = file.read(size)
-	value = struct.unpack(format, data)
+	compiled_struct = struct_codecs[file.byte_order].get(format)
+	if compiled_struct is None:
+		compiled_struct = struct.Struct(file.byte_order+format)
+		struct_codecs[file.byte_order][format] = compiled_struct
+	value = compiled_struct.unpack_from(file.data, file.position)
+	file.position += compiled_struct.size
 	if len(value) == 1:
 		value = value[0]
 	return value
@@ -130,14 +323,14 @@ def signal(bit):
 
 
 def read_string(file):
-	bool_end = 0
-	string = ""
-	while not bool_end:
-		c = file.read(1)
-		if not c or c == b'\x00':
-			bool_end = 1
-			break
-		string = string+c.decode('utf-8')
+	start = file.tell()
+	end = file.source.find(b'\x00', file.base + start, file.base + len(file.data))
+	if end < 0:
+		end = len(file.data)
+	else:
+		end -= file.base
+	string = str(file.data[start:end], 'utf-8')
+	file.seek(min(end+1, len(file.data)))
 	return string
 
 
@@ -194,49 +387,83 @@ bool_has_db_tracks = False
 bool_has_db_conditions = False
 
 ## READ DB HASHES ##
-def read_db_hashes(file, db):
+def read_db_hashes(file, entries):
 	hash_lines = file.readlines()
 	for l in hash_lines:
 		kws = get_keywords_from_line(l)
+		if not len(kws):
+			continue
 		title = kws[0]
-		hashes = [h.upper() for h in kws[1:]]
-		hh = HashHelper(title, hashes)
-		db.append(hh)
-db_hashes = []
-db_hashes_titles = []
-db_hashes_generic = []
+		for h in kws[1:]:
+			try:
+				key = int(h, 16)
+			except ValueError:
+				key = -1
+			if key < 0 or key > 0xFFFFFFFF:
+				print("Warning: Bad hash '{0}' for '{1}'.".format(h, title))
+				continue
+			entries.append((key, title))
+
+
+def build_hash_table(entries):
+	keys = numpy.array([key for key, title in entries], dtype=numpy.uint32)
+	order = numpy.argsort(keys, kind='stable')
+	keys = keys[order]
+	# repeated hashes keep the title that was read first
+	first = numpy.ones(len(keys), dtype=bool)
+	first[1:] = keys[1:] != keys[:-1]
+	keys = keys[first]
+	titles = [entries[i][1].encode('utf-8') for i in order[first]]
+	offsets = numpy.zeros(len(titles)+1, dtype=numpy.uint32)
+	offsets[1:] = numpy.cumsum([len(t) for t in titles])
+	return HashTable(keys, offsets, b''.join(titles))
+db_hashes = build_hash_table([])
+db_hashes_titles = build_hash_table([])
+db_hashes_generic = build_hash_table([])
 fn_track_hashes = "DB"+os.sep+"HASHES_TRACKS.txt"
 fn_condition_hashes = "DB"+os.sep+"HASHES_CONDITIONS.txt"
 fn_title_hashes = "DB"+os.sep+"HASHES_TITLES.txt"
 fn_generic_hashes = "DB"+os.sep+"HASHES_GENERIC.txt"
-if os.path.exists(fn_track_hashes):
-	track_hashes = open(fn_track_hashes, "r")
-	read_db_hashes(track_hashes, db_hashes)
-	track_hashes.close()
-	bool_has_db_hashes = True
-else:
-	print("Warning: No '{0}' found.".format(fn_track_hashes))
-if os.path.exists(fn_condition_hashes):
-	condition_hashes = open(fn_condition_hashes, "r")
-	read_db_hashes(condition_hashes, db_hashes)
-	condition_hashes.close()
-	bool_has_db_hashes = True
-else:
-	print("Warning: No '{0}' found.".format(fn_condition_hashes))
-if os.path.exists(fn_title_hashes):
-	title_hashes = open(fn_title_hashes, "r")
-	read_db_hashes(title_hashes, db_hashes_titles)
-	title_hashes.close()
-	bool_has_db_hashes_titles = True
-else:
-	print("Warning: No '{0}' found.".format(fn_title_hashes))
-if os.path.exists(fn_generic_hashes):
-	generic_hashes = open(fn_generic_hashes, "r")
-	read_db_hashes(generic_hashes, db_hashes_generic)
-	generic_hashes.close()
-	bool_has_db_hashes_generic = True
-else:
-	print("Warning: No '{0}' found.".format(fn_generic_hashes))
+
+
+def load_db_hashes():
+	global db_hashes, db_hashes_titles, db_hashes_generic
+	global bool_has_db_hashes, bool_has_db_hashes_titles, bool_has_db_hashes_generic
+	hash_entries = []
+	title_entries = []
+	generic_entries = []
+	if os.path.exists(fn_track_hashes):
+		track_hashes = open(fn_track_hashes, "r")
+		read_db_hashes(track_hashes, hash_entries)
+		track_hashes.close()
+		bool_has_db_hashes = True
+	else:
+		print("Warning: No '{0}' found.".format(fn_track_hashes))
+	if os.path.exists(fn_condition_hashes):
+		condition_hashes = open(fn_condition_hashes, "r")
+		read_db_hashes(condition_hashes, hash_entries)
+		condition_hashes.close()
+		bool_has_db_hashes = True
+	else:
+		print("Warning: No '{0}' found.".format(fn_condition_hashes))
+	if os.path.exists(fn_title_hashes):
+		title_hashes = open(fn_title_hashes, "r")
+		read_db_hashes(title_hashes, title_entries)
+		title_hashes.close()
+		bool_has_db_hashes_titles = True
+	else:
+		print("Warning: No '{0}' found.".format(fn_title_hashes))
+	if os.path.exists(fn_generic_hashes):
+		generic_hashes = open(fn_generic_hashes, "r")
+		read_db_hashes(generic_hashes, generic_entries)
+		generic_hashes.close()
+		bool_has_db_hashes_generic = True
+	else:
+		print("Warning: No '{0}' found.".format(fn_generic_hashes))
+	db_hashes = build_hash_table(hash_entries)
+	db_hashes_titles = build_hash_table(title_entries)
+	db_hashes_generic = build_hash_table(generic_entries)
+
 
 def read_db_logics(file):
 	db_logics = []
@@ -266,144 +493,103 @@ db_tracks = []
 db_conditions = []
 fn_dbt = "TEMPLATES"+os.sep+"TEMPLATES_TRACKS.txt"
 fn_dbc = "TEMPLATES"+os.sep+"TEMPLATES_CONDITIONS.txt"
-if os.path.exists(fn_dbt):
-	file_dbt = open(fn_dbt, "r")
-	db_tracks = read_db_logics(file_dbt)
-	file_dbt.close()
-	bool_has_db_tracks = True
-else:
-	print("Warning: No '{0}' found.".format(fn_dbt))
-if os.path.exists(fn_dbc):
-	file_dtc = open(fn_dbc, "r")
-	db_conditions = read_db_logics(file_dtc)
-	file_dtc.close()
-	bool_has_db_conditions = True
-else:
-	print("Warning: No '{0}' found.".format(fn_dbc))
-
-
-# Get MODE and 
-# get CAT files from sys.argv if MODE is regular CAT_TO_MACT,
-# get CAT path from sys.argv if MODE is GENERATE_TEMPLATES.
-my_cat_files = []
-cat_path = None
-sys_argv = sys.argv[1:]
-for i, arg in enumerate(sys_argv):
-	if sys_argv[i].upper() == "--GENERATE-TEMPLATES":
-		bool_generate_mact = 0
-		bool_generate_templates = 1
-		my_cat_files = []
-		try:
-			cat_path = sys_argv[i+1]
-			break
-		except:
-			print("Error: No path argument for template generation.")
-			quit()
-	if sys_argv[i].endswith(".cat"):
-		bool_generate_mact = 1
-		bool_generate_templates = 0
-		my_cat_files.append((sys_argv[i], sys_argv[i]))
-if bool_generate_templates:
-	for root, dirs, files in os.walk(cat_path):
-		for name in files:
-			if name.endswith(".cat"):
-				my_cat_files.append((root + os.sep + name, name))
-if not len(my_cat_files):
-	print("Error: No CAT files found.")
-	quit()
 
 
-# Globals for template generation
-global_chelpers = []
-global_thelpers = []
-debug_used_generic_hashes = []
+def load_db_logics():
+	global db_tracks, db_conditions, bool_has_db_tracks, bool_has_db_conditions
+	if os.path.exists(fn_dbt):
+		file_dbt = open(fn_dbt, "r")
+		db_tracks = read_db_logics(file_dbt)
+		file_dbt.close()
+		bool_has_db_tracks = True
+	else:
+		print("Warning: No '{0}' found.".format(fn_dbt))
+	if os.path.exists(fn_dbc):
+		file_dtc = open(fn_dbc, "r")
+		db_conditions = read_db_logics(file_dtc)
+		file_dtc.close()
+		bool_has_db_conditions = True
+	else:
+		print("Warning: No '{0}' found.".format(fn_dbc))
 
-# If in generate_templates mode
-# go through all CAT files, gather logic for template,
-# otherwise gather logic for MACT.
-for cat_path, cat_name in my_cat_files:
-	# Open file
-	file = open(cat_path, "rb")
 
-	if bool_print_debug:
-		print("<< {0} >>".format(cat_name))
-		print("{0} -> Reading header.".format(file.tell()))
+def get_hash_key(bytes):
+	# Same value pretty_bytes shows, "0x88EE6637" -> 0x88EE6637
+	if bytes is None:
+		return None
+	if(isinstance(bytes, int)):
+		bytes = bytes.to_bytes(4, byteorder='little')
+	if len(bytes) != 4:
+		return None
+	return int.from_bytes(bytes, byteorder='big')
 
-	## HEADER ##
-	file_length = format_read(file, "I")
-	p_data = format_read(file, "I")
-	p_strings = format_read(file, "I")
-	p_groups = format_read(file, "I")
-	counterA = format_read(file, "I")
-	counterB = format_read(file, "I")
-	counterC = format_read(file, "I")
-	counterD = format_read(file, "I")
-	number_of_strings = format_read(file, "I")
 
-	if bool_print_debug:
-		print("{0} -> Reading variables.".format(file.tell()))
+def _check_hash(bytes, db):
+	key = get_hash_key(bytes)
+	if key is None:
+		return None
+	return db.get_title(key)
 
-	## PARAM VARIABLE STRINGS ##
-	param_variable_strings = []
-	for i in range(0, number_of_strings):
-		string_offset = format_read(file, "I")
-		number_of_variables = format_read(file, "H")
-		variable_offsets = []
-		for j in range(0, number_of_variables):
-			offset = format_read(file, "I")
-			variable_offsets.append(offset)
-		vs = ParamVariableString(
-			string_offset, number_of_variables, variable_offsets)
-		param_variable_strings.append(vs)
 
-	number_of_groups = format_read(file, "I")
+def check_hash_logic(bytes):
+	return _check_hash(bytes, db_hashes)
 
-	## PARAM VARIABLE GROUPS ##
-	param_variable_groups = []
-	for i in range(0, number_of_groups):
-		group_offset = format_read(file, "I")
-		number_of_variables = format_read(file, "H")
-		variable_offsets = []
-		for j in range(0, number_of_variables):
-			offset = format_read(file, "I")
-			variable_offsets.append(offset)
-		vg = ParamVariableGroup(group_offset, number_of_variables, variable_offsets)
-		param_variable_groups.append(vg)
 
-	if bool_print_debug:
-		print("{0} -> Reading node tree.".format(file.tell()))
-
-	def _check_hash(bytes, db):
-		string = pretty_bytes(bytes)
-		for hh in db:
-			for h in hh.hashes:
-				if string.upper() == h.upper():
-					return hh.title
-		return None
+# Used by generic hash check
+debug_used_generic_hashes = []
+def check_hash_generic(bytes):
+	result = _check_hash(bytes, db_hashes_generic)
+	if result is not None:
+		if result not in debug_used_generic_hashes:
+			debug_used_generic_hashes.append(result)
+	return result
 
-	def check_hash_logic(bytes):
-		return _check_hash(bytes, db_hashes)
 
-	def check_hash_generic(bytes):
-		result = _check_hash(bytes, db_hashes_generic)
-		if result is not None:
-			if result not in debug_used_generic_hashes:
-				debug_used_generic_hashes.append(result)
-		return result
-	
-	def check_hash_title(bytes):
-		return _check_hash(bytes, db_hashes_titles)
+def check_hash_title(bytes):
+	return _check_hash(bytes, db_hashes_titles)
 
-	## NODE TREE ##
-	def read_cat_tree():
-		offset = file.tell()
+
+## CAT FILE ##
+# A CatFile only keeps the header, the variable tables and the condition boundaries,
+# nodes, conditions, tracks and strings are decoded on demand from the CAT buffer.
+@dataclass
+class CatFile:
+	name: str
+	buffer: CatBuffer
+	file_length: int
+	p_data: int
+	p_strings: int
+	p_groups: int
+	counterA: int
+	counterB: int
+	counterC: int
+	counterD: int
+	p_tree: int
+	param_variable_strings: list[ParamVariableString]
+	param_variable_groups: list[ParamVariableGroup]
+	# param offset -> string offset, param offset -> group offset
+	string_references: dict[int, int]
+	group_references: dict[int, int]
+	# group offsets found in the variable condition group section
+	group_offsets: set[int]
+	# sorted offsets of all conditions followed by the end of the condition section,
+	# used to determine condition length:
+	# [0-8]COND0, [8-16]COND1, [16-32]COND2, [32-64]TRACK0
+	condition_boundaries: list[int]
+
+	def close(self):
+		self.buffer.close()
+
+	def _read_cat_node(self, position):
+		file = self.buffer
+		file.seek(position)
 		node_type = format_read(file, "c").decode('utf-8')
 		node_hash = None
 		file_offset = None
 		path_offset = None
 		condition_offsets = []
 		track_offsets = []
-		children = []
+		number_of_children = 0
 		if node_type in ('b', 'l', 'n'):
 			node_hash = format_read(file, "I")
 			number_of_conditions = format_read(file, "B")
@@ -420,141 +606,69 @@ for cat_path, cat_name in my_cat_files:
 			path_offset = format_read(file, "I")
 		if node_type in ('b', 'l', 'n'):
 			number_of_children = format_read(file, "H")
-			for j in range(0, number_of_children):
-				child = read_cat_tree()
-				children.append(child)
+		node = CatNode(position, node_type, node_hash, file_offset, path_offset, condition_offsets, track_offsets, [])
+		return node, number_of_children, file.tell()
+
+	def read_cat_node(self, position):
+		# Returns node without children, number of children and position of the first child
+		node, number_of_children, position = self._read_cat_node(position)
 		# check for node_hash -> title replacement
-		title = check_hash_title(node_hash)
+		title = check_hash_title(node.hash)
 		if title is not None:
-			node_hash = title
-		return CatNode(offset, node_type, node_hash, file_offset, path_offset, condition_offsets, track_offsets, children)
-
-	def get_nodes(root):
-		nodes = []
-		nodes.append(root)
-		for c in root.children:
-			nodes = nodes + get_nodes(c)
-		return nodes
-	tree = read_cat_tree()
-
-	if bool_print_debug:
-		print("{0} -> Reading variable condition groups.".format(file.tell()))
-
-	## VARIABLE CONDITION GROUPS ##
-	variable_condition_groups = []
-	for i in range(0, number_of_groups):
-		offset = file.tell()
-		number_of_conditions = format_read(file, "B")
-		condition_offsets = []
-		for j in range(0, number_of_conditions):
-			condition_offset = format_read(file, "I")
-			condition_offsets.append(condition_offset)
-		cg = VariableConditionGroup(offset, condition_offsets)
-		variable_condition_groups.append(cg)
-
-	## DATA ##
-	conditions = []
-	tracks = []
-	nodes = get_nodes(tree)
-
-	# node helpers
-	def noffsort(e):
-		return e.offset
-	chelpers = []
-	thelpers = []
-	vcghelpers = []
-	# Function to check for repeated offsets, merge helper if offset is repeated
-	def merge_helper_from_offset(node, new_offset, helper_list):
-		repeated = False
-		for helper in helper_list:
-			if(helper.offset == new_offset):
-				# Match found, append node to helper
-				repeated = True
-				helper.nodes.append(node)
-				break
-		return repeated
-	# Gather condition offsets and track offsets from CAT TREE NODES
-	for node in nodes:
-		for offset in node.condition_offsets:
-			repeated = merge_helper_from_offset(node, offset, chelpers)
-			if not repeated:
-				new_helper = LogicHelper([node], offset, None, None, [])
-				chelpers.append(new_helper)
-		for offset in node.track_offsets:
-			repeated = merge_helper_from_offset(node, offset, thelpers)
-			if not repeated:
-				new_helper = LogicHelper([node], offset, None, None, [])
-				thelpers.append(new_helper)
-	# Gather condition offsets from VARIABLE CONDITION GROUPS
-	for vcg in variable_condition_groups:
-		for offset in vcg.condition_offsets:
-			# never remove this line ever, this function is way more important than I remembered, big headaches
-			repeated = merge_helper_from_offset(vcg, offset, chelpers)
-			if not repeated:
-				new_helper = LogicHelper([vcg], offset, None, None, [])
-				chelpers.append(new_helper)
-				vcghelpers.append(new_helper)
-	# This spaghetti will determine condition length based on list of all nearby conditions
-	# and the start of the first track
-	# [0-8]COND0, [8-16]COND1, [16-32]COND2, [32-64]TRACK0
-	chelpers.sort(key=noffsort)
-	thelpers.sort(key=noffsort)
-	if thelpers:
-		pos_condition_end = thelpers[0].offset
-	else:
-		pos_condition_end = p_strings
-	# Spaghetti
-	magic_offsets = [g.condition_offsets for g in variable_condition_groups]
-	magic_offsets = list(chain.from_iterable(magic_offsets))
-	magic_offsets = [c.offset for c in chelpers] + \
-		magic_offsets + [pos_condition_end]
-	magic_offsets = list(dict.fromkeys(magic_offsets))
-	magic_offsets.sort()
-	# print(magic_offsets)
-	# clen = [int((magic_offsets[i] - magic_offsets[i-1])/4) for i, o in enumerate(magic_offsets)][1:]
-
-	
-	# This function will run through all stored variable strings offsets and variable groups offsets
+			node.hash = title
+		return node, number_of_children, position
+
+	def read_cat_tree(self, position=None):
+		# Materialize the whole node tree (or the subtree at position)
+		if position is None:
+			position = self.p_tree
+		root, _ = self._read_cat_tree(position)
+		return root
+
+	def _read_cat_tree(self, position):
+		node, number_of_children, position = self.read_cat_node(position)
+		for j in range(0, number_of_children):
+			child, position = self._read_cat_tree(position)
+			node.children.append(child)
+		return node, position
+
+	# This function will check the variable strings offsets and variable groups offsets
 	# to try to find a match with a param offset, target_offset
 	# If a match is found, it means this param's value is determined by that variable string/group
 	# We'll then return the param type based on that.
-	def get_type_from_references(target_offset):
-		for vs in param_variable_strings:
-			for offset in vs.variable_offsets:
-				if target_offset == offset:
-					# match
-					return "string"
-		for vg in param_variable_groups:
-			for offset in vg.variable_offsets:
-				if target_offset == offset:
-					# match
-					return "cg"
+	def get_type_from_references(self, target_offset):
+		if target_offset in self.string_references:
+			return "string"
+		if target_offset in self.group_references:
+			return "cg"
 		return "unk"
 
-	if bool_print_debug:
-		print("{0} -> Reading condition params.".format(file.tell()))
-	# condition helpers -- read params
-	for i, ch in enumerate(chelpers):
-		file.seek(p_data + ch.offset)
-		for j in range(len(magic_offsets)):
-			if ch.offset == magic_offsets[j]:
-				my_length = int((magic_offsets[j+1] - magic_offsets[j]) / 4)
-				for k in range(my_length):
-					param_offset = file.tell() - p_data
-					my_type = get_type_from_references(param_offset)
-					param_value = file.read(4)
-					param = Param(ch, param_offset, k, my_type, param_value)
-					ch.params.append(param)
-		# set condition hash to value of param[0]
-		ch.hash = ch.params[0].value
-
-	
-	if bool_print_debug:
-		print("{0} -> Reading track params.".format(file.tell()))
-	# track helpers -- read params
-	for th1 in thelpers:
-		opti_offset = format_read(file, "H")
-		th1.opti_offset = opti_offset
+	def read_condition(self, offset):
+		file = self.buffer
+		helper = LogicHelper([], offset, None, None, [])
+		i = bisect.bisect_left(self.condition_boundaries, offset)
+		if i + 1 < len(self.condition_boundaries) and self.condition_boundaries[i] == offset:
+			my_length = int((self.condition_boundaries[i+1] - offset) / 4)
+			file.seek(self.p_data + offset)
+			for k in range(my_length):
+				param_offset = file.tell() - self.p_data
+				my_type = self.get_type_from_references(param_offset)
+				param = Param(helper, param_offset, k, my_type, file, file.tell(), 4)
+				file.seek(4, 1)
+				helper.params.append(param)
+		if helper.params:
+			# set condition hash to value of param[0]
+			helper.hash = bytes(helper.params[0].value)
+		else:
+			print("Error: Unable to read condition at offset {0}.".format(self.p_data+offset))
+		return helper
+
+	def read_track(self, offset):
+		# Track params exactly as stored, see read_unoptimized_track()
+		file = self.buffer
+		helper = LogicHelper([], offset, None, None, [])
+		file.seek(self.p_data + offset)
+		helper.opti_offset = format_read(file, "H")
 		bool_end = 0
 		while not bool_end:
 			param_data = format_read(file, "H")
@@ -562,49 +676,43 @@ for cat_path, cat_name in my_cat_files:
 			param_unk = get_bits(param_data, 1, 2)
 			param_size = get_bits(param_data, 2, 3)
 			param_id = get_bits(param_data, 3, 16)
-			param_offset = file.tell() - p_data
-			my_type = get_type_from_references(param_offset)
+			param_offset = file.tell() - self.p_data
+			my_type = self.get_type_from_references(param_offset)
 			if param_size:
 				# 4 bytes
-				param_value = file.read(4)
-				param = Param(th1, param_offset, param_id, my_type, param_value)
+				param = Param(helper, param_offset, param_id, my_type, file, file.tell(), 4)
+				file.seek(4, 1)
 			else:
-				param_value = file.read(1)
-				param = Param(th1, param_offset, param_id, "bool", param_value)
-			th1.params.append(param)
+				param = Param(helper, param_offset, param_id, "bool", file, file.tell(), 1)
+				file.seek(1, 1)
+			helper.params.append(param)
 			if not param_flag:
 				bool_end = 1
+		return helper
 
-
-	if bool_print_debug:
-		print("{0} -> Unoptimizing tracks.".format(file.tell()))
-	# unoptimize tracks
-	# this code will copy all not-repeated/not-overwritten parameters
-	# from the target track to the original track as dictated by opti_offset
-	for th1 in thelpers:
+	def read_unoptimized_track(self, offset):
+		# this code will copy all not-repeated/not-overwritten parameters
+		# from the target track to the original track as dictated by opti_offset
+		th1 = self.read_track(offset)
+		param_ids = set([p.id for p in th1.params])
 		opti_target = 0
 		if th1.opti_offset:
 			opti_target = th1.offset + th1.opti_offset
-		# print("{0} -> {1} ({2})".format(p_data + th1.offset, p_data + opti_target, th1.opti_offset))
 		while(opti_target > 0):
-			match = False
-			for th2 in thelpers:
-				if(opti_target == th2.offset):
-					# match found
-					match = True
-					# ignore repeated, preserve original params
-					for i, id in enumerate([p.id for p in th2.params]):
-						if id not in [p.id for p in th1.params]:
-							th1.params.append(th2.params[i])
-					# if target has opti, continue unopti
-					if th2.opti_offset:
-						opti_target = th2.offset + th2.opti_offset
-						# print("{0} -> {1} ({2})".format(p_data + th1.offset, p_data + opti_target, th2.opti_offset))
-					else:
-						opti_target = 0
-			if not match:
-				print("Bug: Unable to unoptimize track offset {0} -> {1} ({2}).".format(p_data + th1.offset, p_data + opti_target, th2.opti_offset))
+			if self.p_data + opti_target >= self.p_strings:
+				print("Bug: Unable to unoptimize track offset {0} -> {1}.".format(self.p_data + th1.offset, self.p_data + opti_target))
 				break
+			th2 = self.read_track(opti_target)
+			# ignore repeated, preserve original params
+			for p in th2.params:
+				if p.id not in param_ids:
+					param_ids.add(p.id)
+					th1.params.append(p)
+			# if target has opti, continue unopti
+			if th2.opti_offset:
+				opti_target = th2.offset + th2.opti_offset
+			else:
+				opti_target = 0
 		# resort unoptimized params
 		def nidsort(e):
 			return e.id
@@ -612,170 +720,348 @@ for cat_path, cat_name in my_cat_files:
 		# set track hash to value of param[0], id=0
 		for p in th1.params:
 			if(p.id == 0):
-				th1.hash = p.value
+				th1.hash = bytes(p.value)
+		return th1
 
-	if bool_print_debug:
-		print("{0} -> Reading strings and reference strings.".format(file.tell()))
-	## STRINGS ##
-	file.seek(p_strings, 0)
-	strings = []
-	for i in range(0, number_of_strings):
-		my_offset = file.tell() - p_strings
-		string = read_string(file)
-		sh = StringHelper(my_offset, string)
-		strings.append(sh)
-	## REFERENCE STRINGS ##
-	reference_strings = []
-	for node in nodes:
-		offsets = []
-		number_of_reference_strings = 0
-		if node.type in ('r', 'i'):
-			# check for repeated reference strings
-			if node.file_offset not in offsets:
-				offsets.append(node.file_offset)
-				number_of_reference_strings += 1
-			if node.path_offset not in offsets:
-				offsets.append(node.path_offset)
-				number_of_reference_strings += 1
-		for i in range(0, number_of_reference_strings):
-			my_offset = file.tell() - p_strings
-			string = read_string(file)
-			sh = StringHelper(my_offset, string)
-			reference_strings.append(sh)
-
-	
-	# Run through all string variables to find matching offset
-	# Return offset if match is found, thus this param value is a string
-	def get_string_reference_from_param_offset(param):
-		target_offset = param.offset
-		result = None
-		for vs in param_variable_strings:
-			for offset in vs.variable_offsets:
-				if target_offset == offset:
-					# match
-					result = vs.string_offset
-					break
+	# Return string offset if a string variable points to this param,
+	# thus this param value is a string
+	def get_string_reference_from_param_offset(self, param):
+		result = self.string_references.get(param.offset)
 		if result is None:
-			print("Warning: Unable to get string reference from {0}, param ID '{1}' value '{2}' offset '{3}'".format(pretty_bytes(param.logic_helper.hash), param.id, pretty_bytes(param.value), p_data+param.offset))
+			print("Warning: Unable to get string reference from {0}, param ID '{1}' value '{2}' offset '{3}'".format(pretty_bytes(param.logic_helper.hash), param.id, pretty_bytes(param.value), self.p_data+param.offset))
 		return result
-	
-	
-	# Run through all group variables to find matching offset
-	# Return offset if match is found, thus this param value is a condition group
-	def get_group_reference_from_param_offset(param):
-		target_offset = param.offset
-		result = None
-		for vg in param_variable_groups:
-			for offset in vg.variable_offsets:
-				if target_offset == offset:
-					# match
-					result = vg.group_offset
-					break
+
+	# Return group offset if a group variable points to this param,
+	# thus this param value is a condition group
+	def get_group_reference_from_param_offset(self, param):
+		result = self.group_references.get(param.offset)
 		if result is None:
-			print("Warning: Unable to get group reference from {0}, param ID '{1}' value '{2}' offset '{3}'".format(pretty_bytes(param.logic_helper.hash), param.id, pretty_bytes(param.value), p_data+param.offset))
+			print("Warning: Unable to get group reference from {0}, param ID '{1}' value '{2}' offset '{3}'".format(pretty_bytes(param.logic_helper.hash), param.id, pretty_bytes(param.value), self.p_data+param.offset))
 		return result
-	
-	def get_string_from_offset(offset):
+
+	def get_string_from_offset(self, offset):
 		if offset is not None:
-			for s in strings+reference_strings:
-				if offset == s.offset:
-					return s.string
+			if offset >= 0 and self.p_strings + offset < len(self.buffer.data):
+				self.buffer.seek(self.p_strings + offset)
+				return read_string(self.buffer)
 			print("Warning: Unable to get string from offset {0}.".format(offset))
 		return None
 
-	def get_vcg_from_offset(offset):
+	def get_vcg_from_offset(self, offset):
 		if offset is not None:
-			for vcg in variable_condition_groups:
-				if offset == vcg.offset - p_groups:
-					return vcg
+			if offset in self.group_offsets:
+				file = self.buffer
+				file.seek(self.p_groups + offset)
+				number_of_conditions = format_read(file, "B")
+				condition_offsets = []
+				for j in range(0, number_of_conditions):
+					condition_offset = format_read(file, "I")
+					condition_offsets.append(condition_offset)
+				return VariableConditionGroup(self.p_groups + offset, condition_offsets)
 			print("Warning: Unable to get vcg from offset {0}.".format(offset))
 		return None
 
-	def get_db_param(db, title, id):
-		for logic in db:
-			if logic.title == title:
-				for p in logic.params:
-					if int(p.id) == int(id):
-						# param match found
-						return p
-		return None
 
-	def guess_param_type(param):
-		# Note: Do not use get_type_from_references() here, when generating templates
-		# the function will use wrong variable offsets and then return wrong results
-		# If no reference and param type already is defined, don't guess
-		if param.type != "unk":
-			return param.type
-		# Guess value based on my loose and arbitrary set of rules
-		value = param.value
-		if int.from_bytes(value, byteorder='little') != 0:
-			param_as_int = struct.unpack("i", value)[0]
-			param_as_float = struct.unpack("f", value)[0]
-			if param_as_int <= 32767 and param_as_int >= -32768:
-				return "int"
-			elif float(param_as_float) <= 2048.0 and float(param_as_float) >= -2048.0:
-				if not (float(param_as_float) <= 0.1 and float(param_as_float) >= -0.1):
-					return "float"
-		# Keeping return "unk" results in too many 'float' false positives
-		# Keeping return "bytes" means it will only be guessed once
-		return "bytes"
-	
-	
-	def get_param_value_by_type(helper, param, type):
-		value = param.value
-		if type == "int":
-			result = struct.unpack("i", value)[0]
-		elif type == "bool":
-			result = struct.unpack("B", value)[0]
-			result = str(bool(result)).lower()
-		elif type == "float":
-			result = "{:f}".format(struct.unpack("f", value)[0])
-		elif type == "string":
-			# Check if param has value before checking for string references
-			# (String might be hashed in this case)
-			try:
-				value_test = struct.unpack("i", value)[0]
-			except:
-				print("Error: Unable to test string value.")
-				value_test = 0
-			if value_test:
-				# print("Info: Param ID {0} type {1} from {2} already has a value, reference check not necessary.".format(param.id, type, pretty_bytes(helper.hash)))
-				result = pretty_bytes(value)
-			else:
-				# Param has no value therefore we'll check for string references
-				result = get_string_from_offset(
-					get_string_reference_from_param_offset(param))
-				if result is None:
-					result = '\"' + '\"'
-				else:
-					# append quotes to start and end
-					result = '\"' + result + '\"'
-		elif type == "bytes":
-			string = check_hash_generic(value)
-			if string is not None:
-				# print("Info: Found matching string hash {0} for param value '{1}'.".format(string, pretty_bytes(value)))
-				result = "h"+string
-			else:
-				result = pretty_bytes(value)
-		elif type == "cg":
-			result = pretty_bytes(0)
-		else:
-			result = pretty_bytes(0)
-			print("Warning: Unable to handle value of param ID {0} type {1} from {2}.".format(param.id, type, pretty_bytes(helper.hash)))
-		return result
+def open_cat_file(cat_path, cat_name):
+	return read_cat_file(open_cat_buffer(cat_path), cat_name)
+
+
+def open_cat_bytes(data, cat_name):
+	# CAT files that only exist in memory, e.g. freshly compiled ones
+	return read_cat_file(CatBuffer(data, memoryview(data)), cat_name)
+
+
+def read_cat_header(file, cat_name):
+	# Header and variable tables only, condition boundaries are left empty
+	if bool_print_debug:
+		print("<< {0} >>".format(cat_name))
+		print("{0} -> Reading header.".format(file.tell()))
 
+	## HEADER ##
+	file.byte_order = get_byte_order(file.data)
+	if file.byte_order != "<":
+		print("Info: '{0}' is a big-endian CAT file.".format(cat_name))
+	file_length = format_read(file, "I")
+	p_data = format_read(file, "I")
+	p_strings = format_read(file, "I")
+	p_groups = format_read(file, "I")
+	counterA = format_read(file, "I")
+	counterB = format_read(file, "I")
+	counterC = format_read(file, "I")
+	counterD = format_read(file, "I")
+	number_of_strings = format_read(file, "I")
 
-	## GENERATE MACT ##
-	if bool_generate_mact:
-		if bool_print_debug:
-			print("{0} -> Generating MACT.".format(file.tell()))
-		
-		mact_file_name = cat_name.rsplit(os.sep, 1)[-1].split('.')[0]+".mact"
-		mact = open(mact_file_name, "w")
+	if bool_print_debug:
+		print("{0} -> Reading variables.".format(file.tell()))
 
-		def write_mact(file, root, level):
-			def ntabs(level):
-				return level*"\t"
+	## PARAM VARIABLE STRINGS ##
+	param_variable_strings = []
+	string_references = {}
+	for i in range(0, number_of_strings):
+		string_offset = format_read(file, "I")
+		number_of_variables = format_read(file, "H")
+		variable_offsets = []
+		for j in range(0, number_of_variables):
+			offset = format_read(file, "I")
+			variable_offsets.append(offset)
+			string_references[offset] = string_offset
+		vs = ParamVariableString(
+			string_offset, number_of_variables, variable_offsets)
+		param_variable_strings.append(vs)
+
+	number_of_groups = format_read(file, "I")
+
+	## PARAM VARIABLE GROUPS ##
+	param_variable_groups = []
+	group_references = {}
+	for i in range(0, number_of_groups):
+		group_offset = format_read(file, "I")
+		number_of_variables = format_read(file, "H")
+		variable_offsets = []
+		for j in range(0, number_of_variables):
+			offset = format_read(file, "I")
+			variable_offsets.append(offset)
+			group_references[offset] = group_offset
+		vg = ParamVariableGroup(group_offset, number_of_variables, variable_offsets)
+		param_variable_groups.append(vg)
+	p_tree = file.tell()
+
+	cat = CatFile(cat_name, file, file_length, p_data, p_strings, p_groups,
+			counterA, counterB, counterC, counterD, p_tree,
+			param_variable_strings, param_variable_groups,
+			string_references, group_references, set(), [])
+	return cat
+
+
+def read_cat_file(file, cat_name):
+	cat = read_cat_header(file, cat_name)
+
+	if bool_print_debug:
+		print("{0} -> Indexing node tree.".format(file.tell()))
+
+	## NODE TREE ##
+	# Nodes are stored depth first, one after another,
+	# only condition offsets and the first track offset are kept
+	condition_offsets = set()
+	pos_condition_end = None
+	position = cat.p_tree
+	number_of_pending_nodes = 1
+	while number_of_pending_nodes:
+		node, number_of_children, position = cat._read_cat_node(position)
+		number_of_pending_nodes += number_of_children - 1
+		condition_offsets.update(node.condition_offsets)
+		for offset in node.track_offsets:
+			if pos_condition_end is None or offset < pos_condition_end:
+				pos_condition_end = offset
+
+	if bool_print_debug:
+		print("{0} -> Reading variable condition groups.".format(file.tell()))
+
+	## VARIABLE CONDITION GROUPS ##
+	file.seek(cat.p_groups)
+	for i in range(0, len(cat.param_variable_groups)):
+		cat.group_offsets.add(file.tell() - cat.p_groups)
+		number_of_conditions = format_read(file, "B")
+		for j in range(0, number_of_conditions):
+			condition_offset = format_read(file, "I")
+			condition_offsets.add(condition_offset)
+
+	if pos_condition_end is None:
+		pos_condition_end = cat.p_strings - cat.p_data
+	condition_offsets.add(pos_condition_end)
+	cat.condition_boundaries = sorted(condition_offsets)
+	if file.byte_order != "<":
+		swap_param_values(cat)
+	return cat
+
+
+## STREAMING ##
+# iter_cat_events() decodes a CAT file in file order without building the node tree,
+# each event is yielded as soon as it's decoded:
+#	"node_enter", "node_leave"				-> node
+#	"conditions_enter", "conditions_leave"	-> node (ConditionGroup of a node)
+#	"tracks_enter", "tracks_leave"			-> node (Tracks of a node)
+#	"condition", "track", "logic_leave"		-> logic (params already decoded)
+#	"param"									-> logic, param
+#	"group_enter", "group_leave"			-> logic, param, group (conditions of a 'cg' param)
+@dataclass
+class CatEvent:
+	kind: str
+	node: CatNode
+	logic: LogicHelper
+	param: Param
+	group: VariableConditionGroup
+
+
+def iter_cat_events(cat, position=None):
+	if position is None:
+		position = cat.p_tree
+	yield from _iter_node_events(cat, position)
+
+
+def _iter_node_events(cat, position):
+	node, number_of_children, position = cat.read_cat_node(position)
+	yield CatEvent("node_enter", node, None, None, None)
+	if node.type in ('b', 'l', 'n'):
+		yield CatEvent("conditions_enter", node, None, None, None)
+		for offset in node.condition_offsets:
+			helper = cat.read_condition(offset)
+			helper.nodes.append(node)
+			yield from _iter_logic_events(cat, "condition", helper)
+		yield CatEvent("conditions_leave", node, None, None, None)
+	if node.type in ('l', 'n'):
+		yield CatEvent("tracks_enter", node, None, None, None)
+		for offset in node.track_offsets:
+			helper = cat.read_unoptimized_track(offset)
+			helper.nodes.append(node)
+			yield from _iter_logic_events(cat, "track", helper)
+		yield CatEvent("tracks_leave", node, None, None, None)
+	for j in range(0, number_of_children):
+		position = yield from _iter_node_events(cat, position)
+	yield CatEvent("node_leave", node, None, None, None)
+	return position
+
+
+def _iter_logic_events(cat, kind, helper):
+	yield CatEvent(kind, None, helper, None, None)
+	for p in helper.params:
+		# param ID 0 holds the logic hash, it's never a condition group
+		if p.type == "cg" and p.id != 0:
+			vcg = cat.get_vcg_from_offset(cat.get_group_reference_from_param_offset(p))
+			yield CatEvent("group_enter", None, helper, p, vcg)
+			if vcg is not None:
+				for offset in vcg.condition_offsets:
+					group_helper = cat.read_condition(offset)
+					group_helper.nodes.append(vcg)
+					yield from _iter_logic_events(cat, "condition", group_helper)
+			yield CatEvent("group_leave", None, helper, p, vcg)
+		else:
+			yield CatEvent("param", None, helper, p, None)
+	yield CatEvent("logic_leave", None, helper, None, None)
+
+
+def get_db_param(db, title, id):
+	for logic in db:
+		if logic.title == title:
+			for p in logic.params:
+				if int(p.id) == int(id):
+					# param match found
+					return p
+	return None
+
+
+def guess_param_type(param):
+	# Note: Do not use get_type_from_references() here, when generating templates
+	# the function will use wrong variable offsets and then return wrong results
+	# If no reference and param type already is defined, don't guess
+	if param.type != "unk":
+		return param.type
+	# Guess value based on my loose and arbitrary set of rules
+	value = param.value
+	if int.from_bytes(value, byteorder='little') != 0:
+		param_as_int = struct.unpack("i", value)[0]
+		param_as_float = struct.unpack("f", value)[0]
+		if param_as_int <= 32767 and param_as_int >= -32768:
+			return "int"
+		elif float(param_as_float) <= 2048.0 and float(param_as_float) >= -2048.0:
+			if not (float(param_as_float) <= 0.1 and float(param_as_float) >= -0.1):
+				return "float"
+	# Keeping return "unk" results in too many 'float' false positives
+	# Keeping return "bytes" means it will only be guessed once
+	return "bytes"
+
+
+def get_param_value_by_type(cat, helper, param, type):
+	value = param.value
+	if type == "int":
+		result = struct.unpack("i", value)[0]
+	elif type == "bool":
+		result = struct.unpack("B", value)[0]
+		result = str(bool(result)).lower()
+	elif type == "float":
+		result = "{:f}".format(struct.unpack("f", value)[0])
+	elif type == "string":
+		# Check if param has value before checking for string references
+		# (String might be hashed in this case)
+		try:
+			value_test = struct.unpack("i", value)[0]
+		except:
+			print("Error: Unable to test string value.")
+			value_test = 0
+		if value_test:
+			# print("Info: Param ID {0} type {1} from {2} already has a value, reference check not necessary.".format(param.id, type, pretty_bytes(helper.hash)))
+			result = pretty_bytes(value)
+		else:
+			# Param has no value therefore we'll check for string references
+			result = cat.get_string_from_offset(
+				cat.get_string_reference_from_param_offset(param))
+			if result is None:
+				result = '\"' + '\"'
+			else:
+				# append quotes to start and end
+				result = '\"' + result + '\"'
+	elif type == "bytes":
+		string = check_hash_generic(value)
+		if string is not None:
+			# print("Info: Found matching string hash {0} for param value '{1}'.".format(string, pretty_bytes(value)))
+			result = "h"+string
+		else:
+			result = pretty_bytes(value)
+	elif type == "cg":
+		result = pretty_bytes(0)
+	else:
+		result = pretty_bytes(0)
+		print("Warning: Unable to handle value of param ID {0} type {1} from {2}.".format(param.id, type, pretty_bytes(helper.hash)))
+	return result
+
+
+def get_logic_title(helper):
+	my_hash = check_hash_logic(helper.hash)
+	if my_hash is None:
+		print(helper)
+		my_hash = pretty_bytes(helper.hash)
+		# jank
+		if helper.hash and my_hash == "NULL":
+			my_hash = hash_title(helper.hash)
+			my_hash = pretty_bytes(helper.hash)
+	return my_hash
+
+
+def get_mact_param(cat, db, my_hash, helper, p):
+	# Attempt to match param with database
+	param_match = get_db_param(db, my_hash, p.id)
+	if param_match is None:
+		if bool_has_db_tracks or bool_has_db_conditions:
+			print("Warning: Unable to match param ID {0} from {1} with database.".format(p.id, my_hash))
+		param_name = "[{value:0{digits}}]".format(
+			value=int(p.id), digits=number_of_param_digits)
+		param_type = cat.get_type_from_references(p.offset)
+		if param_type == "unk":
+			param_type = "bytes"
+		param_value = get_param_value_by_type(cat, helper, 
+			p, param_type)
+	else:
+		param_name = param_match.title
+		# check for references, override
+		param_type = cat.get_type_from_references(p.offset)
+		if param_type == "unk":
+			param_type = param_match.type
+		param_value = get_param_value_by_type(cat, helper, 
+			p, param_type)
+	return param_name, param_type, param_value
+
+
+## GENERATE MACT ##
+def write_mact(file, cat, position=None):
+	def ntabs(level):
+		return level*"\t"
+	level = 0
+	# (db, title) of every open condition/track
+	logic_stack = []
+	for event in iter_cat_events(cat, position):
+		kind = event.kind
+		if kind == "node_enter":
+			root = event.node
 			if root.hash is not None:
 				if isinstance(root.hash, bytes):
 					my_hash = pretty_bytes(root.hash)
@@ -794,9 +1080,9 @@ for cat_path, cat_name in my_cat_files:
 				file.write("{0}FileReference".format(ntabs(level)))
 				file.write("\n{0}{1}\n".format(ntabs(level), "{"))
 				file.write("{0}fileName\t\"{1}\"\n".format(
-					ntabs(level+1), get_string_from_offset(root.file_offset)))
+					ntabs(level+1), cat.get_string_from_offset(root.file_offset)))
 				file.write("{0}path\t\"{1}\"\n".format(ntabs(level+1),
-						get_string_from_offset(root.path_offset)))
+						cat.get_string_from_offset(root.path_offset)))
 				if(root.type in 'i'):
 					file.write("{0}includeFile\ttrue".format(ntabs(level+1)))
 				else:
@@ -806,112 +1092,676 @@ for cat_path, cat_name in my_cat_files:
 			if root.type in ('b', 'l', 'n'):
 				file.write("\n{0}{1}\n".format(ntabs(level), "{"))
 				level += 1
-			# condition groups and tracks
-			def write_params(db, offsets, helpers, level):
-				for offset in offsets:
-					match = False
-					for helper in helpers:
-						if offset == helper.offset:
-							match = True
-							# match found
-							my_hash = check_hash_logic(helper.hash)
-							if my_hash is None:
-								print(helper)
-								my_hash = pretty_bytes(helper.hash)
-								# jank
-								if helper.hash and my_hash == "NULL":
-									my_hash = hash_title(helper.hash)
-									my_hash = pretty_bytes(helper.hash)
-							if bool_write_debug:
-								file.write("\n{0}# Pos: {1}; Offset: {2}".format(
-									ntabs(level), p_data+offset, offset))
-							file.write("\n{0}{1}".format(ntabs(level), my_hash))
-							file.write("\n{0}{1}\n".format(ntabs(level), "{"))
-							level += 1
-							for p in helper.params:
-								# skip pid 0 like original files
-								if bool_skip_id_zero and p.id == 0:
-									continue
-								# Attempt to match param with database
-								param_match = get_db_param(db, my_hash, p.id)
-								if param_match is None:
-									if bool_has_db_tracks or bool_has_db_conditions:
-										print("Warning: Unable to match param ID {0} from {1} with database.".format(p.id, my_hash))
-									param_name = "[{value:0{digits}}]".format(
-										value=int(p.id), digits=number_of_param_digits)
-									param_type = get_type_from_references(p.offset)
-									if param_type == "unk":
-										param_type = "bytes"
-									param_value = get_param_value_by_type(helper, 
-										p, param_type)
-								else:
-									param_name = param_match.title
-									# check for references, override
-									param_type = get_type_from_references(p.offset)
-									if param_type == "unk":
-										param_type = param_match.type
-									param_value = get_param_value_by_type(helper, 
-										p, param_type)
-								# If p.type is CG, treat as CG
-								# param_type is irrelevant in this case
-								if p.type in ('cg'):
-									if param_type not in ('cg') and (bool_has_db_tracks or bool_has_db_conditions):
-										print("Warning: Param ID {0} from {1} is treated as condition group but it's template disagrees.".format(p.id, my_hash))
-									vcg = get_vcg_from_offset(get_group_reference_from_param_offset(p))
-									if vcg is not None and vcg != "NULL":
-										if bool_write_debug:
-											file.write("{0}# Pos: {1}; Children: {2}\n".format(
-												ntabs(level), vcg.offset, len(vcg.condition_offsets)))
-									file.write("{0}{1}".format(ntabs(level), param_name))
-									file.write("\n{0}{1}".format(ntabs(level), "{"))
-									if vcg is not None and vcg != "NULL":
-										write_params(db_conditions, vcg.condition_offsets,
-													chelpers, level+1)
-									file.write("\n{0}{1}\n".format(ntabs(level), "}"))
-								else:
-									# Otherwise, regular write param value
-									file.write("{0}{1}\t{2}\n".format(
-										ntabs(level), param_name, param_value))
-							level -= 1
-							file.write("{0}{1}".format(ntabs(level), "}"))
-					if not match:
-						print("Error: Unable to match param offset {0}.".format(offset))
-			# condition group
-			if root.type in ('b', 'l', 'n'):
-				file.write("{0}ConditionGroup".format(ntabs(level)))
-				file.write("\n{0}{1}".format(ntabs(level), "{"))
-				write_params(db_conditions, root.condition_offsets,
-							chelpers, level+1)
-				file.write("\n{0}{1}\n".format(ntabs(level), "}"))
-			# tracks
-			if root.type in ('l', 'n'):
-				file.write("{0}Tracks".format(ntabs(level)))
-				file.write("\n{0}{1}".format(ntabs(level), "{"))
-				write_params(db_tracks, root.track_offsets, thelpers, level+1)
-				file.write("\n{0}{1}\n".format(ntabs(level), "}"))
-			# children
-			for c in root.children:
-				write_mact(file, c, level)
-			if root.type in ('b', 'l', 'n'):
+		elif kind == "node_leave":
+			if event.node.type in ('b', 'l', 'n'):
 				level -= 1
 				file.write("{0}{1}\n".format(ntabs(level), "}"))
-		write_mact(mact, tree, 0)	
-		# Close file
+		# condition group and tracks
+		elif kind in ("conditions_enter", "tracks_enter"):
+			if kind == "conditions_enter":
+				file.write("{0}ConditionGroup".format(ntabs(level)))
+			else:
+				file.write("{0}Tracks".format(ntabs(level)))
+			file.write("\n{0}{1}".format(ntabs(level), "{"))
+			level += 1
+		elif kind in ("conditions_leave", "tracks_leave"):
+			level -= 1
+			file.write("\n{0}{1}\n".format(ntabs(level), "}"))
+		elif kind in ("condition", "track"):
+			helper = event.logic
+			my_hash = get_logic_title(helper)
+			if kind == "condition":
+				logic_stack.append((db_conditions, my_hash))
+			else:
+				logic_stack.append((db_tracks, my_hash))
+			if bool_write_debug:
+				file.write("\n{0}# Pos: {1}; Offset: {2}".format(
+					ntabs(level), cat.p_data+helper.offset, helper.offset))
+			file.write("\n{0}{1}".format(ntabs(level), my_hash))
+			file.write("\n{0}{1}\n".format(ntabs(level), "{"))
+			level += 1
+		elif kind == "logic_leave":
+			logic_stack.pop()
+			level -= 1
+			file.write("{0}{1}".format(ntabs(level), "}"))
+		elif kind == "param":
+			p = event.param
+			# skip pid 0 like original files
+			if bool_skip_id_zero and p.id == 0:
+				continue
+			db, my_hash = logic_stack[-1]
+			param_name, param_type, param_value = get_mact_param(cat, db, my_hash, event.logic, p)
+			# Regular write param value
+			file.write("{0}{1}\t{2}\n".format(
+				ntabs(level), param_name, param_value))
+		elif kind == "group_enter":
+			# If p.type is CG, treat as CG
+			# param_type is irrelevant in this case
+			p = event.param
+			vcg = event.group
+			db, my_hash = logic_stack[-1]
+			param_name, param_type, param_value = get_mact_param(cat, db, my_hash, event.logic, p)
+			if param_type not in ('cg') and (bool_has_db_tracks or bool_has_db_conditions):
+				print("Warning: Param ID {0} from {1} is treated as condition group but it's template disagrees.".format(p.id, my_hash))
+			if vcg is not None:
+				if bool_write_debug:
+					file.write("{0}# Pos: {1}; Children: {2}\n".format(
+						ntabs(level), vcg.offset, len(vcg.condition_offsets)))
+			file.write("{0}{1}".format(ntabs(level), param_name))
+			file.write("\n{0}{1}".format(ntabs(level), "{"))
+			level += 1
+		elif kind == "group_leave":
+			level -= 1
+			file.write("\n{0}{1}\n".format(ntabs(level), "}"))
+
+
+## GENERATE MACTB ##
+def build_logic_tree(cat, position=None):
+	# Builds the same LogicNode tree MACT_TO_CAT gets from parsing write_mact()'s output
+	LogicNode = MACT_TO_CAT.LogicNode
+	get_value_type = MACT_TO_CAT.get_value_type
+	root = None
+	# open Bank/Node/FileReference
+	node_stack = []
+	# where the next condition/track goes
+	list_stack = []
+	# (db, title, LogicNode) of every open condition/track
+	logic_stack = []
+	# open 'cg' params
+	group_stack = []
+	for event in iter_cat_events(cat, position):
+		kind = event.kind
+		if kind == "node_enter":
+			node = event.node
+			if isinstance(node.hash, bytes):
+				my_hash = pretty_bytes(node.hash)
+			elif node.hash is not None:
+				my_hash = str(node.hash)
+			else:
+				my_hash = None
+			if node.type in ('b',):
+				logic = LogicNode("Bank", "Bank", my_hash, get_value_type(my_hash), [], [], [], [])
+			elif node.type in ('l', 'n'):
+				logic = LogicNode("Node", "Node", my_hash, get_value_type(my_hash), [], [], [], [])
+			else:
+				logic = LogicNode("FileReference", "FileReference", None, "none", [], [], [], [])
+				for title, value in (("fileName", "\"{0}\"".format(cat.get_string_from_offset(node.file_offset))),
+						("path", "\"{0}\"".format(cat.get_string_from_offset(node.path_offset))),
+						("includeFile", "true" if node.type in ('i',) else "false")):
+					logic.params.append(LogicNode(title, "Param", value, get_value_type(value), [], [], [], []))
+			if len(node_stack):
+				node_stack[-1].children.append(logic)
+			else:
+				root = logic
+			node_stack.append(logic)
+		elif kind == "node_leave":
+			node_stack.pop()
+		elif kind == "conditions_enter":
+			list_stack.append(node_stack[-1].conditions)
+		elif kind == "tracks_enter":
+			list_stack.append(node_stack[-1].tracks)
+		elif kind in ("conditions_leave", "tracks_leave"):
+			list_stack.pop()
+		elif kind in ("condition", "track"):
+			my_hash = get_logic_title(event.logic)
+			if kind == "condition":
+				logic = LogicNode(my_hash, "Condition", None, "none", [], [], [], [])
+				logic_stack.append((db_conditions, my_hash, logic))
+			else:
+				logic = LogicNode(my_hash, "Track", None, "none", [], [], [], [])
+				logic_stack.append((db_tracks, my_hash, logic))
+			# conditions inside a 'cg' param belong to the param
+			if len(group_stack) and len(logic_stack) > 1 and group_stack[-1][0] is logic_stack[-2][2]:
+				group_stack[-1][1].children.append(logic)
+			else:
+				list_stack[-1].append(logic)
+		elif kind == "logic_leave":
+			logic_stack.pop()
+		elif kind == "param":
+			p = event.param
+			# skip pid 0 like original files
+			if bool_skip_id_zero and p.id == 0:
+				continue
+			db, my_hash, logic = logic_stack[-1]
+			param_name, param_type, param_value = get_mact_param(cat, db, my_hash, event.logic, p)
+			param_value = str(param_value)
+			logic.params.append(LogicNode(param_name, "Param", param_value, get_value_type(param_value), [], [], [], []))
+		elif kind == "group_enter":
+			db, my_hash, logic = logic_stack[-1]
+			param_name, param_type, param_value = get_mact_param(cat, db, my_hash, event.logic, event.param)
+			param = LogicNode(param_name, "Param", None, "none", [], [], [], [])
+			logic.params.append(param)
+			group_stack.append((logic, param))
+		elif kind == "group_leave":
+			logic, param = group_stack.pop()
+			if len(param.children):
+				param.value_type = "cg"
+	return root
+
+
+## EXPORT RECORDS ##
+# One record per node and per condition/track, in file order:
+#	node:		{"kind": "node", "path", "type", "title", "offset"}
+#				+ "file_name", "file_path", "include_file" for FileReference
+#	logic:		{"kind": "condition"/"track", "path", "title", "hash", "offset", "group", "params"}
+#				"group" is {"offset", "param"} of the logic owning the condition group, or None
+#	param:		{"id", "name", "type", "value", "bytes"}
+#				"bytes" are the param value as stored in the file, big-endian in BE CATs
+#				'cg' params also get "conditions", their conditions follow as their own records
+# Conditions of a condition group are emitted before the logic owning them.
+def iter_cat_records(cat, position=None, raw_bytes=False):
+	def get_bytes(value):
+		if raw_bytes:
+			return bytes(value)
+		return bytes(value).hex().upper()
+	# node paths, "Bank X/Node Y"
+	path_stack = []
+	# (db, title, record) of every open condition/track
+	logic_stack = []
+	for event in iter_cat_events(cat, position):
+		kind = event.kind
+		if kind == "node_enter":
+			node = event.node
+			if isinstance(node.hash, bytes):
+				my_hash = pretty_bytes(node.hash)
+			else:
+				my_hash = node.hash
+			record = {"kind": "node", "path": None, "type": None, "title": my_hash, "offset": node.offset}
+			if node.type in ('b',):
+				record["type"] = "Bank"
+			elif node.type in ('l', 'n'):
+				record["type"] = "Node"
+			else:
+				record["type"] = "FileReference"
+				record["file_name"] = cat.get_string_from_offset(node.file_offset)
+				record["file_path"] = cat.get_string_from_offset(node.path_offset)
+				record["include_file"] = node.type in ('i',)
+			if record["type"] == "FileReference":
+				path_stack.append("FileReference")
+			else:
+				path_stack.append("{0} {1}".format(record["type"], my_hash))
+			record["path"] = "/".join(path_stack)
+			yield record
+		elif kind == "node_leave":
+			path_stack.pop()
+		elif kind in ("condition", "track"):
+			helper = event.logic
+			my_hash = get_logic_title(helper)
+			group = None
+			if len(logic_stack) and logic_stack[-1][3] is not None:
+				group = logic_stack[-1][3]
+			record = {"kind": kind, "path": "/".join(path_stack), "title": my_hash,
+				"hash": pretty_bytes(helper.hash), "offset": helper.offset, "group": group, "params": []}
+			if kind == "condition":
+				logic_stack.append([db_conditions, my_hash, record, None])
+			else:
+				logic_stack.append([db_tracks, my_hash, record, None])
+		elif kind == "logic_leave":
+			db, my_hash, record, group = logic_stack.pop()
+			yield record
+		elif kind in ("param", "group_enter"):
+			p = event.param
+			# skip pid 0 like original files
+			if bool_skip_id_zero and p.id == 0:
+				continue
+			db, my_hash, record, group = logic_stack[-1]
+			param_name, param_type, param_value = get_mact_param(cat, db, my_hash, event.logic, p)
+			param_record = {"id": p.id, "name": param_name, "type": param_type,
+				"value": str(param_value), "bytes": get_bytes(p.raw_value)}
+			if kind == "group_enter":
+				param_record["type"] = "cg"
+				param_record["value"] = None
+				param_record["conditions"] = 0
+				if event.group is not None:
+					param_record["conditions"] = len(event.group.condition_offsets)
+				# conditions read until group_leave belong to this param
+				logic_stack[-1][3] = {"offset": record["offset"], "param": p.id}
+			record["params"].append(param_record)
+		elif kind == "group_leave":
+			logic_stack[-1][3] = None
+
+
+def write_records(file, cat, format):
+	# records are written as soon as they are decoded
+	if format == "msgpack":
+		packer = msgpack.Packer()
+		for record in iter_cat_records(cat, raw_bytes=True):
+			file.write(packer.pack(record))
+	else:
+		for record in iter_cat_records(cat):
+			file.write(json.dumps(record))
+			file.write("\n")
+
+
+## CORPUS INDEX ##
+# Every CAT in a folder decoded into one SQLite database, files are only
+# decoded again when their SHA-256 changes. Nodes and logic blocks are
+# stored once per use, as they appear in the MACT.
+index_schema = """
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, sha256 TEXT, size INTEGER);
+CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, file_id INTEGER, parent_id INTEGER,
+	offset INTEGER, type TEXT, title TEXT, path TEXT,
+	file_name TEXT, file_path TEXT, include_file INTEGER);
+CREATE TABLE IF NOT EXISTS logics (id INTEGER PRIMARY KEY, file_id INTEGER, node_id INTEGER,
+	kind TEXT, offset INTEGER, title TEXT, hash TEXT, group_offset INTEGER, group_param INTEGER);
+CREATE TABLE IF NOT EXISTS params (logic_id INTEGER, file_id INTEGER, param_id INTEGER,
+	name TEXT, type TEXT, value TEXT, bytes BLOB);
+CREATE TABLE IF NOT EXISTS strings (file_id INTEGER, offset INTEGER, param_offset INTEGER, string TEXT);
+CREATE INDEX IF NOT EXISTS nodes_file ON nodes (file_id);
+CREATE INDEX IF NOT EXISTS nodes_title ON nodes (title);
+CREATE INDEX IF NOT EXISTS logics_file ON logics (file_id);
+CREATE INDEX IF NOT EXISTS logics_node ON logics (node_id);
+CREATE INDEX IF NOT EXISTS logics_title ON logics (title);
+CREATE INDEX IF NOT EXISTS params_file ON params (file_id);
+CREATE INDEX IF NOT EXISTS params_logic ON params (logic_id);
+CREATE INDEX IF NOT EXISTS params_value ON params (param_id, value);
+CREATE INDEX IF NOT EXISTS params_name ON params (name, value);
+CREATE INDEX IF NOT EXISTS strings_file ON strings (file_id);
+CREATE INDEX IF NOT EXISTS strings_string ON strings (string);
+"""
+
+
+def get_file_sha256(path):
+	sha = hashlib.sha256()
+	file = open(path, "rb")
+	for block in iter(lambda: file.read(1024*1024), b''):
+		sha.update(block)
+	file.close()
+	return sha.hexdigest()
+
+
+def _delete_indexed_file(db, file_id):
+	for table in ("nodes", "logics", "params", "strings"):
+		db.execute("DELETE FROM {0} WHERE file_id = ?".format(table), (file_id,))
+	db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+
+def index_cat_file(db, cat, file_id):
+	# node path -> node id, paths of open nodes are always the latest ones
+	node_ids = {}
+	for record in iter_cat_records(cat, raw_bytes=True):
+		if record["kind"] == "node":
+			parent_id = node_ids.get(record["path"].rpartition("/")[0])
+			include_file = record.get("include_file")
+			if include_file is not None:
+				include_file = int(include_file)
+			cursor = db.execute("INSERT INTO nodes (file_id, parent_id, offset, type, title, path, file_name, file_path, include_file) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+				(file_id, parent_id, record["offset"], record["type"], record["title"], record["path"],
+				record.get("file_name"), record.get("file_path"), include_file))
+			node_ids[record["path"]] = cursor.lastrowid
+		else:
+			group_offset = None
+			group_param = None
+			if record["group"] is not None:
+				group_offset = record["group"]["offset"]
+				group_param = record["group"]["param"]
+			cursor = db.execute("INSERT INTO logics (file_id, node_id, kind, offset, title, hash, group_offset, group_param) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+				(file_id, node_ids.get(record["path"]), record["kind"], record["offset"], record["title"],
+				record["hash"], group_offset, group_param))
+			logic_id = cursor.lastrowid
+			db.executemany("INSERT INTO params (logic_id, file_id, param_id, name, type, value, bytes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+				[(logic_id, file_id, p["id"], p["name"], p["type"], p["value"], p["bytes"]) for p in record["params"]])
+	strings = []
+	for vs in cat.param_variable_strings:
+		string = cat.get_string_from_offset(vs.string_offset)
+		for offset in vs.variable_offsets:
+			strings.append((file_id, vs.string_offset, offset, string))
+	db.executemany("INSERT INTO strings (file_id, offset, param_offset, string) VALUES (?, ?, ?, ?)", strings)
+
+
+def index_cat_files(cat_path, db_path):
+	db = sqlite3.connect(db_path)
+	db.executescript(index_schema)
+	indexed_files = {}
+	for file_id, path, sha256 in db.execute("SELECT id, path, sha256 FROM files"):
+		indexed_files[path] = (file_id, sha256)
+	number_of_new_files = 0
+	number_of_unchanged_files = 0
+	found_files = set()
+	for root, dirs, files in os.walk(cat_path):
+		for name in files:
+			if not name.endswith(".cat"):
+				continue
+			path = root + os.sep + name
+			found_files.add(path)
+			sha256 = get_file_sha256(path)
+			old = indexed_files.get(path)
+			if old is not None and old[1] == sha256:
+				number_of_unchanged_files += 1
+				continue
+			# one transaction per file, an interrupted run only loses that file
+			with db:
+				if old is not None:
+					_delete_indexed_file(db, old[0])
+				cursor = db.execute("INSERT INTO files (path, sha256, size) VALUES (?, ?, ?)",
+					(path, sha256, os.path.getsize(path)))
+				cat = open_cat_file(path, name)
+				index_cat_file(db, cat, cursor.lastrowid)
+				cat.close()
+			number_of_new_files += 1
+	# files that are gone
+	number_of_removed_files = 0
+	with db:
+		for path, (file_id, sha256) in indexed_files.items():
+			if path not in found_files:
+				_delete_indexed_file(db, file_id)
+				number_of_removed_files += 1
+	db.close()
+	print("Info: {0} CAT files indexed, {1} unchanged, {2} removed.".format(
+		number_of_new_files, number_of_unchanged_files, number_of_removed_files))
+
+
+## NODE INDEX ##
+# A sidecar file, YourCatFile.catidx, keeps what read_cat_file() has to walk
+# the whole node tree for (condition boundaries and group offsets)
+# and every node, so a single subtree can be decoded without touching the
+# rest of the CAT file. Nodes are stored in tree order as
+#	[key, index of the parent node or -1, tree offset]
+# and their paths ("Bank X/Node Y") are rebuilt by get_node_paths(),
+# the logic offsets of a node are read from its tree offset.
+# Repeated sibling keys are numbered in order, "Node Y#2".
+# The sidecar is rebuilt whenever the size or modification time of the CAT changes.
+node_index_version = 1
+
+
+def get_node_key(node):
+	title = node.hash
+	if isinstance(title, (bytes, int)):
+		title = pretty_bytes(title)
+	if node.type in ('b',):
+		return "Bank {0}".format(title)
+	elif node.type in ('l', 'n'):
+		return "Node {0}".format(title)
+	return "FileReference"
+
+
+def build_node_index(cat):
+	nodes = []
+	_index_cat_node(cat, cat.p_tree, -1, set(), nodes)
+	return {"version": node_index_version,
+		"group_offsets": sorted(cat.group_offsets),
+		"condition_boundaries": cat.condition_boundaries,
+		"nodes": nodes}
+
+
+def _index_cat_node(cat, position, parent, siblings, nodes):
+	node, number_of_children, next_position = cat.read_cat_node(position)
+	key = get_node_key(node)
+	n = 1
+	my_key = key
+	while my_key in siblings:
+		n += 1
+		my_key = "{0}#{1}".format(key, n)
+	siblings.add(my_key)
+	my_index = len(nodes)
+	nodes.append([my_key, parent, position])
+	children = set()
+	for j in range(0, number_of_children):
+		next_position = _index_cat_node(cat, next_position, my_index, children, nodes)
+	return next_position
+
+
+def get_node_paths(index):
+	# path -> tree offset, parents always come before their children
+	paths = []
+	node_paths = {}
+	for key, parent, position in index["nodes"]:
+		path = key
+		if parent >= 0:
+			path = paths[parent] + "/" + key
+		paths.append(path)
+		node_paths[path] = position
+	return node_paths
+
+
+def get_node_index_path(cat_path):
+	return cat_path + "idx"
+
+
+def load_node_index(cat_path):
+	# None if there's no sidecar or it's out of date
+	try:
+		file = open(get_node_index_path(cat_path), "r")
+		index = json.load(file)
+		file.close()
+	except (OSError, ValueError):
+		return None
+	stat = os.stat(cat_path)
+	if index.get("version") != node_index_version or index.get("size") != stat.st_size \
+			or index.get("mtime_ns") != stat.st_mtime_ns:
+		return None
+	return index
+
+
+def open_cat_file_indexed(cat_path, cat_name):
+	# Returns the CAT file and its node index, the sidecar is written if needed
+	if IMG_ARCHIVE.split_archive_path(cat_path)[0] is not None:
+		# no sidecars inside archives
+		cat = open_cat_file(cat_path, cat_name)
+		return cat, build_node_index(cat)
+	index = load_node_index(cat_path)
+	if index is None:
+		cat = open_cat_file(cat_path, cat_name)
+		index = build_node_index(cat)
+		stat = os.stat(cat_path)
+		index["size"] = stat.st_size
+		index["mtime_ns"] = stat.st_mtime_ns
+		file = open(get_node_index_path(cat_path), "w")
+		json.dump(index, file, separators=(",", ":"))
 		file.close()
-	# Each file will add to global helpers for template generation
-	global_chelpers += chelpers
-	global_thelpers += thelpers
+		print("Info: Wrote node index '{0}' with {1} nodes.".format(
+			get_node_index_path(cat_path), len(index["nodes"])))
+		return cat, index
+	cat = read_cat_header(open_cat_buffer(cat_path), cat_name)
+	cat.group_offsets = set(index["group_offsets"])
+	cat.condition_boundaries = index["condition_boundaries"]
+	if cat.buffer.byte_order != "<":
+		swap_param_values(cat)
+	return cat, index
+
+
+def find_node_path(node_paths, path):
+	# Full paths, "Bank X/Node Y", or only their titles, "X/Y"
+	path = path.strip("/")
+	if path in node_paths:
+		return path
+	wanted = path.split("/")
+	for my_path in node_paths:
+		keys = my_path.split("/")
+		if len(keys) != len(wanted):
+			continue
+		for k, w in zip(keys, wanted):
+			if k != w and k.split(" ", 1)[-1] != w:
+				break
+		else:
+			return my_path
+	return None
+
+
+def extract_cat_nodes(cat_path, cat_name, extract_paths):
+	cat, index = open_cat_file_indexed(cat_path, cat_name)
+	node_paths = get_node_paths(index)
+	for path in extract_paths:
+		my_path = find_node_path(node_paths, path)
+		if my_path is None:
+			print("Error: No node '{0}' in '{1}'.".format(path, cat_name))
+			continue
+		position = node_paths[my_path]
+		my_title = my_path.rsplit("/", 1)[-1].split(" ", 1)[-1].replace("#", "_")
+		mact_file_name = cat_name.rsplit(os.sep, 1)[-1].split('.')[0]+"_"+my_title+".mact"+compressed_extension
+		mact = MACT_TO_CAT.open_mact_file(mact_file_name, "w")
+		write_mact(mact, cat, position)
+		mact.close()
+		print("Info: Extracted '{0}' to '{1}'.".format(my_path, mact_file_name))
+	cat.close()
+
+
+## DECOMPILE CACHE ##
+# Generated outputs are kept in the cache folder, one file per output named
+# after the SHA-256 of the CAT bytes together with everything else the output
+# depends on: the DB and TEMPLATES files, the tool itself, the output settings
+# and cache_version. A changed DB or tool never finds the old outputs,
+# they are removed once the cache is over max_cache_size, least recently used first.
+cache_version = 1
+cache_extension = ".cache"
+cache_settings_key = None
+# name -> [last used, size] of every cache entry, read from the folder when first needed
+cache_entries = None
+
+
+def get_output_format():
+	# -> (extension, file mode) of the files CAT files are turned into
+	if export_format == "jsonl":
+		return ".jsonl", "w"
+	if export_format == "msgpack":
+		return ".msgpack", "wb"
+	if bool_generate_mactb:
+		return ".mactb", "wb"
+	return ".mact", "w"
+
+
+def write_output(file, cat):
+	if export_format is not None:
+		write_records(file, cat, export_format)
+	elif bool_generate_mactb:
+		MACT_TO_CAT.write_mactb(file, build_logic_tree(cat))
+	else:
+		write_mact(file, cat)
+
+
+def get_cache_settings_key():
+	global cache_settings_key
+	if cache_settings_key is None:
+		sha = hashlib.sha256()
+		sha.update(str(cache_version).encode('utf-8'))
+		for path in (fn_track_hashes, fn_condition_hashes, fn_title_hashes, fn_generic_hashes,
+				fn_dbt, fn_dbc, __file__, MACT_TO_CAT.__file__):
+			if os.path.exists(path):
+				sha.update(bytes.fromhex(get_file_sha256(path)))
+			else:
+				sha.update(bytes(32))
+		# every setting that changes what write_output() writes
+		settings = (bool_little_endian, bool_skip_id_zero, bool_guess_param_types, bool_write_debug,
+			number_of_param_digits, export_format, bool_generate_mactb, MACT_TO_CAT.mactb_version,
+			get_output_format())
+		sha.update(repr(settings).encode('utf-8'))
+		cache_settings_key = sha.digest()
+	return cache_settings_key
+
+
+def get_cache_entry_path(data):
+	sha = hashlib.sha256(hashlib.sha256(data).digest())
+	sha.update(get_cache_settings_key())
+	return cache_path + os.sep + sha.hexdigest() + cache_extension
+
+
+def get_cache_entries():
+	global cache_entries
+	if cache_entries is None:
+		cache_entries = {}
+		if not os.path.exists(cache_path):
+			os.makedirs(cache_path)
+		for entry in os.scandir(cache_path):
+			if entry.name.endswith(cache_extension):
+				stat = entry.stat()
+				cache_entries[entry.name] = [stat.st_mtime, stat.st_size]
+	return cache_entries
+
+
+def read_cache_entry(entry_path):
+	# -> cached output bytes or None
+	entries = get_cache_entries()
+	name = entry_path.rsplit(os.sep, 1)[-1]
+	if name not in entries:
+		return None
+	try:
+		file = open(entry_path, "rb")
+		output = file.read()
+		file.close()
+		# the modification time of an entry is when it was last used
+		os.utime(entry_path)
+	except OSError:
+		# removed by another run sharing the cache
+		del entries[name]
+		return None
+	entries[name][0] = time.time()
+	return output
+
+
+def write_cache_entry(entry_path, output):
+	entries = get_cache_entries()
+	name = entry_path.rsplit(os.sep, 1)[-1]
+	# written next to the entry first so other runs never read half an entry
+	file = open(entry_path + ".tmp", "wb")
+	file.write(output)
+	file.close()
+	os.replace(entry_path + ".tmp", entry_path)
+	entries[name] = [time.time(), len(output)]
+	trim_cache()
+
+
+def trim_cache():
+	entries = get_cache_entries()
+	cache_size = sum([size for last_used, size in entries.values()])
+	if cache_size <= max_cache_size:
+		return
+	for name in sorted(entries, key=lambda name: entries[name][0]):
+		if cache_size <= max_cache_size:
+			break
+		cache_size -= entries.pop(name)[1]
+		try:
+			os.remove(cache_path + os.sep + name)
+		except OSError:
+			pass
+
+
+def write_cat_output(cat_path, cat_name):
+	# Generates the MACT (or MACTB/JSONL/MSGPACK) of one CAT file,
+	# through the decompile cache when there is one
+	extension, mode = get_output_format()
+	output_file_name = cat_name.rsplit(os.sep, 1)[-1].split('.')[0] + extension + compressed_extension
+	cat_buffer = open_cat_buffer(cat_path)
+	if cache_path is None:
+		cat = read_cat_file(cat_buffer, cat_name)
+		output_file = MACT_TO_CAT.open_mact_file(output_file_name, mode)
+		write_output(output_file, cat)
+		output_file.close()
+		cat.close()
+		return
+	entry_path = get_cache_entry_path(cat_buffer.data)
+	output = read_cache_entry(entry_path)
+	if output is not None:
+		cat_buffer.close()
+		print("Info: '{0}' is unchanged, using its cached output.".format(cat_name))
+	else:
+		cat = read_cat_file(cat_buffer, cat_name)
+		if mode == "w":
+			output_buffer = io.StringIO()
+			write_output(output_buffer, cat)
+			output = output_buffer.getvalue().encode('utf-8')
+		else:
+			output_buffer = io.BytesIO()
+			write_output(output_buffer, cat)
+			output = output_buffer.getvalue()
+		cat.close()
+		write_cache_entry(entry_path, output)
+	output_file = MACT_TO_CAT.open_mact_file(output_file_name, mode)
+	if mode == "w":
+		output_file.write(output.decode('utf-8'))
+	else:
+		output_file.write(output)
+	output_file.close()
 
 
 ## GENERATE HELPERS (UNUSED) ##
-def write_helpers(file, helpers):
+def write_helpers(file, cat, helpers):
 	for h in helpers:
 		my_offset = h.offset
 		my_hash = check_hash_logic(h.hash)
 		if my_hash is None:
 			my_hash = pretty_bytes(h.hash)
 		if bool_write_debug:
-			file.write("# Pos: {0}\n".format(p_data+my_offset))
+			file.write("# Pos: {0}\n".format(cat.p_data+my_offset))
 		file.write(my_hash+"\n")
 		for i, p in enumerate(h.params):
 			if bool_skip_id_zero and p.id == 0:
@@ -923,103 +1773,322 @@ def write_helpers(file, helpers):
 			my_type = p.type
 			if bool_guess_param_types:
 				my_type = guess_param_type(p)
-			my_value = get_param_value_by_type(h, p, my_type)
+			my_value = get_param_value_by_type(cat, h, p, my_type)
 			file.write("\t{0}\t{1}\t{2}\t{3}\n".format(
 				my_id, my_name, my_value, my_type))
 
 
 ## GENERATE TEMPLATES ##
-def write_template(file, helpers):
+# Templates are gathered while streaming every CAT file, params are only
+# stored as rows of columns (logic, id, rank, type, raw value).
+# Types are guessed and merged for all rows at once in resolve_templates().
+# rank = (file index, logic offset) decides which param type wins,
+# the first known type in file order is used like when helpers were merged.
+@dataclass
+class TemplateParam:
+	id: int
+	type: str
+	rank: tuple
+
+
+@dataclass
+class TemplateLogic:
+	index: int
+	hash: bytes
+	rank: tuple
+	params: dict[int, TemplateParam]
+
+
+@dataclass
+class TemplateSet:
+	logics: dict[bytes, TemplateLogic] = field(default_factory=dict)
+	row_logics: list[int] = field(default_factory=list)
+	row_ids: list[int] = field(default_factory=list)
+	row_files: list[int] = field(default_factory=list)
+	row_offsets: list[int] = field(default_factory=list)
+	row_types: list[str] = field(default_factory=list)
+	# 4 bytes per row, only 'unk' params need their value
+	row_values: bytearray = field(default_factory=bytearray)
+	# CAT buffer offsets of the values of the current file, -1 if not needed
+	value_offsets: list[int] = field(default_factory=list)
+
+
+def guess_param_types(values, types):
+	# Same rules as guess_param_type() applied to whole columns,
+	# values holds 4 raw bytes per param
+	as_int = values.view(numpy.int32)
+	as_float = values.view(numpy.float32).astype(numpy.float64)
+	is_int = (as_int != 0) & (as_int <= 32767) & (as_int >= -32768)
+	is_float = (as_int != 0) & ~is_int & (as_float <= 2048.0) & (as_float >= -2048.0) & \
+		~((as_float <= 0.1) & (as_float >= -0.1))
+	guessed = numpy.where(is_int, "int", numpy.where(is_float, "float", "bytes"))
+	return numpy.where(types == "unk", guessed, types)
+
+
+def _gather_template_params(templates, helper, file_index):
+	rank = (file_index, helper.offset)
+	tl = templates.logics.get(helper.hash)
+	if tl is None:
+		tl = TemplateLogic(len(templates.logics), helper.hash, rank, {})
+		templates.logics[helper.hash] = tl
+	elif rank < tl.rank:
+		tl.rank = rank
+	for p in helper.params:
+		templates.row_logics.append(tl.index)
+		templates.row_ids.append(p.id)
+		templates.row_files.append(file_index)
+		templates.row_offsets.append(helper.offset)
+		templates.row_types.append(p.type)
+		# 'unk' params are always 4 bytes
+		if p.type == "unk":
+			templates.value_offsets.append(p.value_offset)
+		else:
+			templates.value_offsets.append(-1)
+
+
+def _read_template_values(templates, cat):
+	# Copy the values of this file's rows before its buffer is closed
+	value_offsets = numpy.array(templates.value_offsets, dtype=numpy.int64)
+	values = numpy.zeros((len(value_offsets), 4), dtype=numpy.uint8)
+	needed = value_offsets >= 0
+	if needed.any():
+		data = cat.buffer.data if cat.buffer.values is None else cat.buffer.values
+		data = numpy.frombuffer(data, dtype=numpy.uint8)
+		values[needed] = data[value_offsets[needed, None] + numpy.arange(4)]
+		del data
+	templates.row_values += values.tobytes()
+	templates.value_offsets = []
+
+
+def gather_templates(condition_templates, track_templates, cat, file_index):
+	gathered = set()
+	for event in iter_cat_events(cat):
+		if event.kind not in ("condition", "track"):
+			continue
+		helper = event.logic
+		# every logic is referenced by offset, only gather it once per file
+		if (event.kind, helper.offset) in gathered:
+			continue
+		gathered.add((event.kind, helper.offset))
+		if event.kind == "condition":
+			_gather_template_params(condition_templates, helper, file_index)
+		else:
+			_gather_template_params(track_templates, helper, file_index)
+	_read_template_values(condition_templates, cat)
+	_read_template_values(track_templates, cat)
+
+
+def resolve_templates(templates):
+	# Pick one type per (logic, param id): guess all params early before merging
+	# for higher chances of finding good value for guessing, then known types
+	# win over 'unk' and lower ranks win over higher ones.
+	if not len(templates.row_ids):
+		return
+	types = numpy.array(templates.row_types)
+	if bool_guess_param_types:
+		values = numpy.frombuffer(bytes(templates.row_values), dtype=numpy.uint8)
+		types = guess_param_types(values, types)
+	logics = numpy.array(templates.row_logics)
+	ids = numpy.array(templates.row_ids)
+	files = numpy.array(templates.row_files)
+	offsets = numpy.array(templates.row_offsets)
+	# stable, the first row of each (logic, id) is the winner
+	order = numpy.lexsort((offsets, files, types == "unk", ids, logics))
+	first = numpy.ones(len(order), dtype=bool)
+	first[1:] = (logics[order[1:]] != logics[order[:-1]]) | (ids[order[1:]] != ids[order[:-1]])
+	template_logics = list(templates.logics.values())
+	for i in order[first].tolist():
+		tl = template_logics[templates.row_logics[i]]
+		p_id = templates.row_ids[i]
+		tl.params[p_id] = TemplateParam(p_id, str(types[i]), (templates.row_files[i], templates.row_offsets[i]))
+
+
+def write_template(file, templates):
 	def hashsort(e):
 		title = check_hash_logic(e.hash)
 		if title is None:
-			return pretty_bytes(e.hash)
+			return (pretty_bytes(e.hash), e.rank)
 		else:
-			return title
+			return (title, e.rank)
 
 	def idsort(e):
 		return e.id
-	# guess all params early before merging for higher chances
-	# of finding good value for guessing
-	for h in helpers:
-		for p in h.params:
-			if bool_guess_param_types:
-				p.type = guess_param_type(p)
 	# sort
-	helpers.sort(key=hashsort)
-	# spaghetti merge
-	number_of_helpers = len(helpers)
-	if number_of_helpers:
-		item = helpers[0]
-	i = 0
-	new_helpers = []
-	while i < (number_of_helpers - 1):
-		my_title = check_hash_logic(item.hash)
-		next_item = helpers[i+1]
-		if item.hash == next_item.hash:
-			# match found
-			# merge identified params
-			for p1 in item.params:
-				for p2 in next_item.params:
-					if p1.id == p2.id:
-						if p1.type == "unk" and p2.type != "unk":
-							p1.type = p2.type
-			# merge missing params
-			param_ids = [p.id for p in item.params]
-			for p in next_item.params:
-				if p.id not in param_ids:
-					item.params.append(p)
-			# sort params
-			item.params.sort(key=idsort)
-			i = i + 1
-		else:
-			new_helpers.append(item)
-			item = next_item
-	# only set all remaining unk types to bytes after merging
-	# this lazy fix should prevent conditionGroups being set to type bytes
-	for h in helpers:
-		for p in h.params:
-			if p.type == "unk":
-				p.type = "bytes"
+	template_logics = list(templates.logics.values())
+	template_logics.sort(key=hashsort)
 	# write
-	for h in new_helpers:
+	for h in template_logics:
 		my_name = check_hash_logic(h.hash)
 		my_hash = pretty_bytes(h.hash)
 		if my_name is None:
 			file.write("{0}\n".format(my_hash))
 		else:
 			file.write("{0}\t{1}\n".format(my_name, my_hash))
-		for i, p in enumerate(h.params):
+		params = list(h.params.values())
+		params.sort(key=idsort)
+		for p in params:
 			if bool_skip_id_zero and p.id == 0:
 				continue
 			my_id = str(p.id)
 			my_name = "param" + \
 				"{value:0{digits}}".format(
 					value=int(my_id), digits=number_of_param_digits)
+			# only set all remaining unk types to bytes after merging
+			# this lazy fix should prevent conditionGroups being set to type bytes
 			my_type = p.type
-			my_value = get_param_value_by_type(h, p, my_type)
+			if my_type == "unk":
+				my_type = "bytes"
 			file.write("\t{0}\t{1}\t{2}\n".format(my_id, my_name, my_type))
 
 
-if bool_generate_templates:
-	if not os.path.exists("TEMPLATES"):
-		os.mkdir("TEMPLATES")
-	tout = open(fn_dbt, "w")
-	write_template(tout, global_thelpers)
-	# write_helpers(tout, global_thelpers)
-	tout.close()
-	cout = open(fn_dbc, "w")
-	write_template(cout, global_chelpers)
-	# write_helpers(cout, global_chelpers)
-	cout.close()
-	# debug write used generic hashes
-	'''
-	debug_used_generic_hashes.sort()
-	fn_out_generic_hashes = open("generic_hashes.txt", "w")
-	for string in debug_used_generic_hashes:
-		fn_out_generic_hashes.write(string+"\n")
-	'''
-
-# End #
-print("-> Done.")
-quit()
+## MAIN ##
+def main():
+	global bool_generate_mact, bool_generate_templates, bool_generate_mactb, bool_mmap_input, export_format
+	global compressed_extension, cache_path, max_cache_size
+
+	load_db_hashes()
+	load_db_logics()
+
+	# Get MODE and 
+	# get CAT files from sys.argv if MODE is regular CAT_TO_MACT,
+	# get CAT path from sys.argv if MODE is GENERATE_TEMPLATES.
+	my_cat_files = []
+	cat_path = None
+	bool_index_only = 0
+	extract_paths = []
+	sys_argv = sys.argv[1:]
+	for i, arg in enumerate(sys_argv):
+		if sys_argv[i].upper() == "--INDEX":
+			try:
+				index_path = sys_argv[i+1]
+				index_db_path = sys_argv[i+2]
+			except:
+				print("Error: --INDEX requires a folder and a database path.")
+				quit()
+			index_cat_files(index_path, index_db_path)
+			print("-> Done.")
+			return
+		if sys_argv[i].upper() == "--GENERATE-TEMPLATES":
+			bool_generate_mact = 0
+			bool_generate_templates = 1
+			my_cat_files = []
+			try:
+				cat_path = sys_argv[i+1]
+				break
+			except:
+				print("Error: No path argument for template generation.")
+				quit()
+		if sys_argv[i].upper() == "--INDEX-ONLY":
+			bool_index_only = 1
+		if sys_argv[i].upper() == "--EXTRACT":
+			try:
+				extract_paths.append(sys_argv[i+1])
+			except:
+				print("Error: No node path argument for extraction.")
+				quit()
+		if sys_argv[i].upper() == "--NO-MMAP":
+			bool_mmap_input = 0
+		if sys_argv[i].upper() == "--CACHE":
+			try:
+				cache_path = sys_argv[i+1]
+			except:
+				print("Error: No folder argument for the decompile cache.")
+				quit()
+		if sys_argv[i].upper() == "--CACHE-SIZE":
+			try:
+				max_cache_size = int(sys_argv[i+1]) * 1024 * 1024
+			except:
+				print("Error: --CACHE-SIZE needs a size in MB.")
+				quit()
+		if sys_argv[i].upper() == "--MACTB":
+			bool_generate_mactb = 1
+		if sys_argv[i].upper() == "--GZ":
+			compressed_extension = ".gz"
+		if sys_argv[i].upper() == "--XZ":
+			compressed_extension = ".xz"
+		if sys_argv[i].upper() == "--JSONL":
+			export_format = "jsonl"
+		if sys_argv[i].upper() == "--MSGPACK":
+			if msgpack is None:
+				print("Error: --MSGPACK requires the 'msgpack' package.")
+				quit()
+			export_format = "msgpack"
+		if sys_argv[i].endswith(".cat"):
+			bool_generate_mact = 1
+			bool_generate_templates = 0
+			img_path, entry_name = IMG_ARCHIVE.split_archive_path(sys_argv[i])
+			if img_path is not None:
+				my_cat_files.append((sys_argv[i], entry_name))
+			else:
+				my_cat_files.append((sys_argv[i], sys_argv[i]))
+		if sys_argv[i].lower().endswith(".img") and not bool_generate_templates:
+			bool_generate_mact = 1
+			my_cat_files.extend(get_img_cat_files(sys_argv[i]))
+	if bool_generate_templates and cat_path.lower().endswith(".img"):
+		my_cat_files.extend(get_img_cat_files(cat_path))
+	elif bool_generate_templates:
+		for root, dirs, files in os.walk(cat_path):
+			for name in files:
+				if name.endswith(".cat"):
+					my_cat_files.append((root + os.sep + name, name))
+	if not len(my_cat_files):
+		print("Error: No CAT files found.")
+		quit()
+
+	# Templates for template generation
+	condition_templates = TemplateSet()
+	track_templates = TemplateSet()
+
+	# If in generate_templates mode
+	# go through all CAT files, gather logic for template,
+	# otherwise generate MACT.
+	for file_index, (cat_path, cat_name) in enumerate(my_cat_files):
+		## NODE INDEX ##
+		if bool_generate_mact and (bool_index_only or len(extract_paths)):
+			extract_cat_nodes(cat_path, cat_name, extract_paths)
+			continue
+
+		## GENERATE MACT ##
+		if bool_generate_mact:
+			if bool_print_debug:
+				print("-> Generating MACT.")
+			write_cat_output(cat_path, cat_name)
+			continue
+
+		cat = open_cat_file(cat_path, cat_name)
+
+		## GATHER TEMPLATES ##
+		if bool_generate_templates:
+			if bool_print_debug:
+				print("{0} -> Gathering templates.".format(cat.buffer.tell()))
+			gather_templates(condition_templates, track_templates, cat, file_index)
+
+		# Close file
+		cat.close()
+	close_img_archives()
+
+	if bool_generate_templates:
+		if not os.path.exists("TEMPLATES"):
+			os.mkdir("TEMPLATES")
+		resolve_templates(track_templates)
+		resolve_templates(condition_templates)
+		tout = open(fn_dbt, "w")
+		write_template(tout, track_templates)
+		tout.close()
+		cout = open(fn_dbc, "w")
+		write_template(cout, condition_templates)
+		cout.close()
+		# debug write used generic hashes
+		'''
+		debug_used_generic_hashes.sort()
+		fn_out_generic_hashes = open("generic_hashes.txt", "w")
+		for string in debug_used_generic_hashes:
+			fn_out_generic_hashes.write(string+"\n")
+		'''
+
+	# End #
+	print("-> Done.")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,303 @@
+# MARCDRED'S COMPLEXITY_CHECK.py V4.2 #
+# marcdred@outlook.com #
+from __future__ import annotations
+import contextlib
+import gc
+import io
+import random
+import sys
+import time
+import numpy
+import CAT_TO_MACT
+import MACT_TO_CAT
+
+
+## SETTINGS ##
+bool_print_debug = 0
+# number of nodes of the smallest synthetic tree, the others have 2, 4 and 8 times as many
+number_of_nodes = 400
+size_factors = (1, 2, 4, 8)
+# every size is timed this many times and the fastest run is kept
+number_of_repeats = 3
+# largest growth exponent allowed for each phase, time ~ size**exponent,
+# 1.0 is linear and 2.0 is quadratic, the rest is room for n*log(n) and noise
+phase_budgets = {
+	# MACT_TO_CAT
+	"parse": 1.3,
+	"build": 1.3,
+	"dedup": 1.3,
+	"optimize": 1.5,
+	"layout": 1.3,
+	# CAT_TO_MACT
+	"decode": 1.3,
+	"mact": 1.3,
+	"index": 1.3,
+}
+# phases faster than this at the biggest size are only timer noise and aren't judged
+min_phase_time = 0.005
+
+
+## PHASES ##
+# MACT_TO_CAT phases are timed by swapping the module functions for timed
+# ones while compile_mact runs, calls made from inside a timed function
+# count for the outer one only. Nothing is left changed afterwards.
+mact_to_cat_phases = {
+	"parse": ("generate_keyword_tree",),
+	"build": ("generate_logic_tree",),
+	"dedup": ("get_early_sleepers", "get_sleeper_strings", "get_sleeper_groups"),
+	"optimize": ("optimize_track_params",),
+	"layout": ("write_cat_tree", "write_groups", "write_param_data", "write_string_table",
+			"fix_group_offsets", "get_bank_layouts"),
+}
+
+
+@contextlib.contextmanager
+def timed_phases(module, phases, timings):
+	originals = {}
+	depth = [0]
+
+	def get_timed_function(phase, function):
+		def timed_function(*args, **kwargs):
+			if depth[0]:
+				return function(*args, **kwargs)
+			depth[0] += 1
+			start = time.perf_counter()
+			try:
+				return function(*args, **kwargs)
+			finally:
+				timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+				depth[0] -= 1
+		return timed_function
+
+	for phase, names in phases.items():
+		for name in names:
+			originals[name] = getattr(module, name)
+			setattr(module, name, get_timed_function(phase, originals[name]))
+	try:
+		yield timings
+	finally:
+		for name, function in originals.items():
+			setattr(module, name, function)
+
+
+@contextlib.contextmanager
+def converter_settings(enable_param_optimization):
+	# converter settings are module globals, they are put back afterwards
+	settings = (MACT_TO_CAT.bool_enable_param_optimization, MACT_TO_CAT.bool_quick_param_optimization,
+			MACT_TO_CAT.bool_little_endian, CAT_TO_MACT.bool_print_debug)
+	MACT_TO_CAT.bool_enable_param_optimization = enable_param_optimization
+	MACT_TO_CAT.bool_quick_param_optimization = False
+	MACT_TO_CAT.bool_little_endian = True
+	CAT_TO_MACT.bool_print_debug = bool_print_debug
+	try:
+		yield
+	finally:
+		(MACT_TO_CAT.bool_enable_param_optimization, MACT_TO_CAT.bool_quick_param_optimization,
+			MACT_TO_CAT.bool_little_endian, CAT_TO_MACT.bool_print_debug) = settings
+
+
+@contextlib.contextmanager
+def gc_disabled():
+	# like timeit, collections would otherwise add time that grows with everything still alive
+	gc.collect()
+	was_enabled = gc.isenabled()
+	gc.disable()
+	try:
+		yield
+	finally:
+		if was_enabled:
+			gc.enable()
+
+
+## SYNTHETIC TREES ##
+# Trees are written as MACT text the way CAT_TO_MACT writes CAT files it has
+# no DB or templates for (hex titles and [id] params), so nothing has to be loaded.
+# Logic titles, values and strings are drawn from pools that grow with the tree,
+# so there is always some of both, shared and unique data. Every Node also gets
+# a condition with a condition group ('cg' param) and a track with a string of
+# its own, some get a FileReference, so strings, groups and reference strings
+# grow with the tree too.
+def generate_mact_lines(number_of_nodes, seed=0):
+	r = random.Random(seed)
+	condition_titles = ["0x{0:08X}".format(r.getrandbits(32)) for i in range(0, 24)]
+	track_titles = ["0x{0:08X}".format(r.getrandbits(32)) for i in range(0, 24)]
+	number_of_values = max(number_of_nodes // 2, 8)
+	number_of_strings = max(number_of_nodes // 8, 4)
+	lines = []
+
+	def get_value():
+		i = r.randrange(0, 8)
+		if i == 0:
+			return '"STRING_{0}"'.format(r.randrange(0, number_of_strings))
+		if i == 1:
+			return str(r.randrange(0, 16))
+		if i == 2:
+			return "{0:f}".format(r.randrange(0, number_of_values) / 4)
+		return "0x{0:08X}".format(r.randrange(0, number_of_values))
+
+	def write_logic(level, title, number_of_params):
+		lines.append("{0}{1}\n".format(level*"\t", title))
+		lines.append("{0}{{\n".format(level*"\t"))
+		param_ids = sorted(r.sample(range(1, 40), number_of_params))
+		for param_id in param_ids:
+			lines.append("{0}[{1:05d}]\t{2}\n".format((level+1)*"\t", param_id, get_value()))
+		lines.append("{0}}}\n".format(level*"\t"))
+
+	def write_group_condition(level):
+		lines.append("{0}{1}\n{0}{{\n".format(level*"\t", r.choice(condition_titles)))
+		lines.append("{0}[00001]\t{1}\n".format((level+1)*"\t", get_value()))
+		lines.append("{0}[00002]\n{0}{{\n".format((level+1)*"\t"))
+		for i in range(0, r.randrange(1, 3)):
+			write_logic(level+2, r.choice(condition_titles), r.randrange(1, 3))
+		lines.append("{0}}}\n".format((level+1)*"\t"))
+		lines.append("{0}}}\n".format(level*"\t"))
+
+	def write_string_track(level, title):
+		lines.append("{0}{1}\n{0}{{\n".format(level*"\t", r.choice(track_titles)))
+		lines.append("{0}[00004]\t\"NODE_{1}\"\n".format((level+1)*"\t", title))
+		lines.append("{0}[00008]\t{1}\n".format((level+1)*"\t", get_value()))
+		lines.append("{0}}}\n".format(level*"\t"))
+
+	def write_file_reference(level, title):
+		lines.append("{0}FileReference\n{0}{{\n".format(level*"\t"))
+		lines.append("{0}fileName\t\"F{1}.act\"\n".format((level+1)*"\t", title))
+		lines.append("{0}path\t\"/Global/N{1}\"\n".format((level+1)*"\t", title))
+		lines.append("{0}includeFile\tfalse\n".format((level+1)*"\t"))
+		lines.append("{0}}}\n".format(level*"\t"))
+
+	def write_node(level, kind, title):
+		lines.append("{0}{1} {2}\n".format(level*"\t", kind, title))
+		lines.append("{0}{{\n".format(level*"\t"))
+		lines.append("{0}ConditionGroup\n{0}{{\n".format((level+1)*"\t"))
+		for i in range(0, r.randrange(0, 3)):
+			write_logic(level+2, r.choice(condition_titles), r.randrange(1, 4))
+		if kind == "Node":
+			write_group_condition(level+2)
+		lines.append("{0}}}\n".format((level+1)*"\t"))
+		if kind == "Node":
+			lines.append("{0}Tracks\n{0}{{\n".format((level+1)*"\t"))
+			for i in range(0, r.randrange(0, 4)):
+				write_logic(level+2, r.choice(track_titles), r.randrange(2, 16))
+			write_string_track(level+2, title)
+			lines.append("{0}}}\n".format((level+1)*"\t"))
+			if r.randrange(0, 8) == 0:
+				write_file_reference(level+1, title)
+
+	# one Bank for every 64 nodes, nodes get up to 4 children
+	number_of_banks = max(number_of_nodes // 64, 1)
+	write_node(0, "Bank", 1)
+	node_title = 2
+	for i in range(0, number_of_banks):
+		write_node(1, "Bank", node_title)
+		node_title += 1
+		stack = []
+		for j in range(0, number_of_nodes // number_of_banks):
+			while len(stack) and (len(stack) > 6 or r.randrange(0, 4) == 0):
+				lines.append("{0}}}\n".format((len(stack)+1)*"\t"))
+				stack.pop()
+			write_node(len(stack)+2, "Node", node_title)
+			stack.append(node_title)
+			node_title += 1
+		while len(stack):
+			lines.append("{0}}}\n".format((len(stack)+1)*"\t"))
+			stack.pop()
+		lines.append("\t}\n")
+	lines.append("}\n")
+	return lines
+
+
+## TIMING ##
+def time_size(number_of_nodes):
+	# fastest time of each phase for one tree size
+	lines = generate_mact_lines(number_of_nodes)
+	best = {}
+	for i in range(0, number_of_repeats):
+		timings = {}
+		with contextlib.redirect_stdout(io.StringIO()), gc_disabled():
+			with converter_settings(False), timed_phases(MACT_TO_CAT, mact_to_cat_phases, timings):
+				f_cat = io.BytesIO()
+				MACT_TO_CAT.compile_mact(lines, f_cat)
+			optimized_timings = {}
+			with converter_settings(True), timed_phases(MACT_TO_CAT, mact_to_cat_phases, optimized_timings):
+				MACT_TO_CAT.compile_mact(lines, io.BytesIO())
+			timings["optimize"] = optimized_timings["optimize"]
+			data = f_cat.getvalue()
+			with converter_settings(False):
+				timings.update(time_cat_to_mact(data))
+		for phase, t in timings.items():
+			best[phase] = min(best.get(phase, t), t)
+	return best
+
+
+def time_cat_to_mact(data):
+	timings = {}
+	start = time.perf_counter()
+	cat = CAT_TO_MACT.open_cat_bytes(data, "synthetic.cat")
+	timings["decode"] = time.perf_counter() - start
+	start = time.perf_counter()
+	CAT_TO_MACT.write_mact(io.StringIO(), cat)
+	timings["mact"] = time.perf_counter() - start
+	start = time.perf_counter()
+	CAT_TO_MACT.build_node_index(cat)
+	timings["index"] = time.perf_counter() - start
+	cat.close()
+	return timings
+
+
+def get_growth_exponent(sizes, times):
+	# slope of log(time) over log(size), least squares
+	return numpy.polyfit(numpy.log(sizes), numpy.log(times), 1)[0]
+
+
+def run_complexity_check(base_number_of_nodes=None):
+	# -> list of (phase, times, exponent or None, budget), exponent is None when too fast to judge
+	if base_number_of_nodes is None:
+		base_number_of_nodes = number_of_nodes
+	sizes = [base_number_of_nodes*factor for factor in size_factors]
+	size_timings = []
+	for size in sizes:
+		print("->-> Timing {0} nodes.".format(size))
+		size_timings.append(time_size(size))
+	results = []
+	for phase, budget in phase_budgets.items():
+		times = [max(timings[phase], 1e-9) for timings in size_timings]
+		exponent = None
+		if times[-1] >= min_phase_time:
+			exponent = get_growth_exponent(sizes, times)
+		results.append((phase, times, exponent, budget))
+	return results
+
+
+def main():
+	base_number_of_nodes = number_of_nodes
+	sys_argv = sys.argv[1:]
+	for i, arg in enumerate(sys_argv):
+		if sys_argv[i].upper() == "--N":
+			try:
+				base_number_of_nodes = int(sys_argv[i+1])
+			except:
+				print("Error: --n needs a number of nodes.")
+				quit()
+
+	print("-> Checking growth of every phase from {0} to {1} nodes.".format(
+		base_number_of_nodes*size_factors[0], base_number_of_nodes*size_factors[-1]))
+	results = run_complexity_check(base_number_of_nodes)
+	number_of_failed_phases = 0
+	for phase, times, exponent, budget in results:
+		times = ", ".join("{0:.4f}".format(t) for t in times)
+		if exponent is None:
+			print("->-> {0}: {1}s, too fast to judge.".format(phase, times))
+		elif exponent > budget:
+			number_of_failed_phases += 1
+			print("Error: {0}: {1}s, grows with exponent {2:.2f}, budget is {3:.2f}.".format(
+				phase, times, exponent, budget))
+		else:
+			print("->-> {0}: {1}s, exponent {2:.2f} (budget {3:.2f}).".format(phase, times, exponent, budget))
+	print("Info: {0} of {1} phases over budget.".format(number_of_failed_phases, len(results)))
+	print("-> Done.")
+	if number_of_failed_phases:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
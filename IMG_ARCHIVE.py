@@ -0,0 +1,165 @@
+# MARCDRED'S IMG_ARCHIVE.py V4.2 #
+# marcdred@outlook.com #
+from __future__ import annotations
+from dataclasses import dataclass
+import mmap
+import os
+import struct
+
+
+## SETTINGS ##
+sector_size = 2048
+
+
+## CLASSES ##
+# IMG archives come in two flavours, both store entries in 2048 byte sectors:
+#	version 1	-> Act.img holds the entries, Act.dir holds 32 byte directory entries
+#					(offset I, size I, name 24s) in sectors
+#	version 2	-> Act.img starts with "VER2", number of entries I and the directory
+#					(offset I, size H, archive size H, name 24s) in sectors
+# Entries are read through a memory map of the archive, nothing is extracted.
+@dataclass
+class ImgEntry:
+	name: str
+	# in bytes
+	offset: int
+	size: int
+
+
+@dataclass
+class ImgArchive:
+	path: str
+	version: int
+	entries: list[ImgEntry]
+	source: object
+	data: memoryview
+
+	def get_entry(self, name):
+		# names are matched like the game does, ignoring case
+		name = name.lower()
+		for entry in self.entries:
+			if entry.name.lower() == name:
+				return entry
+		return None
+
+	def get_entry_data(self, entry):
+		return self.data[entry.offset:entry.offset+entry.size]
+
+	def close(self):
+		self.data.release()
+		if isinstance(self.source, mmap.mmap):
+			self.source.close()
+
+
+dir_entry = struct.Struct("<II24s")
+ver2_entry = struct.Struct("<IHH24s")
+ver2_header = struct.Struct("<4sI")
+
+
+def split_archive_path(path):
+	# "C:\\Act\\Act.img:Name.cat" -> ("C:\\Act\\Act.img", "Name.cat"), (None, None) otherwise
+	i = path.lower().rfind(".img:")
+	if i < 0:
+		return None, None
+	return path[:i+len(".img")], path[i+len(".img:"):]
+
+
+def get_dir_path(img_path):
+	return img_path[:-len(".img")] + ".dir"
+
+
+def decode_entry_name(name):
+	return name.split(b'\x00', 1)[0].decode('utf-8', 'replace')
+
+
+def encode_entry_name(name):
+	encoded_name = name.encode('utf-8')
+	if len(encoded_name) > 23:
+		print("Warning: IMG entry name '{0}' is too long, it will be cut.".format(name))
+		encoded_name = encoded_name[:23]
+	return encoded_name
+
+
+def open_img_archive(img_path):
+	file = open(img_path, "rb")
+	try:
+		source = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+	except (ValueError, OSError):
+		source = file.read()
+	file.close()
+	data = memoryview(source)
+	entries = []
+	if data[:4] == b'VER2':
+		version = 2
+		magic, number_of_entries = ver2_header.unpack_from(data, 0)
+		for i in range(0, number_of_entries):
+			offset, size, archive_size, name = ver2_entry.unpack_from(data, ver2_header.size + i*ver2_entry.size)
+			if not size:
+				size = archive_size
+			entries.append(ImgEntry(decode_entry_name(name), offset*sector_size, size*sector_size))
+	else:
+		version = 1
+		file = open(get_dir_path(img_path), "rb")
+		dir_data = file.read()
+		file.close()
+		for offset, size, name in dir_entry.iter_unpack(dir_data[:len(dir_data) - len(dir_data) % dir_entry.size]):
+			entries.append(ImgEntry(decode_entry_name(name), offset*sector_size, size*sector_size))
+	return ImgArchive(img_path, version, entries, source, data)
+
+
+def new_img_archive(img_path, version=1):
+	return ImgArchive(img_path, version, [], b'', memoryview(b''))
+
+
+def write_img_archive(img_path, archive, new_entries):
+	# Entries are written in one sequential pass, entries of the old archive
+	# are copied unless new_entries (name -> bytes) replaces them,
+	# new names are added at the end. The archive is written next to its
+	# final path first so the old archive can be the same file.
+	# (name, old entry or None, new data or None)
+	entries = []
+	indices = {}
+	for entry in archive.entries:
+		indices[entry.name.lower()] = len(entries)
+		entries.append((entry.name, entry, None))
+	for name, data in new_entries.items():
+		i = indices.get(name.lower())
+		if i is None:
+			indices[name.lower()] = len(entries)
+			entries.append((name, None, data))
+		else:
+			entries[i] = (entries[i][0], None, data)
+	number_of_header_sectors = 0
+	if archive.version == 2:
+		header_size = ver2_header.size + len(entries)*ver2_entry.size
+		number_of_header_sectors = (header_size + sector_size - 1) // sector_size
+	directory = []
+	f_img = open(img_path + ".tmp", "wb")
+	f_img.write(b'\x00' * number_of_header_sectors * sector_size)
+	for name, entry, data in entries:
+		if entry is not None:
+			data = archive.get_entry_data(entry)
+		offset = f_img.tell() // sector_size
+		f_img.write(data)
+		pad = -len(data) % sector_size
+		f_img.write(b'\x00' * pad)
+		directory.append((offset, (len(data) + pad) // sector_size, encode_entry_name(name)))
+		if entry is not None:
+			data.release()
+	if archive.version == 2:
+		f_img.seek(0)
+		f_img.write(ver2_header.pack(b'VER2', len(directory)))
+		for offset, size, name in directory:
+			f_img.write(ver2_entry.pack(offset, size, 0, name))
+	f_img.close()
+	if archive.version == 1:
+		f_dir = open(get_dir_path(img_path) + ".tmp", "wb")
+		for offset, size, name in directory:
+			f_dir.write(dir_entry.pack(offset, size, name))
+		f_dir.close()
+	# the old archive may be mapped, close it before replacing it
+	archive.close()
+	os.replace(img_path + ".tmp", img_path)
+	if archive.version == 1:
+		os.replace(get_dir_path(img_path) + ".tmp", get_dir_path(img_path))
+	return len(entries)
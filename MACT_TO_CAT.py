@@ -5,15 +5,23 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
 	from typing_extensions import Self
 import struct
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import math
-import numpy
 from itertools import chain
+import io
 import os
+import gzip
+import lzma
 import sys
+import json
+import contextlib
+import multiprocessing
 from pathlib import Path
 import time
 from copy import deepcopy
+from collections import deque
+import bisect
+import IMG_ARCHIVE
 
 # GOALS:
 # --	Slightly decrease param type dependency to template files.
@@ -23,10 +31,39 @@ from copy import deepcopy
 ## SETTINGS ##
 bool_print_debug = False
 bool_print_tree = False
+# byte order of the CAT files written, --BE and --LE change it for the MACT files after them
 bool_little_endian = True
 bool_enable_param_optimization = False
-# (slow optimization seems to never be worth it, takes 10x as long to improve 20% best case)
-bool_quick_param_optimization = True
+# compute the CAT layout without writing it
+bool_size_report = False
+# also save parsed MACT files as MACTB
+bool_write_mactb = False
+# quick optimization only shares params between tracks with the same title,
+# params are looked up through an index so sharing across titles is cheap
+bool_quick_param_optimization = False
+# best optimization targets kept per track
+max_optimization_candidates = 16
+# CAT files are written here instead of the working directory
+output_path = None
+# keep running and recompile MACT files whenever they change
+bool_watch = False
+# seconds between checks for changed MACT files
+watch_interval = 0.5
+# CAT files are written into a copy of this IMG archive instead
+img_path = None
+new_img_path = None
+# only validate MACT files, see check_logic_tree()
+bool_check = False
+
+## LIMITS ##
+# Limits of the CAT format, counts are stored as "B" and "H"
+# and optimization offsets as a signed distance
+max_logics_per_node = 255
+max_children_per_node = 65535
+max_variable_uses = 65535
+max_optimization_distance = 32767
+# param ids share their "H" with 3 flag bits
+max_param_id = 0x1FFF
 
 
 ## CLASSES ##
@@ -69,77 +106,86 @@ class OffsetManager:
 	debug_merged_strings: int = 0
 	debug_merged_logic: int = 0
 	debug_merged_groups: int = 0
-
-	def _add_sleeping_string(self, new_ss, sleeper_list):
-		repeated = False
-		for old_ss in sleeper_list:
-			if old_ss.string == new_ss.string:
-				repeated = True
-				for v in new_ss.string_users:
-					old_ss.string_users.append(v)
-				for v in new_ss.string_slots:
-					old_ss.string_slots.append(v)
-				for v in new_ss.param_slots:
-					old_ss.param_slots.append(v)
-				for v in new_ss.param_offsets:
-					old_ss.param_offsets.append(v)
-				self.debug_merged_strings += 1
-				break
-		if not repeated:
+	debug_group_bytes_saved: int = 0
+	# Sleepers already in each list by what they are merged on,
+	# so merging a new sleeper doesn't scan the whole list
+	string_index: dict = field(default_factory=dict)
+	reference_string_index: dict = field(default_factory=dict)
+	group_index: dict = field(default_factory=dict)
+	condition_index: dict = field(default_factory=dict)
+	group_condition_index: dict = field(default_factory=dict)
+	track_index: dict = field(default_factory=dict)
+
+	def _add_sleeping_string(self, new_ss, sleeper_list, index):
+		old_ss = index.get(new_ss.string)
+		if old_ss is not None:
+			for v in new_ss.string_users:
+				old_ss.string_users.append(v)
+			for v in new_ss.string_slots:
+				old_ss.string_slots.append(v)
+			for v in new_ss.param_slots:
+				old_ss.param_slots.append(v)
+			for v in new_ss.param_offsets:
+				old_ss.param_offsets.append(v)
+			self.debug_merged_strings += 1
+		else:
+			index[new_ss.string] = new_ss
 			sleeper_list.append(new_ss)
 
 	def add_sleeping_string(self, new_ss):
-		self._add_sleeping_string(new_ss, self.sleeping_strings)
+		self._add_sleeping_string(new_ss, self.sleeping_strings, self.string_index)
 
 	def add_sleeping_reference_string(self, new_srs):
-		self._add_sleeping_string(new_srs, self.sleeping_reference_strings)
-
-	def _add_sleeping_group(self, new_sg, sleeper_list):
-		repeated = False
-		for old_sg in sleeper_list:
-			if old_sg.cg_param == new_sg.cg_param:
-				repeated = True
-				for v in new_sg.cg_users:
-					old_sg.cg_users.append(v)
-				for v in new_sg.group_slots:
-					old_sg.group_slots.append(v)
-				for v in new_sg.condition_slots:
-					old_sg.condition_slots.append(v)
-				for v in new_sg.condition_offsets:
-					old_sg.condition_offsets.append(v)
-				for v in new_sg.param_slots:
-					old_ss.param_slots.append(v)
-				for v in new_sg.param_offsets:
-					old_ss.param_offsets.append(v)
-				self.debug_merged_groups += 1
-				break
-		if not repeated:
+		self._add_sleeping_string(new_srs, self.sleeping_reference_strings, self.reference_string_index)
+
+	def _add_sleeping_group(self, new_sg, sleeper_list, index):
+		# Groups are merged by content, the title of the param using them doesn't matter
+		if new_sg.fingerprint is None:
+			new_sg.fingerprint = get_group_fingerprint(new_sg.cg_param)
+		old_sg = index.get(new_sg.fingerprint)
+		if old_sg is not None:
+			for v in new_sg.cg_users:
+				old_sg.cg_users.append(v)
+			for v in new_sg.group_slots:
+				old_sg.group_slots.append(v)
+			for v in new_sg.condition_slots:
+				old_sg.condition_slots.append(v)
+			for v in new_sg.condition_offsets:
+				old_sg.condition_offsets.append(v)
+			for v in new_sg.param_slots:
+				old_sg.param_slots.append(v)
+			for v in new_sg.param_offsets:
+				old_sg.param_offsets.append(v)
+			self.debug_merged_groups += 1
+			# group variable (offset + count) and group (count + condition offsets)
+			self.debug_group_bytes_saved += 6 + 1 + 4*len(new_sg.cg_param.children)
+		else:
+			index[new_sg.fingerprint] = new_sg
 			sleeper_list.append(new_sg)
 
 	def add_sleeping_group(self, new_sg):
-		self._add_sleeping_group(new_sg, self.sleeping_groups)
+		self._add_sleeping_group(new_sg, self.sleeping_groups, self.group_index)
 
-	def _add_sleeping_logic(self, new_sl, sleeper_list, allow_repeated):
-		repeated = False
+	def _add_sleeping_logic(self, new_sl, sleeper_list, index, allow_repeated):
+		old_sl = None
 		if not allow_repeated:
-			for old_sl in sleeper_list:
-				if old_sl.logic == new_sl.logic:
-					repeated = True
-					for v in new_sl.logic_slots:
-						old_sl.logic_slots.append(v)
-					self.debug_merged_logic += 1
-					break
-		if not repeated:
+			old_sl = find_sleeping_logic(index, new_sl.logic)
+		if old_sl is not None:
+			for v in new_sl.logic_slots:
+				old_sl.logic_slots.append(v)
+			self.debug_merged_logic += 1
+		else:
+			index_sleeping_logic(index, new_sl)
 			sleeper_list.append(new_sl)
 
 	def add_sleeping_condition(self, new_sc, allow_repeated=False):
-		self._add_sleeping_logic(new_sc, self.sleeping_conditions, allow_repeated)
+		self._add_sleeping_logic(new_sc, self.sleeping_conditions, self.condition_index, allow_repeated)
 
 	def add_sleeping_group_condition(self, new_sgc, allow_repeated=False):
-		self._add_sleeping_logic(new_sgc, self.sleeping_group_conditions, allow_repeated)
+		self._add_sleeping_logic(new_sgc, self.sleeping_group_conditions, self.group_condition_index, allow_repeated)
 
 	def add_sleeping_track(self, new_st, allow_repeated=False):
-		self._add_sleeping_logic(new_st, self.sleeping_tracks, allow_repeated)
+		self._add_sleeping_logic(new_st, self.sleeping_tracks, self.track_index, allow_repeated)
 
 
 @dataclass
@@ -195,6 +241,9 @@ class SleepingGroup:
 	# This list is created when running write_group_variables()
 	param_slots: list[int]
 	param_offsets: list[int]
+	# FINGERPRINT:
+	# Content of the conditions in this group, see get_group_fingerprint()
+	fingerprint: tuple = None
 
 
 @dataclass
@@ -204,6 +253,74 @@ class SleepingLogic:
 	logic_offset: int
 
 
+@dataclass
+class StringTable:
+	# string section bytes and where each string starts in it
+	data: bytearray
+	offsets: dict[bytes, int]
+	bytes_saved: int
+	# bytes of strings only used by 'FileReference'
+	reference_bytes: int = 0
+
+
+@dataclass
+class BankLayout:
+	title: str
+	level: int
+	tree_bytes: int
+	param_bytes: int
+
+
+@dataclass
+class CatLayout:
+	# section start offsets, see compile_mact()
+	p_string_variables: int
+	p_group_variables: int
+	p_tree: int
+	p_groups: int
+	p_data: int
+	p_strings: int
+	string_table: StringTable
+	file_length: int
+	padding: int
+	banks: list[BankLayout]
+
+
+@dataclass
+class CheckDiagnostic:
+	file: str
+	# "Bank A/Node ABORT/Track Animation/param00002", empty for the whole file
+	path: str
+	# "error" breaks the file or the game, "warning" might
+	severity: str
+	code: str
+	message: str
+
+
+@dataclass
+class NullWriter:
+	# Stands in for the CAT file when only its layout is needed,
+	# follows the position and length of what would be written
+	position: int = 0
+	length: int = 0
+
+	def tell(self):
+		return self.position
+
+	def seek(self, offset, whence=0):
+		if whence == 1:
+			offset += self.position
+		elif whence == 2:
+			offset += self.length
+		self.position = offset
+		return self.position
+
+	def write(self, data):
+		self.position += len(data)
+		self.length = max(self.length, self.position)
+		return len(data)
+
+
 @dataclass
 class LogicOptimization:
 	sleeping_logic: SleepingLogic
@@ -233,6 +350,11 @@ class LogicNode:
 	tracks: list[LogicNode]
 	params: list[LogicNode]
 	children: list[LogicNode]
+	# params only, decoded once by encode_param_value():
+	# typed_value is the int/float/bool/bytes/str behind value,
+	# encoded_value is what gets written to the CAT file (a string's hash when it isn't in the string table)
+	typed_value: object = field(default=None, compare=False)
+	encoded_value: bytes = field(default=None, compare=False)
 
 	def print_tree(self):
 		self._print_tree(0)
@@ -273,17 +395,13 @@ def print_debug(msg):
 		print(msg)
 
 
-def _to_int32(val):
-	return numpy.array((val,), dtype=numpy.int32)
-
-
 def _hash_cat_string(string, type):
 	string = string.upper()
-	result = _to_int32(0)
+	result = 0
 
+	# int32 arithmetic, wrapped by hand
 	for c in string:
-		result *= 0x83
-		result += ord(c)
+		result = (result * 0x83 + ord(c)) & 0xFFFFFFFF
 
 	# required for all
 	result = result & 0x7FFFFFFF
@@ -308,15 +426,29 @@ def _hash_cat_string(string, type):
 	return final_result
 
 
-def format_write(file, variable, format):
-	if bool_little_endian:
-		format = "<" + format
-	else:
-		format = ">" + format
+# Struct objects are compiled once per byte order and format instead of once per write
+struct_codecs = {"<": {}, ">": {}}
+def format_pack(variable, format):
+	byte_order = "<" if bool_little_endian else ">"
+	compiled_struct = struct_codecs[byte_order].get(format)
+	if compiled_struct is None:
+		compiled_struct = struct.Struct(byte_order + format)
+		struct_codecs[byte_order][format] = compiled_struct
 	if isinstance(variable, str):
 		variable = bytes(variable, 'utf-8')
-	value = struct.pack(format, variable)
-	file.write(value)
+	return compiled_struct.pack(variable)
+
+
+def format_word(value):
+	# Hashes and bytes values are shown in little-endian order in MACT files,
+	# big-endian CAT files store their 4 bytes the other way around
+	if bool_little_endian or len(value) != 4:
+		return value
+	return value[::-1]
+
+
+def format_write(file, variable, format):
+	file.write(format_pack(variable, format))
 	return
 
 
@@ -354,6 +486,42 @@ def get_value_type(value):
 		return "int"
 
 
+def encode_param_value(param):
+	value = param.value
+	value_type = param.value_type
+	if value_type == "bytes":
+		try:
+			param.typed_value = bytes.fromhex(value[2:])
+		except:
+			print("Error: Mismatched param type '{0}' on value '{1}', expected bytes. Writing zero. (Try generating templates)".format(
+				value_type, value))
+			param.encoded_value = bytes(4)
+			return
+		param.encoded_value = format_word(param.typed_value)
+	elif value_type == "int":
+		param.typed_value = int(value)
+		param.encoded_value = format_pack(param.typed_value, "i")
+	elif value_type == "bool":
+		string = str(value).upper()
+		param.typed_value = '1' in string or "TRUE" in string
+		param.encoded_value = format_pack(int(param.typed_value), "B")
+	elif value_type == "float":
+		param.typed_value = float(value)
+		param.encoded_value = format_pack(param.typed_value, "f")
+	elif value_type == "string":
+		param.typed_value = strip_string(value)
+		param.encoded_value = format_word(bytes(hash_cat_value(param.typed_value)))
+	elif value_type == "hashed_string":
+		# Remove 'h' and quotes from string
+		if value.startswith('h\"'):
+			value = value[2:-1]
+		param.typed_value = value
+		param.encoded_value = format_word(bytes(hash_cat_value(value)))
+	elif value_type == "cg":
+		# group offsets are only known when writing
+		param.encoded_value = bytes(4)
+
+
 def generate_keyword_tree(lines):
 	# remove empty lines
 	bad_characters = ('', ' ', '\t', '\0', '\r', '\r', '\n')
@@ -366,7 +534,7 @@ def generate_keyword_tree(lines):
 		if good_line:
 			good_lines.append((i, l))
 	# call real parsing
-	_, tree, _ = _generate_keyword_tree(good_lines, [], [], 0)
+	_, tree, _ = _generate_keyword_tree(deque(good_lines), [], [], 0)
 	if len(tree) == 1:
 		return tree[0]
 	else:
@@ -376,9 +544,8 @@ def generate_keyword_tree(lines):
 
 def _generate_keyword_tree(enumerated_lines, local_logics, global_logics, logic_level):
 	# Generate tree using curly brackets
-	line_id = enumerated_lines[0][0]
-	raw_line = enumerated_lines[0][1]
-	enumerated_lines = enumerated_lines[1:]
+	# lines are consumed from the left, a deque avoids copying the rest every line
+	line_id, raw_line = enumerated_lines.popleft()
 	# Manage keywords without changing raw_line
 	keywords = []
 	kw_start = 0
@@ -520,7 +687,8 @@ def _generate_logic_tree(keywords_owner, type_owner, keyword_branch):
 			my_type = "Condition"
 		elif keywords_owner.keywords[0] == "Tracks":
 			my_type = "Track"
-		elif type_owner in ('Param') and len(keyword_branch.children):
+		elif type_owner in ('Param'):
+			# everything inside a 'cg' param is a condition, even without params
 			my_type = "Condition"
 	if my_type == "Unk":
 		if my_title == "Bank":
@@ -565,11 +733,43 @@ def _generate_logic_tree(keywords_owner, type_owner, keyword_branch):
 		# jank
 		if my_logic.value_type == "none" and len(new_children):
 			my_logic.value_type = "cg"
+	if my_type == "Param":
+		encode_param_value(my_logic)
 	# Overwrite current children
 	my_logic.children = new_children
 	return my_logic
 
 
+def get_logic_fingerprint(logic):
+	# Hashable copy of everything that ends up written for this logic
+	params = tuple([(p.title, p.value_type, p.value, get_group_fingerprint(p)) for p in logic.params])
+	return (logic.title, logic.type, logic.value, params)
+
+
+def get_group_fingerprint(cg_param):
+	return tuple([get_logic_fingerprint(c) for c in cg_param.children])
+
+
+def index_sleeping_logic(index, sl):
+	# index: fingerprint -> sleeping logic with that fingerprint, in list order
+	index.setdefault(get_logic_fingerprint(sl.logic), []).append(sl)
+
+
+def get_sleeping_logic_index(sleeper_list):
+	index = {}
+	for sl in sleeper_list:
+		index_sleeping_logic(index, sl)
+	return index
+
+
+def find_sleeping_logic(index, logic):
+	# First sleeping logic equal to logic, like scanning the list would find
+	for sl in index.get(get_logic_fingerprint(logic), []):
+		if sl.logic == logic:
+			return sl
+	return None
+
+
 def get_logic_nodes(logic_tree):
 	nodes = []
 	nodes.append(logic_tree)
@@ -627,23 +827,23 @@ def match_param_database(logic_title, logic_param, db):
 	return param_match
 
 
+def get_sleeper_params(sl):
+	# Params left to write after track param optimization
+	if bool_enable_param_optimization:
+		lo = sleeper_optimizations.get(id(sl))
+		if lo is not None and lo.optimization:
+			return lo.optimization.unique_params
+	return sl.logic.params
+
+
 def get_sleeper_strings():
 	for sl in offset_manager.sleeping_tracks + offset_manager.sleeping_conditions:
 		# get strings from optimization, if possible
-		if bool_enable_param_optimization:
-			match = False
-			for lo in logic_optimizations:
-				if sl.logic == lo.sleeping_logic.logic:
-					if lo.optimization:
-						match = True
-						my_params = lo.optimization.unique_params
-						break
-		if not bool_enable_param_optimization or not match:
-			my_params = sl.logic.params
+		my_params = get_sleeper_params(sl)
 		# gather strings
 		for p in my_params:
 			if p.value_type == "string":
-				my_string = strip_string(p.value)
+				my_string = p.typed_value
 				if len(my_string):
 					ss = SleepingString(my_string, [p], [], [], [])
 					offset_manager.add_sleeping_string(ss)
@@ -670,16 +870,7 @@ def get_sleeper_groups():
 	### and these are getting merged down when run through get_early_sleepers()
 	for sl in offset_manager.sleeping_tracks + offset_manager.sleeping_conditions:
 		# get groups from optimizations, if possible
-		if bool_enable_param_optimization:
-			match = False
-			for lo in logic_optimizations:
-				if sl.logic == lo.sleeping_logic.logic:
-					if lo.optimization:
-						match = True
-						my_params = lo.optimization.unique_params
-						break
-		if not bool_enable_param_optimization or not match:
-			my_params = sl.logic.params
+		my_params = get_sleeper_params(sl)
 		# gather cg as usual
 		for p in my_params:
 			if p.value_type == "cg" and len(p.children):
@@ -742,6 +933,7 @@ def get_early_sleepers(logic_tree):
 def write_cat_tree(file, logic_tree):
 	my_logic = logic_tree
 	my_type = my_logic.type
+	my_start = file.tell()
 	number_of_children = len(my_logic.children)
 	# print character based on type
 	if my_type in ('Bank'):
@@ -782,10 +974,10 @@ def write_cat_tree(file, logic_tree):
 	if my_type in ('Bank', 'Node'):
 		if my_logic.value_type == "bytes":
 			my_hash = bytearray.fromhex(my_logic.value[2:].upper())
-			file.write(my_hash)
+			file.write(format_word(my_hash))
 		else:
 			hashed_title = hash_cat_title(my_logic.value)
-			file.write(hashed_title)
+			file.write(format_word(hashed_title))
 	# optimization jank -- since tracks and conditions get merged when converted to sleeping tracks
 	#	my_logic.tracks and my_logic.conditions aren't accurate anymore
 	# NOTE: conditions must be allowed to be repeated here
@@ -794,38 +986,34 @@ def write_cat_tree(file, logic_tree):
 	# NOTE: can't compare old tracks with new optimized tracks because they are different when optimized
 	my_conditions = []
 	for c in my_logic.conditions:
-		if c in [c.logic for c in offset_manager.sleeping_conditions]:
-			my_conditions.append(c)
+		sc = find_sleeping_logic(tree_condition_index, c)
+		if sc is not None:
+			my_conditions.append(sc)
 		else:
 			print("Warning: Unable to match tree condition {0} with sleeping conditions.".format(c.title))
 	my_tracks = []
 	for t in my_logic.tracks:
-		if t in [t.logic for t in offset_manager.sleeping_tracks]:
-			my_tracks.append(t)
+		st = find_sleeping_logic(tree_track_index, t)
+		if st is not None:
+			my_tracks.append(st)
 		else:
 			print("Warning: Unable to match tree track {0} with sleeping tracks.".format(t.title))
 	# print conditions
 	if my_type in ('Bank', 'Node'):
 		format_write(file, len(my_conditions), "B")
-		for c in my_conditions:
+		for sc in my_conditions:
 			# Update existing sleeping condition
 			my_offset = file.tell()
-			for sc in offset_manager.sleeping_conditions:
-				if sc.logic == c:
-					sc.logic_slots.append(my_offset)
-					break
+			sc.logic_slots.append(my_offset)
 			# Write padding
 			format_write(file, 0, "I")
 	# print tracks
 	if my_type in ('Node'):
 		format_write(file, len(my_tracks), "B")
-		for t in my_tracks:
+		for st in my_tracks:
 			# Update existing sleeping track
 			my_offset = file.tell()
-			for st in offset_manager.sleeping_tracks:
-				if st.logic == t:
-					st.logic_slots.append(my_offset)
-					break
+			st.logic_slots.append(my_offset)
 			# Write padding
 			format_write(file, 0, "I")
 	# print number of children
@@ -834,68 +1022,48 @@ def write_cat_tree(file, logic_tree):
 	# call recursion
 	for c in my_logic.children:
 		write_cat_tree(file, c)
+	# where this node and its children were written, used by size reports
+	tree_spans[id(my_logic)] = (my_start, file.tell())
+
+
+def get_param_size(param):
+	# bytes written by write_param_value_by_param_type()
+	if param.encoded_value is None:
+		return 4
+	return len(param.encoded_value)
 
 
 def write_param_value_by_param_type(file, sleeping_logic, param, db_param_type):
-	value = param.value
 	value_type = param.value_type
-	if value_type == "bytes":
-		value = value[2:]
-		try:
-			value = bytearray.fromhex(value)
-		except:
-			print("Error: Mismatched param type '{0}' on value '{1}', expected bytes. Writing zero. (Try generating templates)".format(
-				param.value_type, param.value))
-			value = bytearray.fromhex("00000000")
-		file.write(value)
-	elif value_type == "int":
-		format_write(file, int(value), "i")
-	elif value_type == "bool":
-		string = str(value).upper()
-		if '1' in string or "TRUE" in string:
-			format_write(file, 1, "B")
-		else:
-			format_write(file, 0, "B")
-	elif value_type == "float":
-		format_write(file, float(value), "f")
-	elif value_type == "string":
-		# Try to match with sleeping strings first
+	if value_type == "string":
+		# Try to match with sleeping strings first, there is one for every string
 		match = False
-		value = strip_string(value)
-		for ss in offset_manager.sleeping_strings:
-			if ss.string == value:
-				if len(ss.param_slots) > len(ss.param_offsets):
-					match = True
-					ss.param_offsets.append(file.tell())
-					break
+		ss = offset_manager.string_index.get(param.typed_value)
+		if ss is not None and len(ss.param_slots) > len(ss.param_offsets):
+			match = True
+			ss.param_offsets.append(file.tell())
 		if match:
 			format_write(file, 0, "I")
 		else:
-			hash = hash_cat_value(value)
-			file.write(hash)
-	elif value_type == "hashed_string":
-		# Remove 'h' and quotes from string
-		if value.startswith('h\"'):
-			value = value[2:-1]
-		hash = hash_cat_value(value)
-		file.write(hash)
+			file.write(param.encoded_value)
 	elif value_type == "cg":
 		# Ignore CG if no children (should have conditions -- verify later)
 		if not len(param.children):
 			format_write(file, 0, "I")
 		else:
-			# Match with sleeping groups
+			# Match with sleeping groups, every 'cg' param was merged
+			# into the one group with its fingerprint by get_sleeper_groups()
 			match = False
-			for sg in offset_manager.sleeping_groups:
-				if sg.cg_param == param:
-					if len(sg.param_slots) > len(sg.param_offsets):
-						match = True
-						sg.param_offsets.append(file.tell())
-						break
+			sg = offset_manager.group_index.get(get_group_fingerprint(param))
+			if sg is not None and len(sg.param_slots) > len(sg.param_offsets):
+				match = True
+				sg.param_offsets.append(file.tell())
 			if not match:
 				print("Error: Param '{0}' type '{1}' from '{2}' could not be matched to variable condition group.".format(
 					param.title, param.value_type, sleeping_logic.logic.title))
 			format_write(file, 0, "I")
+	elif param.encoded_value is not None:
+		file.write(param.encoded_value)
 	else:
 		print("Error: Unable to handle param type '{0}' on value '{1}', writing value zero.".format(
 			param.value_type, param.value))
@@ -914,7 +1082,18 @@ def optimize_track_params(logic_tree):
 				return param_id
 			else:
 				print("Error: Unable to get param id for param '{0}'.".format(
-					sl.logic.title))
+					sleeping_logic.logic.title))
+
+	def get_param_key(sleeping_logic, param):
+		# params can only be shared when they are written as the same bytes,
+		# tracks with different titles may not agree on the param type
+		param_match_db = match_param_database(
+			sleeping_logic.logic.title, param, db_tracks)
+		if param_match_db:
+			param_size = param_match_db.type != 'bool'
+		else:
+			param_size = param.value_type not in ("bool", )
+		return (get_param_id(sleeping_logic, param), param_size, param.value_type, param.encoded_value)
 
 	@dataclass
 	class ParamMatch:
@@ -928,55 +1107,174 @@ def optimize_track_params(logic_tree):
 		param_matches: list[ParamMatch]
 		unique_params: list[LogicNode]
 	# Generate new list of optimized tracks
-	# TO-DO:
-	# 1	--	check rules of optimization in original files
 	logic_optimizations = []
 	start_time = time.time()
 	number_of_verified_tracks = 0
 	total_bytes_saved = 0
-	for i, st1 in enumerate(offset_manager.sleeping_tracks):
-		best_match = None
-		for j, st2 in enumerate(offset_manager.sleeping_tracks):
-			if i >= j:
-				# optimization can't go back, only forward
+	sleeping_tracks = offset_manager.sleeping_tracks
+	# Inverted index: (param id, param bytes) -> tracks using that param
+	track_param_ids = []
+	track_param_keys = []
+	param_index = {}
+	for j, st in enumerate(sleeping_tracks):
+		param_ids = set()
+		param_keys = {}
+		for p in st.logic.params:
+			param_ids.add(get_param_id(st, p))
+			if p.value_type in ('cg'):
+				# ignore cg params -- their value is 'None'
+				# optimization only checks id & values not chilldren
 				continue
-			else:
-				# early skip if optimization isn't worth it
-				if best_match is not None and len(best_match.param_matches) > len(st2.logic.params):
-					continue
-				# quick optimization -- skip mismatched hashes
-				hash_match = st1.logic.title == st2.logic.title
-				if bool_quick_param_optimization and not hash_match:
-					continue
-				# NOTE: Must verify if optimization target has extra params IDs
-				# that optimization source doesn't have
-				# otherwise source receives GHOST PARAMS that weren't originally there
-				# In the future, test idea of replacing bad ID values with 0
-				p1_ids = [get_param_id(st1, p) for p in st1.logic.params]
-				p2_ids = [get_param_id(st2, p) for p in st2.logic.params]
-				if p1_ids != p2_ids:
+			param_key = get_param_key(st, p)
+			if param_key not in param_keys:
+				param_keys[param_key] = p
+				param_index.setdefault(param_key, []).append(j)
+		track_param_ids.append(param_ids)
+		track_param_keys.append(param_keys)
+	# Candidate targets for every track, ranked by number of shared params
+	candidates = []
+	track_candidates = []
+	for i, st1 in enumerate(sleeping_tracks):
+		# Count shared params with every track that uses at least one of them
+		overlaps = {}
+		for param_key in track_param_keys[i]:
+			for j in param_index[param_key]:
+				if j != i:
+					overlaps[j] = overlaps.get(j, 0) + 1
+		my_candidates = []
+		for j, number_of_matches in overlaps.items():
+			st2 = sleeping_tracks[j]
+			# quick optimization -- skip mismatched hashes
+			if bool_quick_param_optimization and st1.logic.title != st2.logic.title:
+				continue
+			# NOTE: Must verify if optimization target has extra params IDs
+			# that optimization source doesn't have
+			# otherwise source receives GHOST PARAMS that weren't originally there
+			if not track_param_ids[j] <= track_param_ids[i]:
+				continue
+			my_candidates.append((number_of_matches, i, j))
+		# closest candidates win a tie
+		my_candidates.sort(key=lambda e: (-e[0], abs(e[2] - e[1])))
+		candidates += my_candidates[:max_optimization_candidates]
+		track_candidates.append(my_candidates[:max_optimization_candidates])
+	# Greedy set cover: links sharing the most params are made first.
+	# A track inherits from one target only, and that target may inherit
+	# from another one, chains can't loop back so tracks form trees.
+	# Every track still unoptimizes to its own params, so a link's
+	# worth doesn't depend on what its target links to.
+	candidates.sort(key=lambda e: (-e[0], e[1], abs(e[2] - e[1])))
+	targets = [None] * len(sleeping_tracks)
+
+	def is_free_target(i, j):
+		# i can't inherit from a track that already inherits from i
+		k = j
+		while k is not None and k != i:
+			k = targets[k]
+		return k != i
+
+	for number_of_matches, i, j in candidates:
+		if targets[i] is None and is_free_target(i, j):
+			targets[i] = j
+
+	def get_param_matches(i, j):
+		# params of track i found in track j, only the other ones are written
+		param_matches = []
+		matched_params = set()
+		if j is not None:
+			for param_key, p1 in track_param_keys[i].items():
+				p2 = track_param_keys[j].get(param_key)
+				if p2 is not None:
+					param_matches.append(ParamMatch(p1, p2))
+					matched_params.add(id(p1))
+		unique_params = [p for p in sleeping_tracks[i].logic.params if id(p) not in matched_params]
+		return param_matches, unique_params
+
+	def get_track_size(i, j):
+		# optimization offset, flags and hash, then id and value of every param left
+		param_matches, unique_params = get_param_matches(i, j)
+		return 8 + sum([2 + get_param_size(p) for p in unique_params])
+
+	def get_layout():
+		# Every track is written before the track it inherits from
+		# (optimization can't go back, only forward), subtrees are kept together.
+		# A track's distance to its target is its own size plus the subtrees
+		# written after it, so the sources with the most tracks behind them go first.
+		sizes = [get_track_size(i, j) for i, j in enumerate(targets)]
+		sources = [[] for st in sleeping_tracks]
+		for i, j in enumerate(targets):
+			if j is not None:
+				sources[j].append(i)
+		roots = [k for k, j in enumerate(targets) if j is None]
+		# targets come before their sources here, add subtrees up in reverse
+		tree_order = []
+		stack = list(reversed(roots))
+		while len(stack):
+			k = stack.pop()
+			tree_order.append(k)
+			stack += sources[k]
+		subtree_sizes = list(sizes)
+		for k in reversed(tree_order):
+			if targets[k] is not None:
+				subtree_sizes[targets[k]] += subtree_sizes[k]
+		for k_sources in sources:
+			k_sources.sort(key=lambda i: (sizes[i] - subtree_sizes[i], i))
+		layout = []
+		for root in roots:
+			stack = [(root, False)]
+			while len(stack):
+				k, bool_visited = stack.pop()
+				if bool_visited:
+					layout.append(k)
 					continue
-				# Create list of param matches
-				param_matches = []
-				for p1 in st1.logic.params:
-					if p1.value_type in ('cg'):
-						# ignore cg params -- their value is 'None'
-						# optimization only checks id & values not chilldren
-						continue
-					pid1 = get_param_id(st1, p1)
-					for p2 in st2.logic.params:
-						pid2 = get_param_id(st2, p2)
-						if pid1 == pid2:
-							if p1.value == p2.value:
-								# param match has been found
-								pm = ParamMatch(p1, p2)
-								param_matches.append(pm)
-				# done checking param matches with st2
-				if len(param_matches):
-					# if any param matches, store as optimization match
-					if best_match is None or len(param_matches) > len(best_match.param_matches):
-						lm = LogicMatch(st1, st2, param_matches, [])
-						best_match = lm
+				stack.append((k, True))
+				for i in reversed(sources[k]):
+					stack.append((i, False))
+		positions = [0] * len(sleeping_tracks)
+		position = 0
+		for k in layout:
+			positions[k] = position
+			position += sizes[k]
+		return layout, positions
+
+	# Optimization offsets can't reach further than max_optimization_distance,
+	# tracks too far from their target move to their next best candidate
+	# until every target is in reach, or are written without optimization.
+	banned_targets = set()
+	retargeted_tracks = set()
+	while True:
+		layout, positions = get_layout()
+		too_far = [i for i, j in enumerate(targets)
+			if j is not None and positions[j] - positions[i] > max_optimization_distance]
+		if not len(too_far):
+			break
+		for i in too_far:
+			banned_targets.add((i, targets[i]))
+			targets[i] = None
+			retargeted_tracks.add(i)
+		for i in too_far:
+			for number_of_matches, k, j in track_candidates[i]:
+				if (i, j) not in banned_targets and is_free_target(i, j):
+					targets[i] = j
+					break
+	if len(retargeted_tracks):
+		print("->->-> {0} tracks were too far from their optimization target, {1} found another one.".format(
+			len(retargeted_tracks), len([i for i in retargeted_tracks if targets[i] is not None])))
+	longest_chain = 0
+	for i in layout:
+		st1 = sleeping_tracks[i]
+		# length of the opti_offset chain starting at this track
+		chain_length = 0
+		k = targets[i]
+		while k is not None:
+			chain_length += 1
+			k = targets[k]
+		longest_chain = max(longest_chain, chain_length)
+		best_match = None
+		j = targets[i]
+		if j is not None:
+			st2 = sleeping_tracks[j]
+			param_matches, unique_params = get_param_matches(i, j)
+			best_match = LogicMatch(st1, st2, param_matches, unique_params)
 		# done checking for optimization matches for st1
 		# update total verified tracks
 		number_of_verified_tracks += 1
@@ -987,21 +1285,16 @@ def optimize_track_params(logic_tree):
 					total_bytes_saved += 1
 				else:
 					total_bytes_saved += 4
-			# add unique params to logic match
-			unique_params = []
-			for p in st1.logic.params:
-				if p not in [pm.paramA for pm in best_match.param_matches]:
-					unique_params.append(p)
-			best_match.unique_params = unique_params
 			osl = LogicOptimization(st1, best_match)
 			logic_optimizations.append(osl)
 			print("->->-> Track {1}/{2}, optimized {0} params.".format(len(
-				best_match.param_matches), number_of_verified_tracks, len(offset_manager.sleeping_tracks)))
+				best_match.param_matches), number_of_verified_tracks, len(sleeping_tracks)))
 		else:
 			osl = LogicOptimization(st1, None)
 			logic_optimizations.append(osl)
 			print("->->-> Track {0}/{1}, no optimizable params.".format(
-				number_of_verified_tracks, len(offset_manager.sleeping_tracks)))
+				number_of_verified_tracks, len(sleeping_tracks)))
+	print("->->-> Longest optimization chain: {0} tracks.".format(longest_chain))
 	# End of optimization
 	end_time = time.time()
 	optimization_time = end_time - start_time
@@ -1024,7 +1317,7 @@ def write_param_data(file, logic_tree):
 		file.seek(safe_pos)
 		# Write condition hash
 		hashed_title = hash_cat_value(sl.logic.title)
-		file.write(hashed_title)
+		file.write(format_word(hashed_title))
 		# Write params
 		number_of_params = len(sl.logic.params)
 		for logic_param in sl.logic.params:
@@ -1040,16 +1333,7 @@ def write_param_data(file, logic_tree):
 		safe_pos = file.tell()
 		sl.logic_offset = safe_pos
 		# Get params from optimizations, if possible
-		if bool_enable_param_optimization:
-			match = False
-			for lo in logic_optimizations:
-				if sl.logic == lo.sleeping_logic.logic:
-					if lo.optimization:
-						match = True
-						my_params = lo.optimization.unique_params
-						break
-		if not bool_enable_param_optimization or not match:
-			my_params = sl.logic.params
+		my_params = get_sleeper_params(sl)
 		number_of_params = len(my_params)
 		# Write pointers
 		for lpo in sl.logic_slots:
@@ -1065,7 +1349,7 @@ def write_param_data(file, logic_tree):
 		if number_of_params:
 			param_id |= 0x0001
 		format_write(file, param_id, "H")
-		file.write(hashed_title)
+		file.write(format_word(hashed_title))
 		# Write params
 		for i, logic_param in enumerate(my_params):
 			param_id = get_param_id_from_param_title(logic_param)
@@ -1096,15 +1380,14 @@ def write_param_data(file, logic_tree):
 	# fix sleeping tracks optimization offsets
 	if bool_enable_param_optimization:
 		safe_pos = file.tell()
-		for sl in offset_manager.sleeping_tracks:
-			for lm in logic_optimizations:
-				if sl == lm.sleeping_logic:
-					if lm.optimization:
-						file.seek(lm.optimization.logicA.logic_offset)
-						distance = lm.optimization.logicB.logic_offset - lm.optimization.logicA.logic_offset
-						if distance > 32767:
-							print("Error: Optimization distance is bigger than 32767, this will break the file.")
-						format_write(file, distance, "H")
+		for lm in logic_optimizations:
+			if lm.optimization:
+				file.seek(lm.optimization.logicA.logic_offset)
+				distance = lm.optimization.logicB.logic_offset - lm.optimization.logicA.logic_offset
+				if distance > max_optimization_distance:
+					print("Error: Optimization distance is bigger than {0}, this will break the file.".format(
+						max_optimization_distance))
+				format_write(file, distance, "H")
 		file.seek(safe_pos)
 	# end -> make sure to either save a new safe_pos
 	# or remove file.seek() otherwise last track will be corrupted
@@ -1112,39 +1395,74 @@ def write_param_data(file, logic_tree):
 	file.seek(safe_pos)
 
 
-def _write_strings(file, sleeping_list):
-	for s in sleeping_list:
-		safe_pos = file.tell()
-		my_offset = safe_pos - p_strings
-		# (Multiple offsets required because of 'FileReference')
-		for slot in s.string_slots:
-			file.seek(slot, 0)
-			format_write(file, my_offset, "I")
-		# Write param_offsets on param_slot_offsets
-		len1 = len(s.param_slots)
-		len2 = len(s.param_offsets)
-		if len1 != len2:
-			print("Error: STRING '{2}' has mismatching number of param_slots ({0}) and param_offsets ({1}).".format(
-				len1, len2, s.string))
+def build_string_table(sleeping_strings, sleeping_reference_strings):
+	# Every string is stored once across param and reference strings,
+	# strings that end another string point into it ("PICKUP" -> "C_PLAYER\\PICKUP")
+	unique_strings = []
+	reference_strings = set()
+	seen_strings = set()
+	bytes_before = 0
+	for bool_reference, sleeping_list in ((False, sleeping_strings), (True, sleeping_reference_strings)):
+		for s in sleeping_list:
+			bstring = bytes(s.string, 'utf-8')
+			bytes_before += len(bstring) + 1
+			if bstring not in seen_strings:
+				seen_strings.add(bstring)
+				unique_strings.append(bstring)
+				if bool_reference:
+					reference_strings.add(bstring)
+	# Sorted by reversed bytes, a suffix comes right after the strings ending with it
+	owners = {}
+	owner = None
+	for bstring in sorted(unique_strings, key=lambda b: b[::-1], reverse=True):
+		if owner is not None and owner.endswith(bstring):
+			owners[bstring] = owner
 		else:
-			for i, po in enumerate(s.param_offsets):
-				param_safe_pos = file.tell()
-				var_pos = s.param_slots[i]
-				file.seek(var_pos)
-				format_write(file, po - p_data, "I")
-				file.seek(param_safe_pos)
-		# Write string
-		file.seek(safe_pos, 0)
-		bstring = bytes(s.string, 'utf-8') + b'\x00'
-		file.write(bstring)
-
-
-def write_strings(file):
-	_write_strings(file, offset_manager.sleeping_strings)
+			owner = bstring
+	table = StringTable(bytearray(), {}, 0)
+	for bstring in unique_strings:
+		if bstring not in owners:
+			table.offsets[bstring] = len(table.data)
+			table.data += bstring + b'\x00'
+			if bstring in reference_strings:
+				table.reference_bytes += len(bstring) + 1
+	for bstring, owner in owners.items():
+		table.offsets[bstring] = table.offsets[owner] + len(owner) - len(bstring)
+	table.bytes_saved = bytes_before - len(table.data)
+	return table
+
+
+def _fix_string_offsets(file, s, my_offset):
+	# (Multiple offsets required because of 'FileReference')
+	for slot in s.string_slots:
+		file.seek(slot, 0)
+		format_write(file, my_offset, "I")
+	# Write param_offsets on param_slot_offsets
+	len1 = len(s.param_slots)
+	len2 = len(s.param_offsets)
+	if len1 != len2:
+		print("Error: STRING '{2}' has mismatching number of param_slots ({0}) and param_offsets ({1}).".format(
+			len1, len2, s.string))
+	else:
+		for i, po in enumerate(s.param_offsets):
+			var_pos = s.param_slots[i]
+			file.seek(var_pos)
+			format_write(file, po - p_data, "I")
 
 
-def write_reference_strings(file):
-	_write_strings(file, offset_manager.sleeping_reference_strings)
+def write_string_table(file):
+	sleeping_list = offset_manager.sleeping_strings + offset_manager.sleeping_reference_strings
+	table = build_string_table(offset_manager.sleeping_strings, offset_manager.sleeping_reference_strings)
+	safe_pos = file.tell()
+	for s in sleeping_list:
+		my_offset = safe_pos - p_strings + table.offsets[bytes(s.string, 'utf-8')]
+		_fix_string_offsets(file, s, my_offset)
+	# Write strings
+	file.seek(safe_pos, 0)
+	file.write(table.data)
+	print("->->-> {0} strings stored in {1} bytes; Bytes saved: {2}.".format(
+		len(table.offsets), len(table.data), table.bytes_saved))
+	return table
 
 
 def write_groups(file):
@@ -1168,10 +1486,9 @@ def write_groups(file):
 			# offset_manager.add_sleeping_group_condition(sl)
 			# offset_manager.add_sleeping_condition(sl)
 			# Update existing sleeping conditions
-			for sc in offset_manager.sleeping_conditions:
-				if sc.logic == c:
-					sc.logic_slots.append(condition_pointer_offset)
-					break
+			sc = find_sleeping_logic(tree_condition_index, c)
+			if sc is not None:
+				sc.logic_slots.append(condition_pointer_offset)
 
 
 def fix_group_offsets(file):
@@ -1185,10 +1502,9 @@ def fix_group_offsets(file):
 		for sgc in group.cg_param.children:
 			# sgc is a condition of this 'cg'
 			# for sl in offset_manager.sleeping_group_conditions:
-			for sl in offset_manager.sleeping_conditions:
-				if sgc == sl.logic:
-					group.condition_offsets.append(sl.logic_offset)
-					break
+			sl = find_sleeping_logic(tree_condition_index, sgc)
+			if sl is not None:
+				group.condition_offsets.append(sl.logic_offset)
 		# Write condition offsets into condition pointer offsets
 		len1 = len(group.condition_slots)
 		len2 = len(group.condition_offsets)
@@ -1240,61 +1556,163 @@ def read_db_logics(file):
 	return db_logics
 
 
+## MACTB ##
+# Binary MACT: the LogicNode tree as is, with every value already typed,
+# so loading it skips tokenizing and type guessing.
+# Little endian:
+#	"MACTB" + version (B)
+#	number of strings (I), every string as length (H) + UTF-8 bytes
+#	all nodes depth first, every node as:
+#		title, type, value, value_type (I, string index + 1 or 0 for None)
+#		number of conditions, tracks, params and children (H)
+#	a node is followed by its conditions, tracks, params and children in that order
+mactb_magic = b'MACTB'
+mactb_version = 1
+mactb_node = struct.Struct("<IIIIHHHH")
+
+
+def write_mactb(file, logic_tree):
+	strings = {}
+	data = bytearray()
+
+	def get_string_index(string):
+		if string is None:
+			return 0
+		index = strings.get(string)
+		if index is None:
+			index = len(strings) + 1
+			strings[string] = index
+		return index
+
+	def write_node(logic):
+		data.extend(mactb_node.pack(get_string_index(logic.title), get_string_index(logic.type),
+			get_string_index(logic.value), get_string_index(logic.value_type),
+			len(logic.conditions), len(logic.tracks), len(logic.params), len(logic.children)))
+		for c in logic.conditions + logic.tracks + logic.params + logic.children:
+			write_node(c)
+
+	write_node(logic_tree)
+	file.write(mactb_magic)
+	file.write(struct.pack("<BI", mactb_version, len(strings)))
+	for string in strings:
+		bstring = bytes(string, 'utf-8')
+		file.write(struct.pack("<H", len(bstring)))
+		file.write(bstring)
+	file.write(data)
+
+
+def read_mactb(data):
+	if data[:len(mactb_magic)] != mactb_magic:
+		print("Error: Not a MACTB file.")
+		return None
+	position = len(mactb_magic)
+	version, number_of_strings = struct.unpack_from("<BI", data, position)
+	position += 5
+	if version != mactb_version:
+		print("Error: Unsupported MACTB version {0}.".format(version))
+		return None
+	strings = [None]
+	for i in range(0, number_of_strings):
+		length, = struct.unpack_from("<H", data, position)
+		position += 2
+		strings.append(str(data[position:position+length], 'utf-8'))
+		position += length
+	nodes = mactb_node.iter_unpack(memoryview(data)[position:])
+
+	def read_node():
+		title, type, value, value_type, number_of_conditions, number_of_tracks, number_of_params, number_of_children = next(nodes)
+		logic = LogicNode(strings[title], strings[type], strings[value], strings[value_type], [], [], [], [])
+		if logic.type == "Param":
+			encode_param_value(logic)
+		for i in range(0, number_of_conditions):
+			logic.conditions.append(read_node())
+		for i in range(0, number_of_tracks):
+			logic.tracks.append(read_node())
+		for i in range(0, number_of_params):
+			logic.params.append(read_node())
+		for i in range(0, number_of_children):
+			logic.children.append(read_node())
+		return logic
+
+	return read_node()
+
+
 ## SETUP ##
 # path = str(Path(__file__).parent) + os.sep
 reference_strings = []
 offset_manager = OffsetManager([], [], [], [], [], [])
 counter_manager = CounterManager()
+logic_optimizations = []
+# id(sleeping logic) -> LogicOptimization
+sleeper_optimizations = {}
+tree_spans = {}
+# sleeping conditions and tracks as they are when the tree and groups are written, see find_sleeping_logic()
+tree_condition_index = {}
+tree_track_index = {}
+p_data = 0
+p_strings = 0
+p_groups = 0
 
 # WARNING: track db and condition db must be kept separate
 # because there are nodes that share the same name (both track/condition)
-
-## READ TRACK DB ##
-fn_track_templates = "TEMPLATES"+os.sep+"TEMPLATES_TRACKS.txt"
 db_tracks = []
-if os.path.exists(fn_track_templates):
-	file_dbt = open(fn_track_templates)
-	db_tracks = read_db_logics(file_dbt)
-	file_dbt.close()
-else:
-	print("Warning: No '{0}' found.".format(fn_track_templates))
-
-## READ CONDITION DB ##
-fn_condition_templates = "TEMPLATES"+os.sep+"TEMPLATES_CONDITIONS.txt"
 db_conditions = []
-if os.path.exists(fn_condition_templates):
-	file_dtc = open(fn_condition_templates)
-	db_conditions = read_db_logics(file_dtc)
-	file_dtc.close()
-else:
-	print("Warning: No '{0}' found.".format(fn_condition_templates))
-
-
-# Get MACT files from sys.argv
-my_mact_files = []
-sys_argv = sys.argv[1:]
-for i, arg in enumerate(sys_argv):
-	if sys_argv[i].upper() == "--PO":
-		bool_enable_param_optimization = True
-	if sys_argv[i].endswith(".mact"):
-		my_mact_files.append(sys_argv[i])
-if not len(my_mact_files):
-	print("Error: No MACT files found.")
-	quit()
-
-for fmact in my_mact_files:
-	## ACT / MACT INPUT ##
-	print("<< {0} >>".format(fmact))
-	fn_input = fmact
-	f_input = open(fn_input, "r")
-	my_lines = f_input.readlines()
-	f_input.close()
 
+
+def load_db_logics():
+	global db_tracks, db_conditions
+	## READ TRACK DB ##
+	fn_track_templates = "TEMPLATES"+os.sep+"TEMPLATES_TRACKS.txt"
+	db_tracks = []
+	if os.path.exists(fn_track_templates):
+		file_dbt = open(fn_track_templates)
+		db_tracks = read_db_logics(file_dbt)
+		file_dbt.close()
+	else:
+		print("Warning: No '{0}' found.".format(fn_track_templates))
+
+	## READ CONDITION DB ##
+	fn_condition_templates = "TEMPLATES"+os.sep+"TEMPLATES_CONDITIONS.txt"
+	db_conditions = []
+	if os.path.exists(fn_condition_templates):
+		file_dtc = open(fn_condition_templates)
+		db_conditions = read_db_logics(file_dtc)
+		file_dtc.close()
+	else:
+		print("Warning: No '{0}' found.".format(fn_condition_templates))
+
+
+## COMPILE ##
+def parse_mact(my_lines):
 	## PROCESSING ##
 	print("-> Generating keyword tree.")
 	keyword_tree = generate_keyword_tree(my_lines)
+	if bool_print_debug and False:
+		fn_debug = "debug.txt"
+		f_debug = open(fn_debug, "w")
+		keyword_tree.write_tree(f_debug)
+		f_debug.close()
 	print("-> Generating logic tree.")
 	logic_tree = generate_logic_tree(keyword_tree)
+	return logic_tree
+
+
+def compile_mact(my_lines, f_cat):
+	# f_cat can be any seekable binary file, e.g. io.BytesIO
+	return compile_logic_tree(parse_mact(my_lines), f_cat)
+
+
+def compile_logic_tree(logic_tree, f_cat):
+	global offset_manager, counter_manager, logic_optimizations, sleeper_optimizations, tree_spans
+	global tree_condition_index, tree_track_index
+	global p_data, p_strings, p_groups
+	# every MACT file starts from a clean state
+	offset_manager = OffsetManager([], [], [], [], [], [])
+	counter_manager = CounterManager()
+	logic_optimizations = []
+	sleeper_optimizations = {}
+	tree_spans = {}
+
 	if bool_print_tree:
 		logic_tree.print_tree()
 	logic_nodes = get_logic_nodes(logic_tree)
@@ -1307,10 +1725,13 @@ for fmact in my_mact_files:
 	if not bool_enable_param_optimization:
 		print("->->-> WARNING: Track param optimization is disabled, this will result in bigger file sizes.")
 	else:
-		if not bool_quick_param_optimization:
-			print(
-				"->->-> WARNING: Slow track param optimization selected, this might take several minutes.")
+		if bool_quick_param_optimization:
+			print("->->-> Quick track param optimization selected, params are only shared between tracks with the same title.")
 		logic_optimizations = optimize_track_params(logic_tree)
+		# tracks are written in optimization layout order
+		offset_manager.sleeping_tracks = [lo.sleeping_logic for lo in logic_optimizations]
+		for lo in logic_optimizations:
+			sleeper_optimizations[id(lo.sleeping_logic)] = lo
 
 	# Gather before writing
 	get_sleeper_strings()
@@ -1322,11 +1743,12 @@ for fmact in my_mact_files:
 	#	then they had no unique data to begin with.
 	#	So the groups are identical.
 	get_sleeper_groups()
+	if offset_manager.debug_merged_groups:
+		print("->-> Merged {0} condition groups with identical conditions; Bytes saved: {1}.".format(
+			offset_manager.debug_merged_groups, offset_manager.debug_group_bytes_saved))
 
 	## OUTPUT ##
 	print("-> Writing CAT file.")
-	fn_cat = fn_input.rsplit(os.sep, 1)[-1].split('.')[0] + ".cat"
-	f_cat = open(fn_cat, "wb")
 
 	## HEADER ##
 	print("->-> Writing header data.")
@@ -1348,6 +1770,9 @@ for fmact in my_mact_files:
 
 	## CAT TREE ##
 	print("->-> Writing CAT tree.")
+	p_tree = f_cat.tell()
+	tree_condition_index = get_sleeping_logic_index(offset_manager.sleeping_conditions)
+	tree_track_index = get_sleeping_logic_index(offset_manager.sleeping_tracks)
 	write_cat_tree(f_cat, logic_tree)
 
 	## CONDITION GROUPS ##
@@ -1362,8 +1787,7 @@ for fmact in my_mact_files:
 	## STRINGS ##
 	print("->-> Writing string data.")
 	p_strings = f_cat.tell()
-	write_strings(f_cat)
-	write_reference_strings(f_cat)
+	string_table = write_string_table(f_cat)
 
 	## FIX HEADER & OFFSETS ##
 	print("->-> Fixing offsets.")
@@ -1375,7 +1799,8 @@ for fmact in my_mact_files:
 	format_write(f_cat, p_data, "I")  # p_data
 	format_write(f_cat, p_strings, "I")  # p_strings
 	format_write(f_cat, p_groups, "I")  # p_groups
-	format_write(f_cat, counter_manager.counterA - 1, "I")  # counterA
+	# the root Bank isn't counted, fragments compiled by CAT_PATCH can be a Node without any Bank
+	format_write(f_cat, max(counter_manager.counterA - 1, 0), "I")  # counterA
 	format_write(f_cat, counter_manager.counterB, "I")  # counterB
 	format_write(f_cat, counter_manager.counterC, "I")  # counterC
 	format_write(f_cat, counter_manager.counterD, "I")  # counterD
@@ -1391,14 +1816,9 @@ for fmact in my_mact_files:
 	pad = file_length % 1024
 	pad = 1024 - pad
 	f_cat.write(pad*b'\00')
-	f_cat.close()
+	layout = CatLayout(32, p_var_groups, p_tree, p_groups, p_data, p_strings,
+			string_table, file_length, pad, get_bank_layouts(logic_tree))
 
-	if bool_print_debug and False:
-		fn_debug = fn_input.split('.')[0] + "_debug.txt"
-		f_debug = open(fn_debug, "w")
-		keyword_tree.write_tree(f_debug)
-		f_debug.close()
-	
 	## DEBUG INFO ##
 	debug_mismatched_strings = 0
 	debug_mismatched_groups = 0
@@ -1436,8 +1856,476 @@ for fmact in my_mact_files:
 	print("Info: {0} total conditions, {1} unused conditions.".format(len(offset_manager.sleeping_conditions), debug_unused_conditions))
 	print("Info: {0} total tracks, {1} unused tracks.".format(len(offset_manager.sleeping_tracks), debug_unused_tracks))
 	# print("Info: {0} merged strings, {1} merged groups, {2} merged logic.".format(offset_manager.debug_merged_strings, offset_manager.debug_merged_groups, offset_manager.debug_merged_logic))
+	return layout
+
+
+## SIZE REPORT ##
+def get_bank_layouts(logic_tree):
+	# Param data size of every condition and track, in the order they were written
+	sleeping_logics = offset_manager.sleeping_conditions + offset_manager.sleeping_tracks
+	sleeping_logics = [sl for sl in sleeping_logics if sl.logic_offset is not None]
+	sleeping_logics.sort(key=lambda sl: sl.logic_offset)
+	logic_sizes = []
+	for i, sl in enumerate(sleeping_logics):
+		if i+1 < len(sleeping_logics):
+			logic_end = sleeping_logics[i+1].logic_offset
+		else:
+			logic_end = p_strings
+		logic_sizes.append((sl, logic_end - sl.logic_offset))
+	banks = []
+	# (start, end, index of the parent bank or -1), in the order banks were written
+	bank_spans = []
+	_get_bank_layouts(logic_tree, 0, -1, banks, bank_spans)
+	# logic referenced from anywhere inside a bank's part of the tree counts for it
+	# and every bank around it, once. Slots are matched to the last bank that
+	# starts before them, walking up to the banks that actually contain them.
+	bank_starts = [start for start, end, parent in bank_spans]
+	for sl, size in logic_sizes:
+		my_banks = set()
+		for slot in sl.logic_slots:
+			i = bisect.bisect_right(bank_starts, slot) - 1
+			while i >= 0 and slot >= bank_spans[i][1]:
+				i = bank_spans[i][2]
+			while i >= 0 and i not in my_banks:
+				my_banks.add(i)
+				i = bank_spans[i][2]
+		for i in my_banks:
+			banks[i].param_bytes += size
+	return banks
+
+
+def _get_bank_layouts(logic_tree, level, parent, banks, bank_spans):
+	if logic_tree.type in ('Bank'):
+		start, end = tree_spans[id(logic_tree)]
+		banks.append(BankLayout(logic_tree.value, level, end - start, 0))
+		bank_spans.append((start, end, parent))
+		parent = len(bank_spans) - 1
+		level += 1
+	for c in logic_tree.children:
+		_get_bank_layouts(c, level, parent, banks, bank_spans)
+
+
+def print_size_report(layout):
+	string_bytes = len(layout.string_table.data)
+	sections = (
+		("Header", layout.p_string_variables),
+		("String variables", layout.p_group_variables - layout.p_string_variables),
+		("Group variables", layout.p_tree - layout.p_group_variables),
+		("Tree", layout.p_groups - layout.p_tree),
+		("Condition groups", layout.p_data - layout.p_groups),
+		("Param data", layout.p_strings - layout.p_data),
+		("Strings", string_bytes - layout.string_table.reference_bytes),
+		("Reference strings", layout.string_table.reference_bytes),
+		("Padding", layout.padding),
+	)
+	total = layout.file_length + layout.padding
+	print("-> Size report: {0} bytes.".format(total))
+	for name, size in sections:
+		print("->-> {0}: {1} bytes ({2}%).".format(name, size, round(100*size/total, 1)))
+	# nested banks are included in their parent, logic shared between banks is counted in each of them
+	print("->-> Banks (tree bytes, param bytes):")
+	for bank in layout.banks:
+		print("{0}Bank {1}: {2}, {3}".format(ntabs(bank.level+1), bank.title,
+			bank.tree_bytes, bank.param_bytes))
+
+
+## COMPRESSED FILES ##
+# MACT and MACTB files can also be kept as .gz or .xz, they are streamed
+# through the stdlib compressor instead of being packed as a whole.
+compressed_openers = {
+	".gz": lambda fn, mode: gzip.open(fn, mode, compresslevel=6),
+	".xz": lzma.open,
+}
+# bytes passed to or taken from the compressor at once
+compressed_buffer_size = 1 << 20
+
+
+def get_mact_extension(fn):
+	# "Act.mact.gz" -> ".mact", "Act.mactb" -> ".mactb", None for other files
+	for compressed_extension in chain(("",), compressed_openers):
+		for extension in (".mact", ".mactb"):
+			if fn.endswith(extension + compressed_extension):
+				return extension
+	return None
+
+
+def open_mact_file(fn, mode):
+	# same modes as open(): "r", "w", "rb" or "wb"
+	opener = compressed_openers.get(os.path.splitext(fn)[1])
+	if opener is None:
+		return open(fn, mode)
+	file = opener(fn, mode[0] + "b")
+	if mode[0] == "r":
+		file = io.BufferedReader(file, compressed_buffer_size)
+	else:
+		file = io.BufferedWriter(file, compressed_buffer_size)
+	if mode.endswith("b"):
+		return file
+	return io.TextIOWrapper(file)
+
+
+## COMPILE FILES ##
+def get_output_file_name(fn_input, extension):
+	fn_output = fn_input.rsplit(os.sep, 1)[-1].split('.')[0] + extension
+	if output_path is not None:
+		fn_output = os.path.join(output_path, fn_output)
+	return fn_output
+
+
+def read_logic_tree(fn_input):
+	# MACT or MACTB file -> logic tree, None if it can't be read
+	if get_mact_extension(fn_input) == ".mactb":
+		f_input = open_mact_file(fn_input, "rb")
+		print("-> Reading MACTB logic tree.")
+		logic_tree = read_mactb(f_input.read())
+		f_input.close()
+		return logic_tree
+	f_input = open_mact_file(fn_input, "r")
+	my_lines = f_input.readlines()
+	f_input.close()
+	return parse_mact(my_lines)
+
+
+def compile_mact_file(fn_input, img_entries=None):
+	# Returns the CAT file name and layout, None if nothing was written.
+	# With img_entries (name -> bytes) the CAT file is kept for an IMG archive.
+	logic_tree = read_logic_tree(fn_input)
+	if logic_tree is None:
+		return None, None
+	if bool_write_mactb and get_mact_extension(fn_input) == ".mact":
+		f_mactb = open(get_output_file_name(fn_input, ".mactb"), "wb")
+		write_mactb(f_mactb, logic_tree)
+		f_mactb.close()
+
+	if bool_size_report:
+		# dry run, nothing gets written
+		layout = compile_logic_tree(logic_tree, NullWriter())
+		print_size_report(layout)
+		return None, layout
+	if img_entries is not None:
+		fn_cat = fn_input.rsplit(os.sep, 1)[-1].split('.')[0] + ".cat"
+		f_cat = io.BytesIO()
+		layout = compile_logic_tree(logic_tree, f_cat)
+		img_entries[fn_cat] = f_cat.getvalue()
+		return fn_cat, layout
+	fn_cat = get_output_file_name(fn_input, ".cat")
+	f_cat = open(fn_cat, "wb")
+	layout = compile_logic_tree(logic_tree, f_cat)
+	f_cat.close()
+	return fn_cat, layout
+
+
+## WATCH ##
+def get_watched_files(watch_paths):
+	# folders are listed again every time so new MACT files are picked up
+	watched_files = []
+	for path in watch_paths:
+		if os.path.isdir(path):
+			for name in sorted(os.listdir(path)):
+				if get_mact_extension(name) is not None:
+					watched_files.append(os.path.join(path, name))
+		else:
+			watched_files.append(path)
+	return watched_files
+
+
+def get_watched_files_by_path(watch_paths):
+	# (file, watched path it comes from)
+	watched_files = []
+	for path in watch_paths:
+		for fn_input in get_watched_files([path]):
+			watched_files.append((fn_input, path))
+	return watched_files
+
+
+def watch_mact_files(watch_paths, byte_orders):
+	# Files are compiled when first seen if their CAT file is missing or older,
+	# after that whenever their modification time or size changes.
+	# byte_orders: watched path -> bool_little_endian for the MACT files from it
+	global bool_little_endian
+	print("-> Watching for changes, press Ctrl+C to stop.")
+	last_changes = {}
+	try:
+		while True:
+			for fn_input, watch_path in get_watched_files_by_path(watch_paths):
+				try:
+					stat = os.stat(fn_input)
+				except OSError:
+					continue
+				change = (stat.st_mtime_ns, stat.st_size)
+				last_change = last_changes.get(fn_input)
+				last_changes[fn_input] = change
+				if last_change == change:
+					continue
+				if last_change is None:
+					fn_cat = get_output_file_name(fn_input, ".cat")
+					if os.path.exists(fn_cat) and os.stat(fn_cat).st_mtime_ns >= stat.st_mtime_ns:
+						continue
+				print("<< {0} >>".format(fn_input))
+				start = time.perf_counter()
+				bool_little_endian = byte_orders[watch_path]
+				try:
+					fn_cat, _ = compile_mact_file(fn_input)
+				except Exception as e:
+					# keep watching, the file is probably being edited
+					print("Error: Unable to compile '{0}': {1}: {2}".format(fn_input, type(e).__name__, e))
+					continue
+				if fn_cat is not None:
+					print("Info: Compiled '{0}' in {1:.3f}s; File size: {2} bytes.".format(
+						fn_input, time.perf_counter() - start, os.path.getsize(fn_cat)))
+			time.sleep(watch_interval)
+	except KeyboardInterrupt:
+		pass
+
+
+## CHECK ##
+def get_check_title(logic):
+	if logic.type in ('Bank', 'Node') and logic.value is not None:
+		return "{0} {1}".format(logic.title, logic.value)
+	if logic.type in ('Condition', 'Track'):
+		return "{0} {1}".format(logic.type, logic.title)
+	return logic.title
+
+
+def check_logic_tree(fn_input, logic_tree):
+	# Everything MACT_TO_CAT would only notice while writing, or not at all,
+	# found from the logic tree alone. Returns a list of CheckDiagnostic.
+	diagnostics = []
+	string_uses = {}
+	group_uses = {}
+
+	def add_diagnostic(path, severity, code, message):
+		diagnostics.append(CheckDiagnostic(fn_input, path, severity, code, message))
+
+	def check_param(logic, param, db, path):
+		if param.value_type == "none":
+			add_diagnostic(path, "error", "unknown-param-type",
+				"Param '{0}' has no value, zero will be written.".format(param.title))
+			return
+		if param.value_type == "bytes" and param.typed_value is None:
+			add_diagnostic(path, "error", "bad-bytes",
+				"Param '{0}' value '{1}' is not hex bytes, zero will be written.".format(param.title, param.value))
+		if param.value_type == "string" and len(param.typed_value):
+			string_uses[param.typed_value] = string_uses.get(param.typed_value, 0) + 1
+		if param.value_type == "cg" and len(param.children):
+			if len(param.children) > max_logics_per_node:
+				add_diagnostic(path, "error", "too-many-group-conditions",
+					"{0} conditions in a group, the limit is {1}.".format(len(param.children), max_logics_per_node))
+			fingerprint = get_group_fingerprint(param)
+			group_uses[fingerprint] = group_uses.get(fingerprint, 0) + 1
+			for c in param.children:
+				check_logic(c, path)
+		param_match = match_param_database(logic.title, param, db)
+		if param_match:
+			param_size = 1 if param_match.type == 'bool' else 4
+		else:
+			param_size = 1 if param.value_type == "bool" else 4
+		# cg and string params are written as offsets
+		if param.value_type not in ("cg", "string") and param.encoded_value is not None \
+				and len(param.encoded_value) != param_size:
+			add_diagnostic(path, "error" if logic.type == "Track" else "warning", "param-size-mismatch",
+				"Param '{0}' value '{1}' is {2} bytes, '{3}' expects {4} bytes.".format(
+					param.title, param.value, len(param.encoded_value), logic.title, param_size))
+		if logic.type == "Track":
+			if param_match:
+				param_id = int(param_match.id)
+			else:
+				param_id = get_param_id_from_param_title(param)
+			if param_id is None:
+				add_diagnostic(path, "error", "unknown-param-id",
+					"Param '{0}' of '{1}' has no id, the file will break.".format(param.title, logic.title))
+			elif param_id > max_param_id:
+				add_diagnostic(path, "error", "param-id-too-big",
+					"Param id {0} is bigger than {1}.".format(param_id, max_param_id))
+
+	def check_logic(logic, parent_path):
+		path = get_check_title(logic)
+		if len(parent_path):
+			path = parent_path + "/" + path
+		if logic.type in ('Bank', 'Node'):
+			if len(logic.conditions) > max_logics_per_node:
+				add_diagnostic(path, "error", "too-many-conditions",
+					"{0} conditions, the limit is {1}.".format(len(logic.conditions), max_logics_per_node))
+			if logic.type == 'Bank' and len(logic.tracks):
+				add_diagnostic(path, "warning", "bank-tracks",
+					"Tracks of a Bank are not written.")
+			if logic.type == 'Node' and len(logic.tracks) > max_logics_per_node:
+				add_diagnostic(path, "error", "too-many-tracks",
+					"{0} tracks, the limit is {1}.".format(len(logic.tracks), max_logics_per_node))
+			if len(logic.children) > max_children_per_node:
+				add_diagnostic(path, "error", "too-many-children",
+					"{0} children, the limit is {1}.".format(len(logic.children), max_children_per_node))
+		elif logic.type == 'FileReference':
+			titles = [p.title for p in logic.params]
+			for title in ('fileName', 'path'):
+				if title not in titles:
+					add_diagnostic(path, "error", "missing-file-reference",
+						"FileReference has no '{0}'.".format(title))
+		elif logic.type in ('Condition', 'Track'):
+			db = db_tracks if logic.type == 'Track' else db_conditions
+			for p in logic.params:
+				check_param(logic, p, db, path + "/" + p.title)
+		for c in logic.conditions + logic.tracks + logic.children:
+			check_logic(c, path)
+
+	check_logic(logic_tree, "")
+	for string, number_of_uses in string_uses.items():
+		if number_of_uses > max_variable_uses:
+			add_diagnostic("", "error", "too-many-string-uses",
+				"String '{0}' is used {1} times, the limit is {2}.".format(string, number_of_uses, max_variable_uses))
+	for number_of_uses in group_uses.values():
+		if number_of_uses > max_variable_uses:
+			add_diagnostic("", "error", "too-many-group-uses",
+				"A condition group is used {0} times, the limit is {1}.".format(number_of_uses, max_variable_uses))
+	return diagnostics
+
+
+def check_mact_file(fn_input):
+	diagnostics = []
+	output = io.StringIO()
+	try:
+		with contextlib.redirect_stdout(output):
+			logic_tree = read_logic_tree(fn_input)
+	except Exception as e:
+		return [CheckDiagnostic(fn_input, "", "error", "exception", "{0}: {1}".format(type(e).__name__, e))]
+	# parser warnings and errors are diagnostics too
+	for line in output.getvalue().splitlines():
+		# bad bytes are reported with their path by check_logic_tree()
+		if "expected bytes" in line:
+			continue
+		if line.startswith("Warning:"):
+			diagnostics.append(CheckDiagnostic(fn_input, "", "warning", "parse", line[len("Warning: "):]))
+		elif line.startswith("Error:"):
+			diagnostics.append(CheckDiagnostic(fn_input, "", "error", "parse", line[len("Error: "):]))
+	if logic_tree is not None:
+		diagnostics += check_logic_tree(fn_input, logic_tree)
+	return diagnostics
+
+
+def init_check_worker(enable_param_optimization):
+	global bool_enable_param_optimization
+	bool_enable_param_optimization = enable_param_optimization
+	# forked workers already have the databases of the parent
+	if not len(db_tracks) and not len(db_conditions):
+		with contextlib.redirect_stdout(io.StringIO()):
+			load_db_logics()
+
+
+def check_mact_files(mact_files):
+	# one MACT file per task, diagnostics come back in file order
+	diagnostics = []
+	with multiprocessing.Pool(initializer=init_check_worker,
+			initargs=(bool_enable_param_optimization,)) as pool:
+		for file_diagnostics in pool.imap(check_mact_file, mact_files):
+			diagnostics += file_diagnostics
+	return diagnostics
+
+
+## MAIN ##
+def main():
+	global bool_enable_param_optimization, bool_quick_param_optimization, bool_size_report, bool_write_mactb
+	global bool_watch, output_path, img_path, new_img_path, bool_check, bool_little_endian
+
+	# Get MACT files from sys.argv,
+	# folders are only used when watching.
+	my_mact_files = []
+	# MACT file or watched folder -> bool_little_endian for it
+	mact_byte_orders = {}
+	watch_paths = []
+	sys_argv = sys.argv[1:]
+	for i, arg in enumerate(sys_argv):
+		if sys_argv[i].upper() == "--BE":
+			bool_little_endian = False
+		if sys_argv[i].upper() == "--LE":
+			bool_little_endian = True
+		if sys_argv[i].upper() == "--PO":
+			bool_enable_param_optimization = True
+		if sys_argv[i].upper() == "--SIZE-REPORT":
+			bool_size_report = True
+		if sys_argv[i].upper() == "--PO-QUICK":
+			bool_enable_param_optimization = True
+			bool_quick_param_optimization = True
+		if sys_argv[i].upper() == "--MACTB":
+			bool_write_mactb = True
+		if sys_argv[i].upper() == "--WATCH":
+			bool_watch = True
+		if sys_argv[i].upper() == "--CHECK":
+			bool_check = True
+		if sys_argv[i].upper() == "--OUT":
+			try:
+				output_path = sys_argv[i+1]
+			except:
+				print("Error: No path argument for output.")
+				quit()
+		if sys_argv[i].upper() == "--IMG":
+			try:
+				img_path = sys_argv[i+1]
+			except:
+				print("Error: No IMG archive argument.")
+				quit()
+			new_img_path = img_path
+			if i+2 < len(sys_argv) and sys_argv[i+2].lower().endswith(".img"):
+				new_img_path = sys_argv[i+2]
+		if get_mact_extension(sys_argv[i]) is not None:
+			my_mact_files.append(sys_argv[i])
+			mact_byte_orders[sys_argv[i]] = bool_little_endian
+			watch_paths.append(sys_argv[i])
+		elif os.path.isdir(sys_argv[i]) and (i == 0 or sys_argv[i-1].upper() != "--OUT"):
+			mact_byte_orders[sys_argv[i]] = bool_little_endian
+			watch_paths.append(sys_argv[i])
+	# diagnostics are the only thing --check prints to stdout
+	with contextlib.redirect_stdout(sys.stderr if bool_check else sys.stdout):
+		load_db_logics()
+
+	if bool_check:
+		# one JSON object per line, the summary goes to stderr
+		mact_files = get_watched_files(watch_paths)
+		diagnostics = check_mact_files(mact_files)
+		for d in diagnostics:
+			print(json.dumps(d.__dict__))
+		number_of_errors = len([d for d in diagnostics if d.severity == "error"])
+		print("Info: {0} errors and {1} warnings in {2} MACT files.".format(
+			number_of_errors, len(diagnostics) - number_of_errors, len(mact_files)), file=sys.stderr)
+		sys.exit(1 if number_of_errors else 0)
+
+	if output_path is not None and not os.path.exists(output_path):
+		os.mkdir(output_path)
+
+	if bool_watch:
+		if not len(watch_paths):
+			print("Error: No MACT files or folders to watch.")
+			quit()
+		watch_mact_files(watch_paths, mact_byte_orders)
+		print("-> Done.")
+		return
+
+	if not len(my_mact_files):
+		print("Error: No MACT files found.")
+		quit()
+
+	img_entries = None
+	if img_path is not None:
+		img_entries = {}
+	for fmact in my_mact_files:
+		## ACT / MACT INPUT ##
+		print("<< {0} >>".format(fmact))
+		bool_little_endian = mact_byte_orders[fmact]
+		compile_mact_file(fmact, img_entries)
+
+	## IMG ARCHIVE ##
+	if img_entries:
+		print("-> Writing IMG archive.")
+		if os.path.exists(img_path):
+			archive = IMG_ARCHIVE.open_img_archive(img_path)
+		else:
+			archive = IMG_ARCHIVE.new_img_archive(img_path)
+		number_of_entries = IMG_ARCHIVE.write_img_archive(new_img_path, archive, img_entries)
+		print("Info: Wrote {0} CAT files into '{1}', {2} entries in total.".format(
+			len(img_entries), new_img_path, number_of_entries))
+
+	# End #
+	print("-> Done.")
 
 
-# End #
-print("-> Done.")
-quit()
+if __name__ == "__main__":
+	main()